@@ -0,0 +1,136 @@
+{% if values.framework == "fastapi" -%}
+"""
+Write-behind user activity.
+
+Requests only note when a user was last seen; the times are kept in
+memory, one entry per user, and written to ``users.last_login`` every
+``activity_flush_interval`` seconds in a few batched UPDATEs instead of
+one write per request.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+from sqlalchemy import DateTime, bindparam, column, or_, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import Update
+
+from .config import settings
+from .database import AsyncSessionLocal
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+ACTIVITY_FLUSHED = Counter('activity_flushed_total', 'Last-seen times written to the database')
+
+
+def last_seen_statement(rows: List[Tuple[uuid.UUID, datetime]], dialect: str) -> Update:
+    """Move ``last_login`` forward for each ``(user_id, seen)`` row.
+
+    ``updated_at`` is left alone: being seen is not an edit.
+
+    PostgreSQL gets a single ``UPDATE ... FROM (VALUES ...)``; other
+    databases run the returned statement once per row (executemany).
+    """
+    users = User.__table__
+    if dialect != "postgresql":
+        return (
+            update(users)
+            .where(users.c.id == bindparam("user_id"))
+            .where(or_(users.c.last_login.is_(None), users.c.last_login < bindparam("seen")))
+            .values(last_login=bindparam("seen"), updated_at=users.c.updated_at)
+        )
+    batch = values(
+        column("user_id", UUID(as_uuid=True)), column("seen", DateTime), name="activity"
+    ).data(rows)
+    return (
+        update(users)
+        .where(users.c.id == batch.c.user_id)
+        .where(or_(users.c.last_login.is_(None), users.c.last_login < batch.c.seen))
+        .values(last_login=batch.c.seen, updated_at=users.c.updated_at)
+    )
+
+
+class ActivityRecorder:
+    """Latest last-seen time per user, waiting to be written.
+
+    A flush never moves ``last_login`` backwards, so several workers can
+    flush the same users in any order.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._pending: Dict[uuid.UUID, datetime] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def record(self, user_id: uuid.UUID, when: Optional[datetime] = None) -> None:
+        """Note that ``user_id`` was seen at ``when`` (default now)."""
+        when = when or datetime.utcnow()
+        with self._lock:
+            if user_id not in self._pending or self._pending[user_id] < when:
+                self._pending[user_id] = when
+
+    def _drain(self) -> Dict[uuid.UUID, datetime]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending: Dict[uuid.UUID, datetime]) -> None:
+        for user_id, when in pending.items():
+            self.record(user_id, when)
+
+    async def flush(self) -> int:
+        """Write everything recorded so far; returns the number of users."""
+        pending = self._drain()
+        if not pending:
+            return 0
+        rows = list(pending.items())
+        try:
+            async with AsyncSessionLocal() as db:
+                dialect = db.get_bind().dialect.name
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    # Cached identities and permissions do not depend on last_login
+                    options = {"bump_versions": False}
+                    if dialect == "postgresql":
+                        await db.execute(last_seen_statement(batch, dialect), execution_options=options)
+                    else:
+                        await db.execute(
+                            last_seen_statement(batch, dialect),
+                            [{"user_id": user_id, "seen": seen} for user_id, seen in batch],
+                            execution_options=options,
+                        )
+                await db.commit()
+        except Exception as exc:
+            # Keep the times for the next flush rather than losing them
+            logger.warning(f"Activity flush failed: {exc}")
+            self._restore(pending)
+            return 0
+        ACTIVITY_FLUSHED.inc(len(rows))
+        return len(rows)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def start(self, interval: float) -> None:
+        """Flush every ``interval`` seconds in the background."""
+        self._flusher = asyncio.create_task(self._run(interval))
+
+    async def close(self) -> None:
+        """Stop the background flush and write what is left."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+
+activity = ActivityRecorder(batch_size=settings.activity_flush_batch)
+{%- endif %}
@@ -2,49 +2,82 @@
 API routes and endpoints.
 """
 {% if values.framework == "fastapi" -%}
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import uuid
 
-from .database import get_db
+from .activity import activity
+from .database import AsyncSessionLocal, client_key, get_async_db, get_read_db, read_replica
 from .models import User, Role, Permission
 from .schemas import (
     UserResponse, UserCreate, UserUpdate, UserLogin, Token,
     RoleResponse, RoleCreate, RoleUpdate,
     PermissionResponse, PermissionCreate,
     PaginatedResponse, PaginationParams,
-    HealthCheck
+    CursorPaginatedResponse, CursorParams,
+    BatchUserCreate, BatchUserUpdate, BatchUserDelete, BatchResponse,
+    SlowQueryLogResponse, HealthCheck
 )
 from .auth import (
-    authenticate_user, create_access_token, create_refresh_token,
-    get_current_user, get_current_active_user, verify_token
+    authenticate_user_async, create_access_token, create_refresh_token,
+    get_current_user, get_current_active_user, verify_token, get_password_hash_async,
+    permission_claims_async
 )
-from .crud import UserCRUD, RoleCRUD, PermissionCRUD
+from .etags import row_etag, table_etag
+from .export import EXPORT_FORMATS, stream_export
+from .hashing import HashPoolFull
+from .loading import load_profile
+from .pagination import InvalidCursor
+from .crud import AsyncUserCRUD, AsyncRoleCRUD, AsyncPermissionCRUD
+from .config import settings
+from .ratelimit import RateLimitRule, default_rules, rate_limit
+from .singleflight import SingleFlight
+from .slowqueries import slow_queries
+from .versions import table_versions_async
 
 # Create router
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(rate_limit(*default_rules()))])
 security = HTTPBearer()
 
 # CRUD instances
-user_crud = UserCRUD()
-role_crud = RoleCRUD()
-permission_crud = PermissionCRUD()
+user_crud = AsyncUserCRUD()
+role_crud = AsyncRoleCRUD()
+permission_crud = AsyncPermissionCRUD()
+
+# Concurrent reads of one user share a single load
+user_flights = SingleFlight()
+USER_DETAIL_TABLES = ("users", "user_roles", "roles", "role_permissions", "permissions")
 
 
 # Authentication endpoints
-@router.post("/auth/login", response_model=Token)
-async def login(user_login: UserLogin, db: Session = Depends(get_db)):
+@router.post(
+    "/auth/login",
+    response_model=Token,
+    dependencies=[Depends(rate_limit(RateLimitRule.parse("ip", settings.rate_limit_login)))]
+)
+async def login(user_login: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return tokens."""
-    user = authenticate_user(db, user_login.email, user_login.password)
+    try:
+        user = await authenticate_user_async(db, user_login.email, user_login.password)
+    except HashPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress",
+            headers={"Retry-After": "1"}
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(data={"sub": user.email})
+    activity.record(user.id)
+    claims = await permission_claims_async(db, user)
+    access_token = create_access_token(data={"sub": user.email, **claims})
     refresh_token = create_refresh_token(data={"sub": user.email})
     
     return {
@@ -58,7 +91,7 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
 @router.post("/auth/refresh", response_model=Token)
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Refresh access token."""
     token_data = verify_token(credentials.credentials, verify_refresh=True)
@@ -68,14 +101,15 @@ async def refresh_token(
             detail="Invalid refresh token"
         )
     
-    user = user_crud.get_by_email(db, token_data.email)
+    user = await user_crud.get_by_email(db, email=token_data.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    access_token = create_access_token(data={"sub": user.email})
+    claims = await permission_claims_async(db, user)
+    access_token = create_access_token(data={"sub": user.email, **claims})
     refresh_token = create_refresh_token(data={"sub": user.email})
     
     return {
@@ -87,54 +121,250 @@ async def refresh_token(
 
 
 # User endpoints
-@router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/users",
+    response_model=UserResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(load_profile("user.detail", query_budget=5))]
+)
 async def create_user(
     user: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new user."""
-    if user_crud.get_by_email(db, user.email):
+    if await user_crud.get_by_email(db, email=user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    if user_crud.get_by_username(db, user.username):
+    if await user_crud.get_by_username(db, username=user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
-    return user_crud.create(db, user)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except HashPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress",
+            headers={"Retry-After": "1"}
+        )
+    
+    return await user_crud.create(db, obj_in=user, hashed_password=hashed_password)
+
+
+BATCH_SUCCESS = {"created", "updated", "deleted"}
+
+
+def _batch_response(results) -> dict:
+    succeeded = sum(1 for result in results if result.status in BATCH_SUCCESS)
+    return {
+        "results": [result._asdict() for result in results],
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
+    }
+
+
+def _batch_conflict() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Batch conflicted with a concurrent write, retry it"
+    )
+
+
+@router.post(
+    "/users:batchCreate",
+    response_model=BatchResponse,
+    dependencies=[Depends(load_profile("user.batch", query_budget=3))]
+)
+async def batch_create_users(
+    batch: BatchUserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create users in one transaction.
+    
+    Each item gets its own result; items that clash with existing users
+    are skipped without failing the rest of the batch.
+    """
+    try:
+        results = await user_crud.create_many(db, items=batch.items)
+    except HashPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress",
+            headers={"Retry-After": "1"}
+        )
+    except IntegrityError:
+        raise _batch_conflict()
+    return _batch_response(results)
+
+
+# Runs one UPDATE per distinct set of fields, so there is no fixed budget
+@router.post(
+    "/users:batchUpdate",
+    response_model=BatchResponse,
+    dependencies=[Depends(load_profile("user.batch"))]
+)
+async def batch_update_users(
+    batch: BatchUserUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Update users in one transaction, with a result per item."""
+    try:
+        results = await user_crud.update_many(db, items=batch.items)
+    except IntegrityError:
+        raise _batch_conflict()
+    return _batch_response(results)
+
+
+@router.post(
+    "/users:batchDelete",
+    response_model=BatchResponse,
+    dependencies=[Depends(load_profile("user.batch", query_budget=3))]
+)
+async def batch_delete_users(
+    batch: BatchUserDelete,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Delete users in one transaction, with a result per ID."""
+    return _batch_response(await user_crud.remove_many(db, ids=batch.ids))
 
 
-@router.get("/users", response_model=PaginatedResponse)
+@router.get(
+    "/users",
+    response_model=PaginatedResponse[UserResponse],
+    dependencies=[Depends(load_profile("user.list", query_budget=5))]
+)
 async def get_users(
     pagination: PaginationParams = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all users with pagination."""
-    users, total = user_crud.get_multi(db, skip=(pagination.page - 1) * pagination.size, limit=pagination.size)
+    page = await user_crud.get_multi(db, skip=(pagination.page - 1) * pagination.size, limit=pagination.size)
     
     return {
-        "items": users,
-        "total": total,
+        "items": page.items,
+        "total": page.total,
         "page": pagination.page,
         "size": pagination.size,
-        "pages": (total + pagination.size - 1) // pagination.size
+        "pages": (page.total + pagination.size - 1) // pagination.size,
+        "total_strategy": page.total_strategy
     }
 
 
-@router.get("/users/{user_id}", response_model=UserResponse)
+@router.get("/users/export")
+async def export_users(
+    request: Request,
+    response: Response,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream every user as NDJSON or CSV.
+    
+    Rows are read in chunks from a server-side cursor, so memory use does
+    not grow with the table.
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    replica = await read_replica(client_key(request))
+    export = StreamingResponse(
+        stream_export(user_crud.export_statement(), format, replica=replica),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+    # Headers set by dependencies, like RateLimit-*, are only merged into returned data
+    export.headers.update(response.headers)
+    return export
+
+
+@router.get(
+    "/users/search",
+    response_model=List[UserResponse],
+    dependencies=[Depends(load_profile("user.list", query_budget=4))]
+)
+async def search_users(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Search users by email, username or name, best matches first."""
+    return await user_crud.search(db, query=q, limit=limit)
+
+
+async def _cursor_page(crud, db: AsyncSession, params: CursorParams) -> dict:
+    try:
+        items, next_cursor = await crud.get_page(db, cursor=params.cursor, limit=params.size)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return {"items": items, "size": params.size, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/users/cursor",
+    response_model=CursorPaginatedResponse[UserResponse],
+    dependencies=[Depends(load_profile("user.list", query_budget=4))]
+)
+async def get_users_by_cursor(
+    params: CursorParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get users with keyset pagination.
+    
+    Pass a response's ``next_cursor`` as ``cursor`` to fetch the next page.
+    """
+    return await _cursor_page(user_crud, db, params)
+
+
+@router.get(
+    "/users/{user_id}",
+    response_model=UserResponse,
+    dependencies=[
+        Depends(load_profile("user.detail", query_budget=3)),
+        Depends(row_etag(
+            User.updated_at, User.last_login,
+            tables=("user_roles", "roles", "role_permissions", "permissions"), param="user_id"
+        )),
+    ]
+)
 async def get_user(
     user_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get user by ID."""
-    user = user_crud.get(db, user_id)
+    """Get user by ID.
+    
+    The flight key carries the table versions, so a request that starts
+    after a write never joins a load that began before it, and the read
+    target, so clients kept on the primary never get a replica's answer.
+    The load is shared with other callers, so it uses its own session on
+    the same target rather than the first caller's.
+    """
+    replica = db.sync_session.info.get("replica")
+    
+    async def load():
+        async with AsyncSessionLocal(info={"replica": replica}) as session:
+            user = await user_crud.get(session, user_id)
+            return UserResponse.model_validate(user) if user is not None else None
+    
+    target = "primary" if replica is None else "replica"
+    key = ":".join(str(part) for part in (user_id, target, *await table_versions_async(USER_DETAIL_TABLES)))
+    user = await user_flights.do(key, load)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -143,69 +373,118 @@ async def get_user(
     return user
 
 
-@router.put("/users/{user_id}", response_model=UserResponse)
+@router.put(
+    "/users/{user_id}",
+    response_model=UserResponse,
+    dependencies=[Depends(load_profile("user.detail", query_budget=4))]
+)
 async def update_user(
     user_id: uuid.UUID,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Update user."""
-    user = user_crud.get(db, user_id)
+    user = await user_crud.get(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user_crud.update(db, db_obj=user, obj_in=user_update)
+    try:
+        return await user_crud.update(db, db_obj=user, obj_in=user_update)
+    except HashPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress",
+            headers={"Retry-After": "1"}
+        )
 
 
-@router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/users/{user_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(load_profile("user.delete", query_budget=5))]
+)
 async def delete_user(
     user_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Delete user."""
-    user = user_crud.get(db, user_id)
+    user = await user_crud.get(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    user_crud.remove(db, id=user_id)
+    await user_crud.remove(db, id=user_id)
 
 
 # Role endpoints
-@router.post("/roles", response_model=RoleResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/roles",
+    response_model=RoleResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(load_profile("role.detail", query_budget=3))]
+)
 async def create_role(
     role: RoleCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new role."""
-    return role_crud.create(db, role)
+    return await role_crud.create(db, obj_in=role)
 
 
-@router.get("/roles", response_model=List[RoleResponse])
+@router.get(
+    "/roles",
+    response_model=List[RoleResponse],
+    dependencies=[
+        Depends(load_profile("role.list", query_budget=3)),
+        Depends(table_etag("roles", "role_permissions", "permissions")),
+    ]
+)
 async def get_roles(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all roles."""
-    return role_crud.get_multi(db)
+    page = await role_crud.get_multi(db)
+    return page.items
 
 
-@router.get("/roles/{role_id}", response_model=RoleResponse)
+@router.get(
+    "/roles/cursor",
+    response_model=CursorPaginatedResponse[RoleResponse],
+    dependencies=[Depends(load_profile("role.list", query_budget=3))]
+)
+async def get_roles_by_cursor(
+    params: CursorParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get roles with keyset pagination."""
+    return await _cursor_page(role_crud, db, params)
+
+
+@router.get(
+    "/roles/{role_id}",
+    response_model=RoleResponse,
+    dependencies=[
+        Depends(load_profile("role.detail", query_budget=3)),
+        Depends(row_etag(Role.updated_at, tables=("role_permissions", "permissions"), param="role_id")),
+    ]
+)
 async def get_role(
     role_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get role by ID."""
-    role = role_crud.get(db, role_id)
+    role = await role_crud.get(db, role_id)
     if not role:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -215,39 +494,92 @@ async def get_role(
 
 
 # Permission endpoints
-@router.post("/permissions", response_model=PermissionResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/permissions",
+    response_model=PermissionResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(load_profile("permission.detail", query_budget=3))]
+)
 async def create_permission(
     permission: PermissionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a new permission."""
-    return permission_crud.create(db, permission)
+    return await permission_crud.create(db, obj_in=permission)
 
 
-@router.get("/permissions", response_model=List[PermissionResponse])
+@router.get(
+    "/permissions",
+    response_model=List[PermissionResponse],
+    dependencies=[
+        Depends(load_profile("permission.list", query_budget=3)),
+        Depends(table_etag("permissions")),
+    ]
+)
 async def get_permissions(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all permissions."""
-    return permission_crud.get_multi(db)
+    page = await permission_crud.get_multi(db)
+    return page.items
+
+
+@router.get(
+    "/permissions/cursor",
+    response_model=CursorPaginatedResponse[PermissionResponse],
+    dependencies=[Depends(load_profile("permission.list", query_budget=3))]
+)
+async def get_permissions_by_cursor(
+    params: CursorParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get permissions with keyset pagination."""
+    return await _cursor_page(permission_crud, db, params)
+
+
+# Admin endpoints
+@router.get("/admin/slow-queries", response_model=SlowQueryLogResponse)
+async def get_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Most recent statements over the slow-query threshold, with their plans."""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return {"threshold_ms": settings.slow_query_ms, "items": slow_queries.entries(limit)}
 
 {%- elif values.framework == "django" -%}
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, throttle_classes, action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, login
 from django.core.paginator import Paginator
-from django.db.models import Q
 
 from .models import User, Role, Permission
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserUpdateSerializer, UserLoginSerializer,
     RoleSerializer, PermissionSerializer
 )
+from .ratelimit import LoginRateThrottle
+from .search import search_users
+from .slowqueries import slow_queries
+
+
+def _limit_param(request, default: int, maximum: int):
+    """The ``limit`` query parameter, or None unless it is an integer from 1 to ``maximum``."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= maximum else None
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -266,14 +598,21 @@ class UserViewSet(viewsets.ModelViewSet):
         queryset = User.objects.all()
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(email__icontains=search) |
-                Q(username__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            queryset = search_users(queryset, search)
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search users by email, username or name, best matches first."""
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response({'error': 'q must be at least 2 characters'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = _limit_param(request, 20, 100)
+        if limit is None:
+            return Response({'error': 'limit must be an integer from 1 to 100'}, status=status.HTTP_400_BAD_REQUEST)
+        users = search_users(User.objects.prefetch_related('roles'), query)[:limit]
+        return Response(UserSerializer(users, many=True).data)
+    
     @action(detail=True, methods=['post'])
     def set_password(self, request, pk=None):
         """Set user password."""
@@ -326,6 +665,7 @@ class PermissionViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def login_view(request):
     """User login endpoint."""
     serializer = UserLoginSerializer(data=request.data, context={'request': request})
@@ -344,6 +684,7 @@ def login_view(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def register_view(request):
     """User registration endpoint."""
     serializer = UserCreateSerializer(data=request.data)
@@ -378,6 +719,19 @@ def update_profile_view(request):
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def slow_queries_view(request):
+    """Most recent statements over the slow-query threshold, with their plans."""
+    limit = _limit_param(request, 100, 1000)
+    if limit is None:
+        return Response({'error': 'limit must be an integer from 1 to 1000'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'threshold_ms': slow_queries.threshold * 1000,
+        'items': slow_queries.entries(limit),
+    })
+
 {%- elif values.framework == "flask" -%}
 from flask import Blueprint, request, jsonify, current_app
 from flask_restful import Api, Resource
@@ -393,10 +747,19 @@ from .schemas import (
     UserSchema, UserCreateSchema, UserUpdateSchema, UserLoginSchema,
     RoleSchema, PermissionSchema, TokenSchema, PaginatedResponseSchema
 )
+from .config import settings
+from .ratelimit import RateLimitRule, limit
+from .search import search_clauses
+from .slowqueries import SlowQueryLog
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
-api = Api(api_bp)
+api = Api(api_bp, decorators=[
+    limit(
+        RateLimitRule.parse("ip", settings.RATE_LIMIT_IP),
+        RateLimitRule.parse("user", settings.RATE_LIMIT_USER),
+    )
+])
 
 # Initialize schemas
 user_schema = UserSchema()
@@ -411,8 +774,18 @@ permissions_schema = PermissionSchema(many=True)
 token_schema = TokenSchema()
 
 
+def _limit_arg(default: int, maximum: int):
+    """The ``limit`` query argument, or None unless it is an integer from 1 to ``maximum``."""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= maximum else None
+
+
 class AuthResource(Resource):
     """Authentication resource."""
+    decorators = [limit(RateLimitRule.parse("ip", settings.RATE_LIMIT_LOGIN))]
     
     def post(self):
         """User login."""
@@ -469,12 +842,10 @@ class UserListResource(Resource):
         
         query = User.query
         if search:
-            query = query.filter(
-                (User.email.contains(search)) |
-                (User.username.contains(search)) |
-                (User.first_name.contains(search)) |
-                (User.last_name.contains(search))
-            )
+            where, rank = search_clauses(search, db.engine.dialect.name)
+            query = query.filter(where).order_by(rank.desc(), User.created_at, User.id)
+        else:
+            query = query.order_by(User.created_at, User.id)
         
         paginated_users = query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -523,6 +894,24 @@ class UserListResource(Resource):
             return {'message': 'User creation failed'}, 400
 
 
+class UserSearchResource(Resource):
+    """Ranked user search resource."""
+    
+    @jwt_required()
+    def get(self):
+        """Search users by email, username or name, best matches first."""
+        query = request.args.get('q', '').strip()
+        if len(query) < 2:
+            return {'message': 'q must be at least 2 characters'}, 400
+        limit = _limit_arg(20, 100)
+        if limit is None:
+            return {'message': 'limit must be an integer from 1 to 100'}, 400
+        
+        where, rank = search_clauses(query, db.engine.dialect.name)
+        users = User.query.filter(where).order_by(rank.desc(), User.created_at, User.id).limit(limit).all()
+        return {'items': users_schema.dump(users)}
+
+
 class UserResource(Resource):
     """Individual user resource."""
     
@@ -574,7 +963,7 @@ class RoleListResource(Resource):
     @jwt_required()
     def get(self):
         """Get all roles."""
-        roles = Role.query.all()
+        roles = Role.query.order_by(Role.created_at, Role.id).all()
         return roles_schema.dump(roles)
     
     @jwt_required()
@@ -611,7 +1000,7 @@ class PermissionListResource(Resource):
     @jwt_required()
     def get(self):
         """Get all permissions."""
-        permissions = Permission.query.all()
+        permissions = Permission.query.order_by(Permission.created_at, Permission.id).all()
         return permissions_schema.dump(permissions)
     
     @jwt_required()
@@ -630,12 +1019,30 @@ class PermissionListResource(Resource):
             return {'message': 'Permission creation failed'}, 400
 
 
+class SlowQueryResource(Resource):
+    """Slow-query log resource."""
+    
+    @jwt_required()
+    def get(self):
+        """Most recent statements over the slow-query threshold, with their plans."""
+        user = User.query.get(get_jwt_identity())
+        if not user or not user.is_superuser:
+            return {'message': 'Insufficient permissions'}, 403
+        log: SlowQueryLog = current_app.extensions['slow_queries']
+        limit = _limit_arg(100, 1000)
+        if limit is None:
+            return {'message': 'limit must be an integer from 1 to 1000'}, 400
+        return {'threshold_ms': log.threshold * 1000, 'items': log.entries(limit)}
+
+
 # Register resources
 api.add_resource(AuthResource, '/auth/login')
 api.add_resource(RefreshTokenResource, '/auth/refresh')
 api.add_resource(UserListResource, '/users')
+api.add_resource(UserSearchResource, '/users/search')
 api.add_resource(UserResource, '/users/<string:user_id>')
 api.add_resource(RoleListResource, '/roles')
 api.add_resource(RoleResource, '/roles/<string:role_id>')
 api.add_resource(PermissionListResource, '/permissions')
+api.add_resource(SlowQueryResource, '/admin/slow-queries')
 {%- endif %}
@@ -3,33 +3,81 @@ Authentication and authorization utilities.
 """
 {% if values.framework == "fastapi" -%}
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-
+from redis import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from .activity import activity
+from .bus import bus
+from .cache import LRUCache, async_redis_client, redis_client
 from .config import settings
-from .database import get_db
-from .models import User
+from .database import get_async_db
+from .hashing import hash_pool, password_hasher
+from .models import User, Permission, user_roles, role_permissions
 from .schemas import TokenData
+from .versions import versions
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # JWT settings
 security = HTTPBearer()
 
+# Decoded tokens keyed by digest, each kept until its own expiry
+token_cache = LRUCache("jwt", maxsize=settings.jwt_cache_size)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash password."""
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify password on the hashing pool."""
+    return await hash_pool.run("verify", verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash password on the hashing pool."""
+    return await hash_pool.run("hash", get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords: List[str]) -> List[str]:
+    """Hash a batch of passwords on the hashing pool, in order."""
+    return await hash_pool.run_many("hash", get_password_hash, [(password,) for password in passwords])
+
+
+def _save_rehash(db: Session, user: User, new_hash: Optional[str]) -> None:
+    """Persist a hash upgraded to the current scheme and cost parameters."""
+    if new_hash is None:
+        return
+    user.hashed_password = new_hash
+    db.add(user)
+    db.commit()
+
+
+async def _save_rehash_async(db: AsyncSession, user: User, new_hash: Optional[str]) -> None:
+    """Persist an upgraded hash on an async session."""
+    if new_hash is None:
+        return
+    user.hashed_password = new_hash
+    db.add(user)
+    await db.commit()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -58,25 +106,45 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(token: str, verify_refresh: bool = False) -> Optional[TokenData]:
-    """Verify JWT token."""
+def _decode_token(token: str) -> Optional[Tuple[str, TokenData]]:
+    """Decode a token, reusing a previous decode while it is unexpired."""
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        token_type: str = payload.get("type")
-        
-        if email is None:
-            return None
-        
-        if verify_refresh and token_type != "refresh":
-            return None
-        elif not verify_refresh and token_type != "access":
-            return None
-        
-        token_data = TokenData(email=email)
-        return token_data
     except JWTError:
         return None
+    
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    
+    decoded = (
+        payload.get("type"),
+        TokenData(email=email, scopes=payload.get("perms", []), permissions_version=payload.get("pv")),
+    )
+    exp = payload.get("exp")
+    if exp is not None and exp > time.time():
+        token_cache.set(key, decoded, ttl=exp - time.time())
+    return decoded
+
+
+def verify_token(token: str, verify_refresh: bool = False) -> Optional[TokenData]:
+    """Verify JWT token."""
+    decoded = _decode_token(token)
+    if decoded is None:
+        return None
+    
+    token_type, token_data = decoded
+    if verify_refresh and token_type != "refresh":
+        return None
+    elif not verify_refresh and token_type != "access":
+        return None
+    
+    return token_data
 
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
@@ -84,14 +152,216 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    _save_rehash(db, user, new_hash)
     return user
 
 
-def get_current_user(
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    """Authenticate user without blocking the event loop on bcrypt or the database."""
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+    if not user:
+        return None
+    valid, new_hash = await hash_pool.run(
+        "verify", password_hasher.verify_and_update, password, user.hashed_password
+    )
+    if not valid:
+        return None
+    await _save_rehash_async(db, user, new_hash)
+    return user
+
+
+class IdentityCache:
+    """Snapshots of user rows keyed by token subject.
+    
+    Lookups go to an in-process LRU first, then to Redis when
+    ``identity_cache_redis_url`` is set, and only then to the database.
+    Cached snapshots are attached to the request session without a query.
+    On a sync session, relationships and excluded columns lazy-load when
+    accessed. Users from :meth:`get_async` must not touch either: lazy
+    loads cannot run on an async session and raise ``MissingGreenlet``.
+    Permissions go through ``permission_index`` instead. The ``_async``
+    methods talk to Redis without blocking the event loop.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, maxsize: int, ttl: int, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self._local = LRUCache("identity", maxsize=maxsize, ttl=ttl)
+        # Subjects by user id, for evictions that only know the row
+        self._subjects = LRUCache("identity_subjects", maxsize=maxsize)
+        self._redis = redis_client(redis_url)
+        self._async_redis = async_redis_client(redis_url)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, subject: str) -> str:
+        return f"identity:v{self.VERSION}:{subject}"
+    
+    # Left unloaded on cached users; only the sync path can lazy-load it
+    EXCLUDED_COLUMNS = {"hashed_password"}
+    
+    @classmethod
+    def _snapshot(cls, user: User) -> Dict[str, Any]:
+        return {
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+            if column.key not in cls.EXCLUDED_COLUMNS
+        }
+    
+    @staticmethod
+    def _encode(snapshot: Dict[str, Any]) -> str:
+        return json.dumps(snapshot, default=str)
+    
+    @staticmethod
+    def _decode(raw: bytes) -> Dict[str, Any]:
+        snapshot = json.loads(raw)
+        for column in User.__table__.columns:
+            value = snapshot.get(column.key)
+            if value is None:
+                continue
+            if column.type.python_type is uuid.UUID:
+                snapshot[column.key] = uuid.UUID(value)
+            elif column.type.python_type is datetime:
+                snapshot[column.key] = datetime.fromisoformat(value)
+        return snapshot
+    
+    def _read_redis(self, subject: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(self._key(subject))
+        except RedisError as e:
+            logger.warning(f"Identity cache read failed: {e}")
+            return None
+        return self._decode(raw) if raw else None
+    
+    async def _read_redis_async(self, subject: str) -> Optional[Dict[str, Any]]:
+        if self._async_redis is None:
+            return None
+        try:
+            raw = await self._async_redis.get(self._key(subject))
+        except RedisError as e:
+            logger.warning(f"Identity cache read failed: {e}")
+            return None
+        return self._decode(raw) if raw else None
+    
+    def _store_local(self, subject: str, snapshot: Dict[str, Any], generation: int) -> bool:
+        """Keep ``snapshot`` unless the subject was invalidated since ``generation``."""
+        with self._lock:
+            if self._generations.get(subject, 0) != generation:
+                return False
+            self._local.set(subject, snapshot)
+            self._subjects.set(str(snapshot["id"]), subject)
+        return True
+    
+    def _store(self, subject: str, snapshot: Dict[str, Any], generation: int) -> None:
+        if self._store_local(subject, snapshot, generation) and self._redis is not None:
+            try:
+                self._redis.set(self._key(subject), self._encode(snapshot), ex=self.ttl)
+            except RedisError as e:
+                logger.warning(f"Identity cache write failed: {e}")
+    
+    async def _store_async(self, subject: str, snapshot: Dict[str, Any], generation: int) -> None:
+        if self._store_local(subject, snapshot, generation) and self._async_redis is not None:
+            try:
+                await self._async_redis.set(self._key(subject), self._encode(snapshot), ex=self.ttl)
+            except RedisError as e:
+                logger.warning(f"Identity cache write failed: {e}")
+    
+    def _cached(self, subject: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Return a cached snapshot, if any, and the generation it was read at."""
+        generation = self._generations.get(subject, 0)
+        snapshot = self._local.get(subject)
+        if snapshot is None:
+            snapshot = self._read_redis(subject)
+            if snapshot is not None:
+                self._store(subject, snapshot, generation)
+        return snapshot, generation
+    
+    async def _cached_async(self, subject: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        generation = self._generations.get(subject, 0)
+        snapshot = self._local.get(subject)
+        if snapshot is None:
+            snapshot = await self._read_redis_async(subject)
+            if snapshot is not None:
+                self._store_local(subject, snapshot, generation)
+        return snapshot, generation
+    
+    @staticmethod
+    def _detached(snapshot: Dict[str, Any]) -> User:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+    
+    def get(self, db: Session, subject: str) -> Optional[User]:
+        """Return the user for a token subject, attached to ``db``."""
+        snapshot, generation = self._cached(subject)
+        if snapshot is None:
+            user = db.execute(select(User).where(User.email == subject)).scalar_one_or_none()
+            if user is not None:
+                self._store(subject, self._snapshot(user), generation)
+            return user
+        return db.merge(self._detached(snapshot), load=False)
+    
+    async def get_async(self, db: AsyncSession, subject: str) -> Optional[User]:
+        """Return the user for a token subject, attached to an async ``db``."""
+        snapshot, generation = await self._cached_async(subject)
+        if snapshot is None:
+            user = (await db.execute(select(User).where(User.email == subject))).scalar_one_or_none()
+            if user is not None:
+                await self._store_async(subject, self._snapshot(user), generation)
+            return user
+        return await db.merge(self._detached(snapshot), load=False)
+    
+    def _invalidate_local(self, subject: str) -> None:
+        with self._lock:
+            self._generations[subject] = self._generations.get(subject, 0) + 1
+            self._local.delete(subject)
+    
+    def invalidate(self, subject: str) -> None:
+        """Drop a subject after its user row changes."""
+        self._invalidate_local(subject)
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._key(subject))
+            except RedisError as e:
+                logger.warning(f"Identity cache invalidation failed: {e}")
+    
+    async def invalidate_async(self, subject: str) -> None:
+        """Drop a subject after its user row changes, from async code."""
+        self._invalidate_local(subject)
+        if self._async_redis is not None:
+            try:
+                await self._async_redis.delete(self._key(subject))
+            except RedisError as e:
+                logger.warning(f"Identity cache invalidation failed: {e}")
+    
+    def forget(self, user_id: Any) -> None:
+        """Drop the subject cached for a user row written elsewhere."""
+        subject = self._subjects.get(str(user_id))
+        if subject is not None:
+            self.invalidate(subject)
+    
+    def forget_all(self) -> None:
+        """Drop every snapshot in this process."""
+        with self._lock:
+            self._local.clear()
+
+
+identity_cache = IdentityCache(
+    maxsize=settings.identity_cache_size,
+    ttl=settings.identity_cache_ttl,
+    redis_url=settings.identity_cache_redis_url,
+)
+
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user from token."""
     credentials_exception = HTTPException(
@@ -104,10 +374,11 @@ def get_current_user(
     if token_data is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = await identity_cache.get_async(db, token_data.email)
     if user is None:
         raise credentials_exception
     
+    activity.record(user.id)
     return user
 
 
@@ -118,23 +389,210 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-def check_permission(user: User, resource: str, action: str) -> bool:
+class PermissionIndex:
+    """Compiled ``(resource, action)`` sets per user.
+
+    Each entry is built with a single query and stamped with the shared
+    ``rbac`` version plus the user's own local generation. Any change to
+    role permissions or role assignments bumps the shared version, which
+    also marks permission claims in older access tokens as stale.
+    """
+    
+    VERSION_NAME = "rbac"
+    
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries: Dict[Any, Tuple[Tuple[int, int], FrozenSet[Tuple[str, str]]]] = {}
+        self._generations: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def version(self) -> int:
+        return versions.get(self.VERSION_NAME)
+    
+    async def version_async(self) -> int:
+        """Like :attr:`version`, for callers on the event loop."""
+        return await versions.get_async(self.VERSION_NAME)
+    
+    def _stamp(self, user_id: Any) -> Tuple[int, int]:
+        return self.version, self._generations.get(user_id, 0)
+    
+    @staticmethod
+    def _statement(user_id: Any):
+        return (
+            select(Permission.resource, Permission.action)
+            .join(role_permissions, role_permissions.c.permission_id == Permission.id)
+            .join(user_roles, user_roles.c.role_id == role_permissions.c.role_id)
+            .where(user_roles.c.user_id == user_id)
+        )
+    
+    def _cached(self, user_id: Any, stamp: Tuple[int, int]) -> Optional[FrozenSet[Tuple[str, str]]]:
+        # A version that could not be read may hide another worker's change
+        if not versions.synced(self.VERSION_NAME):
+            return None
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        return None
+    
+    def get(self, db: Session, user_id: Any) -> FrozenSet[Tuple[str, str]]:
+        """Return the compiled permission set for a user."""
+        stamp = self._stamp(user_id)
+        permissions = self._cached(user_id, stamp)
+        if permissions is None:
+            rows = db.execute(self._statement(user_id)).all()
+            permissions = self._remember(user_id, stamp, rows)
+        return permissions
+    
+    async def get_async(self, db: AsyncSession, user_id: Any) -> FrozenSet[Tuple[str, str]]:
+        """Return the compiled permission set for a user from an async ``db``."""
+        stamp = await self.version_async(), self._generations.get(user_id, 0)
+        permissions = self._cached(user_id, stamp)
+        if permissions is None:
+            rows = (await db.execute(self._statement(user_id))).all()
+            permissions = self._remember(user_id, stamp, rows)
+        return permissions
+    
+    def _remember(self, user_id: Any, stamp: Tuple[int, int], rows) -> FrozenSet[Tuple[str, str]]:
+        permissions = frozenset((row.resource, row.action) for row in rows)
+        with self._lock:
+            # An invalidation that raced with the load leaves the entry
+            # stamped with an old version, so the next lookup rebuilds it.
+            self._entries.pop(user_id, None)
+            if len(self._entries) >= self.maxsize:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (stamp, permissions)
+        return permissions
+    
+    def invalidate_user(self, user_id: Any) -> None:
+        """Drop a user's entry in this process."""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+    
+    def invalidate_all(self) -> None:
+        """Drop every entry after role permissions or assignments change."""
+        versions.bump(self.VERSION_NAME)
+        self.forget_all()
+    
+    async def invalidate_all_async(self) -> None:
+        """Like :meth:`invalidate_all`, for callers on the event loop."""
+        await versions.bump_async(self.VERSION_NAME)
+        self.forget_all()
+    
+    def forget_all(self) -> None:
+        """Drop every entry in this process."""
+        with self._lock:
+            self._entries.clear()
+
+
+permission_index = PermissionIndex()
+
+
+@bus.on("users")
+def _evict_user(user_id: Optional[str]) -> None:
+    if user_id is None:
+        identity_cache.forget_all()
+        permission_index.forget_all()
+    else:
+        identity_cache.forget(user_id)
+        permission_index.invalidate_user(uuid.UUID(user_id))
+
+
+@bus.on("user_roles", "role_permissions", "permissions")
+def _evict_permissions(row_id: Optional[str]) -> None:
+    permission_index.forget_all()
+
+
+def _claims(permissions: FrozenSet[Tuple[str, str]], version: int) -> Dict[str, Any]:
+    return {
+        "perms": sorted(f"{resource}:{action}" for resource, action in permissions),
+        "pv": version,
+    }
+
+
+def permission_claims(db: Session, user: User) -> Dict[str, Any]:
+    """Claims embedding the user's compiled permissions in an access token."""
+    if not settings.jwt_embed_permissions:
+        return {}
+    
+    # Read the version first so a concurrent change leaves the token stale
+    version = permission_index.version
+    permissions = permission_index.get(db, user.id)
+    return _claims(permissions, version)
+
+
+async def permission_claims_async(db: AsyncSession, user: User) -> Dict[str, Any]:
+    """Permission claims for an access token, loaded from an async ``db``."""
+    if not settings.jwt_embed_permissions:
+        return {}
+    
+    version = await permission_index.version_async()
+    permissions = await permission_index.get_async(db, user.id)
+    return _claims(permissions, version)
+
+
+def check_token_permission(token_data: Optional[TokenData], resource: str, action: str) -> Optional[bool]:
+    """Authorize from token claims, or return None if they are absent or stale.
+    
+    Claims are only trusted while every worker agrees on the ``rbac``
+    version; otherwise a revocation made elsewhere could go unnoticed.
+    """
+    if token_data is None or token_data.permissions_version is None:
+        return None
+    # Read the version first: a failed read leaves it unshared
+    return _token_allows(token_data, permission_index.version, resource, action)
+
+
+async def check_token_permission_async(
+    token_data: Optional[TokenData], resource: str, action: str
+) -> Optional[bool]:
+    """Like :func:`check_token_permission`, reading the version off the event loop."""
+    if token_data is None or token_data.permissions_version is None:
+        return None
+    return _token_allows(token_data, await permission_index.version_async(), resource, action)
+
+
+def _token_allows(token_data: TokenData, version: int, resource: str, action: str) -> Optional[bool]:
+    if not versions.shared(permission_index.VERSION_NAME):
+        return None
+    if token_data.permissions_version != version:
+        return None
+    return f"{resource}:{action}" in token_data.scopes
+
+
+def check_permission(
+    user: User, resource: str, action: str, db: Optional[Session] = None
+) -> bool:
     """Check if user has permission for resource and action."""
     if user.is_superuser:
         return True
     
-    for role in user.roles:
-        for permission in role.permissions:
-            if permission.resource == resource and permission.action == action:
-                return True
+    db = db or object_session(user)
+    return (resource, action) in permission_index.get(db, user.id)
+
+
+async def check_permission_async(user: User, resource: str, action: str, db: AsyncSession) -> bool:
+    """Check a permission, loading the user's permission set from an async ``db``."""
+    if user.is_superuser:
+        return True
     
-    return False
+    return (resource, action) in await permission_index.get_async(db, user.id)
 
 
 def require_permission(resource: str, action: str):
     """Decorator to require specific permission."""
-    def permission_checker(current_user: User = Depends(get_current_active_user)):
-        if not check_permission(current_user, resource, action):
+    async def permission_checker(
+        credentials: HTTPAuthorizationCredentials = Depends(security),
+        current_user: User = Depends(get_current_active_user),
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        allowed = None
+        if not current_user.is_superuser:
+            allowed = await check_token_permission_async(verify_token(credentials.credentials), resource, action)
+        if allowed is None:
+            allowed = await check_permission_async(current_user, resource, action, db)
+        if not allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions"
@@ -0,0 +1,181 @@
+{% if values.framework == "fastapi" -%}
+"""
+Cross-worker cache invalidation over Redis pub/sub.
+
+Each commit publishes one compact message listing what it wrote as
+``[entity, id, version]`` triples: the table, the row's primary key (or
+null when the rows are unknown, as after a bulk UPDATE) and the table's
+version after the commit. Every worker subscribes, takes the newer
+versions and runs the eviction handlers registered for each entity, so
+in-process caches drop a row as soon as any worker writes it instead of
+when their TTL runs out.
+
+Pub/sub does not queue messages for a disconnected subscriber. After
+every (re)subscribe a worker compares the shared table versions with
+the last ones it saw and evicts every cached row of a table that moved.
+"""
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from prometheus_client import Counter
+from redis import RedisError
+
+from .cache import redis_client
+from .config import settings
+from .versions import commit_hooks, table_version_name, versions
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+INVALIDATIONS_PUBLISHED = Counter('invalidations_published_total', 'Invalidation events published', ['entity'])
+INVALIDATIONS_APPLIED = Counter('invalidations_applied_total', 'Invalidation events applied', ['entity'])
+INVALIDATION_RECONCILES = Counter(
+    'invalidation_reconciles_total', 'Entities evicted wholesale after missed events', ['entity']
+)
+
+# A commit writing more rows of one table than this sends one event for the whole table
+MAX_IDS_PER_ENTITY = 100
+
+Event = Tuple[str, Optional[str], int]
+Handler = Callable[[Optional[str]], None]
+
+
+class InvalidationBus:
+    """Publishes the rows each commit wrote and applies other workers' events.
+
+    Handlers are called with the row's id as a string, or None for any
+    row of the entity. Local writes run them on the committing thread, or
+    on a worker thread for async sessions, and remote ones on the listener
+    thread, so they must be quick and thread-safe. Without Redis, events
+    are only applied locally.
+    """
+
+    def __init__(self, redis_url: Optional[str], channel: str, retry_interval: float = 1.0):
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._redis = redis_client(redis_url)
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def on(self, *entities: str) -> Callable[[Handler], Handler]:
+        """Decorator registering an eviction handler for ``entities``."""
+        def register(handler: Handler) -> Handler:
+            for entity in entities:
+                self._handlers[entity].append(handler)
+            return handler
+        return register
+
+    @staticmethod
+    def events(rows: Dict[str, Set[Any]], bumped: Dict[str, int]) -> List[Event]:
+        """Events for a commit's written ``rows`` and the versions it bumped."""
+        events = []
+        for entity, ids in rows.items():
+            if None in ids or len(ids) > MAX_IDS_PER_ENTITY:
+                events.append((entity, None, bumped[entity]))
+            else:
+                events.extend((entity, str(row_id), bumped[entity]) for row_id in ids)
+        return events
+
+    def committed(self, rows: Dict[str, Set[Any]], bumped: Dict[str, int]) -> None:
+        """Evict locally, then tell the other workers."""
+        events = self.events(rows, bumped)
+        self.apply(events)
+        self.publish(events)
+
+    def publish(self, events: List[Event]) -> None:
+        if self._redis is None or not events:
+            return
+        try:
+            self._redis.publish(self.channel, json.dumps(events, separators=(",", ":")))
+        except RedisError as e:
+            # Subscribers catch up from the version counters when they reconnect
+            logger.warning(f"Invalidation publish failed: {e}")
+            return
+        for entity, _, _ in events:
+            INVALIDATIONS_PUBLISHED.labels(entity=entity).inc()
+
+    def apply(self, events: Iterable[Event]) -> None:
+        """Take each event's version and evict its row."""
+        for entity, row_id, version in events:
+            versions.observe(table_version_name(entity), version)
+            with self._lock:
+                self._seen[entity] = max(self._seen.get(entity, 0), version)
+            self._evict(entity, row_id)
+            INVALIDATIONS_APPLIED.labels(entity=entity).inc()
+
+    def _evict(self, entity: str, row_id: Optional[str]) -> None:
+        for handler in self._handlers.get(entity, ()):
+            try:
+                handler(row_id)
+            except Exception as exc:
+                logger.warning(f"Invalidation handler for {entity} failed: {exc}")
+
+    def reconcile(self) -> None:
+        """Evict every entity whose shared version moved past the last one seen."""
+        # Redis is back: publish the version bumps it missed first
+        versions.replay()
+        for entity in list(self._handlers):
+            version = versions.fetch(table_version_name(entity))
+            if version is None:
+                continue
+            with self._lock:
+                seen = self._seen.get(entity)
+                self._seen[entity] = max(seen or 0, version)
+            # Nothing seen yet: whatever is cached predates the subscription
+            if seen is None or version > seen:
+                self._evict(entity, None)
+                if seen is not None:
+                    INVALIDATION_RECONCILES.labels(entity=entity).inc()
+
+    def receive(self, data: Any) -> None:
+        """Apply one published message."""
+        try:
+            events = [(entity, row_id, int(version)) for entity, row_id, version in json.loads(data)]
+        except (TypeError, ValueError) as exc:
+            logger.warning(f"Ignoring malformed invalidation message: {exc}")
+            return
+        self.apply(events)
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Subscribed first, so nothing published after the check is missed
+                self.reconcile()
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.receive(message["data"])
+            except RedisError as e:
+                logger.warning(f"Invalidation bus disconnected: {e}")
+                self._stopped.wait(self.retry_interval)
+            finally:
+                pubsub.close()
+
+    def start(self) -> None:
+        """Listen for other workers' events on a background thread."""
+        if self._redis is None or self._listener is not None:
+            return
+        self._stopped.clear()
+        self._listener = threading.Thread(target=self._listen, name="invalidation-bus", daemon=True)
+        self._listener.start()
+
+    def close(self) -> None:
+        """Stop listening."""
+        if self._listener is None:
+            return
+        self._stopped.set()
+        self._listener.join(timeout=2 * self.retry_interval)
+        self._listener = None
+
+
+bus = InvalidationBus(settings.invalidation_bus_url, channel=settings.invalidation_channel)
+commit_hooks.append(bus.committed)
+{%- endif %}
@@ -0,0 +1,217 @@
+"""
+Caching primitives: an in-process LRU and a two-tier cache that puts
+one in front of a shared Redis.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from redis import Redis, RedisError
+from redis.asyncio import Redis as AsyncRedis
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+CACHE_HITS = Counter('cache_hits_total', 'Cache hits', ['cache'])
+CACHE_MISSES = Counter('cache_misses_total', 'Cache misses', ['cache'])
+CACHE_EVICTIONS = Counter('cache_evictions_total', 'Cache evictions', ['cache', 'reason'])
+CACHE_SIZE = Gauge('cache_entries', 'Number of cached entries', ['cache'])
+CACHE_REMOTE_HITS = Counter('cache_remote_hits_total', 'Shared cache tier hits', ['cache'])
+CACHE_REMOTE_MISSES = Counter('cache_remote_misses_total', 'Shared cache tier misses', ['cache'])
+CACHE_REMOTE_ERRORS = Counter('cache_remote_errors_total', 'Failed shared cache tier calls', ['cache'])
+
+# Seconds before a Redis call gives up; callers fall back rather than stall
+REDIS_TIMEOUT = 0.5
+
+_MISSING = object()
+
+
+def redis_client(url: Optional[str]) -> Optional[Redis]:
+    """A Redis client for ``url`` with short timeouts, or None without one."""
+    if not url:
+        return None
+    return Redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+
+
+def async_redis_client(url: Optional[str]) -> Optional[AsyncRedis]:
+    """Like :func:`redis_client`, for calls made from the event loop."""
+    if not url:
+        return None
+    return AsyncRedis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a size cap and per-entry expiry."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` when missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                CACHE_MISSES.labels(cache=self.name).inc()
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                CACHE_EVICTIONS.labels(cache=self.name, reason='expired').inc()
+                CACHE_MISSES.labels(cache=self.name).inc()
+                CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+                return default
+
+            self._data.move_to_end(key)
+            CACHE_HITS.labels(cache=self.name).inc()
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value; ``ttl`` overrides the cache default in seconds."""
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.labels(cache=self.name, reason='size').inc()
+            CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry."""
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+            CACHE_SIZE.labels(cache=self.name).set(0)
+
+
+class TwoTierCache:
+    """An in-process LRU in front of a shared Redis tier.
+
+    Reads try the LRU, then Redis, and copy Redis hits into the LRU.
+    Values must be JSON-serializable; both tiers return them as decoded
+    from JSON, so a hit looks the same whichever tier served it. Without
+    ``redis_url``, or while Redis is unreachable, only the LRU is used.
+    Callers on the event loop use the ``_async`` methods, which reach
+    Redis without blocking the loop.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, redis_url: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self._local = LRUCache(name, maxsize=maxsize, ttl=ttl)
+        self._redis = redis_client(redis_url)
+        self._async_redis = async_redis_client(redis_url)
+
+    @property
+    def enabled(self) -> bool:
+        return self._local.maxsize > 0 or self._redis is not None
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    def _remote_failed(self, action: str, error: RedisError) -> None:
+        CACHE_REMOTE_ERRORS.labels(cache=self.name).inc()
+        logger.warning(f"Cache {action} failed for {self.name}: {error}")
+
+    def _remote_value(self, key: str, raw: Optional[bytes], default: Any) -> Any:
+        """Decode a Redis read and copy a hit into the LRU."""
+        if raw is None:
+            CACHE_REMOTE_MISSES.labels(cache=self.name).inc()
+            return default
+
+        CACHE_REMOTE_HITS.labels(cache=self.name).inc()
+        value = json.loads(raw)
+        self._local.set(key, value)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` when neither tier has it."""
+        value = self._local.get(key, _MISSING)
+        if value is not _MISSING or self._redis is None:
+            return default if value is _MISSING else value
+
+        try:
+            raw = self._redis.get(self._key(key))
+        except RedisError as e:
+            self._remote_failed("read", e)
+            return default
+        return self._remote_value(key, raw, default)
+
+    async def get_async(self, key: str, default: Any = None) -> Any:
+        """Like :meth:`get`, for callers on the event loop."""
+        value = self._local.get(key, _MISSING)
+        if value is not _MISSING or self._async_redis is None:
+            return default if value is _MISSING else value
+
+        try:
+            raw = await self._async_redis.get(self._key(key))
+        except RedisError as e:
+            self._remote_failed("read", e)
+            return default
+        return self._remote_value(key, raw, default)
+
+    def _set_local(self, key: str, value: Any, ttl: float) -> Tuple[Any, str]:
+        """Store ``value`` in the LRU as a later read would see it; return it and its JSON."""
+        raw = json.dumps(value, default=str)
+        value = json.loads(raw)
+        self._local.set(key, value, ttl=ttl)
+        return value, raw
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        """Store a value in both tiers and return it as a later read would.
+
+        ``ttl`` overrides the default in seconds.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        value, raw = self._set_local(key, value, ttl)
+        if self._redis is not None:
+            try:
+                self._redis.set(self._key(key), raw, px=max(1, int(ttl * 1000)))
+            except RedisError as e:
+                self._remote_failed("write", e)
+        return value
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        """Like :meth:`set`, for callers on the event loop."""
+        ttl = self.ttl if ttl is None else ttl
+        value, raw = self._set_local(key, value, ttl)
+        if self._async_redis is not None:
+            try:
+                await self._async_redis.set(self._key(key), raw, px=max(1, int(ttl * 1000)))
+            except RedisError as e:
+                self._remote_failed("write", e)
+        return value
+
+    def delete(self, key: str) -> None:
+        """Remove an entry from both tiers."""
+        self._local.delete(key)
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._key(key))
+            except RedisError as e:
+                self._remote_failed("delete", e)
+
+    def clear(self) -> None:
+        """Remove every entry from this process's tier."""
+        self._local.clear()
@@ -32,6 +32,29 @@ class Settings(BaseSettings):
     # Database settings
     database_url: str = Field(env="DATABASE_URL")
     db_echo: bool = Field(default=False, env="DB_ECHO")
+    workers: int = Field(default=1, env="WORKERS")
+    db_pool_budget: int = Field(default=20, env="DB_POOL_BUDGET")
+    db_pool_size: Optional[int] = Field(default=None, env="DB_POOL_SIZE")
+    db_max_overflow: Optional[int] = Field(default=None, env="DB_MAX_OVERFLOW")
+    db_sync_pool_size: int = Field(default=2, env="DB_SYNC_POOL_SIZE")
+    db_pool_timeout: float = Field(default=10.0, env="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=1800, env="DB_POOL_RECYCLE")
+    database_replica_urls: List[str] = Field(default=[], env="DATABASE_REPLICA_URLS")
+    db_replica_max_lag: float = Field(default=5.0, env="DB_REPLICA_MAX_LAG")
+    db_replica_check_interval: float = Field(default=2.0, env="DB_REPLICA_CHECK_INTERVAL")
+    db_recent_writers_url: Optional[str] = Field(default="redis://localhost:6379/0", env="DB_RECENT_WRITERS_URL")
+    count_strategy: str = Field(default="exact", env="COUNT_STRATEGY")
+    count_cache_ttl: int = Field(default=60, env="COUNT_CACHE_TTL")
+    query_budget_enforce: bool = Field(default=False, env="QUERY_BUDGET_ENFORCE")
+    n_plus_one_threshold: int = Field(default=5, env="N_PLUS_ONE_THRESHOLD")
+    n_plus_one_raise: bool = Field(default=False, env="N_PLUS_ONE_RAISE")
+    slow_query_ms: float = Field(default=200.0, env="SLOW_QUERY_MS")
+    slow_query_log_size: int = Field(default=100, env="SLOW_QUERY_LOG_SIZE")
+    slow_query_explain: bool = Field(default=True, env="SLOW_QUERY_EXPLAIN")
+    batch_max_items: int = Field(default=500, env="BATCH_MAX_ITEMS")
+    export_chunk_size: int = Field(default=1000, env="EXPORT_CHUNK_SIZE")
+    activity_flush_interval: float = Field(default=30.0, env="ACTIVITY_FLUSH_INTERVAL")
+    activity_flush_batch: int = Field(default=1000, env="ACTIVITY_FLUSH_BATCH")
     
     # Redis settings
     redis_url: str = Field(default="redis://localhost:6379/0", env="REDIS_URL")
@@ -40,6 +63,10 @@ class Settings(BaseSettings):
     cache_type: str = Field(default="redis", env="CACHE_TYPE")
     cache_redis_url: str = Field(default="redis://localhost:6379/1", env="CACHE_REDIS_URL")
     cache_default_timeout: int = Field(default=300, env="CACHE_DEFAULT_TIMEOUT")
+    cache_local_size: int = Field(default=1024, env="CACHE_LOCAL_SIZE")
+    cache_stale_ttl: int = Field(default=60, env="CACHE_STALE_TTL")
+    cache_early_beta: float = Field(default=1.0, env="CACHE_EARLY_BETA")
+    cache_lease_ttl: float = Field(default=5.0, env="CACHE_LEASE_TTL")
     
     # Celery settings
     celery_broker_url: str = Field(default="redis://localhost:6379/2", env="CELERY_BROKER_URL")
@@ -51,6 +78,29 @@ class Settings(BaseSettings):
     jwt_access_token_expires: int = Field(default=3600, env="JWT_ACCESS_TOKEN_EXPIRES")
     jwt_refresh_token_expires: int = Field(default=2592000, env="JWT_REFRESH_TOKEN_EXPIRES")
     algorithm: str = Field(default="HS256", env="ALGORITHM")
+    jwt_cache_size: int = Field(default=10000, env="JWT_CACHE_SIZE")
+    jwt_embed_permissions: bool = Field(default=False, env="JWT_EMBED_PERMISSIONS")
+    version_cache_ttl: float = Field(default=1.0, env="VERSION_CACHE_TTL")
+    identity_cache_size: int = Field(default=10000, env="IDENTITY_CACHE_SIZE")
+    identity_cache_ttl: int = Field(default=60, env="IDENTITY_CACHE_TTL")
+    identity_cache_redis_url: Optional[str] = Field(default=None, env="IDENTITY_CACHE_REDIS_URL")
+    invalidation_bus_url: Optional[str] = Field(default="redis://localhost:6379/0", env="INVALIDATION_BUS_URL")
+    invalidation_channel: str = Field(default="invalidations", env="INVALIDATION_CHANNEL")
+    password_hash_workers: int = Field(default=2, env="PASSWORD_HASH_WORKERS")
+    password_hash_max_queue: int = Field(default=64, env="PASSWORD_HASH_MAX_QUEUE")
+    password_hash_scheme: str = Field(default="bcrypt", env="PASSWORD_HASH_SCHEME")
+    password_hash_target_ms: int = Field(default=250, env="PASSWORD_HASH_TARGET_MS")
+    bcrypt_rounds: int = Field(default=12, env="BCRYPT_ROUNDS")
+    argon2_time_cost: int = Field(default=3, env="ARGON2_TIME_COST")
+    argon2_memory_cost: int = Field(default=65536, env="ARGON2_MEMORY_COST")
+    argon2_parallelism: int = Field(default=4, env="ARGON2_PARALLELISM")
+    
+    # Rate limiting
+    rate_limit_enabled: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    rate_limit_redis_url: Optional[str] = Field(default="redis://localhost:6379/0", env="RATE_LIMIT_REDIS_URL")
+    rate_limit_ip: str = Field(default="1000/minute", env="RATE_LIMIT_IP")
+    rate_limit_user: str = Field(default="600/minute", env="RATE_LIMIT_USER")
+    rate_limit_login: str = Field(default="10/minute", env="RATE_LIMIT_LOGIN")
     
     # CORS settings
     cors_origins: List[str] = Field(default=["*"], env="CORS_ORIGINS")
@@ -60,12 +110,36 @@ class Settings(BaseSettings):
     prometheus_multiproc_dir: str = Field(default="/tmp/prometheus_multiproc", env="PROMETHEUS_MULTIPROC_DIR")
     metrics_port: int = Field(default=9090, env="METRICS_PORT")
     
+    @validator("password_hash_scheme")
+    def validate_password_hash_scheme(cls, v):
+        if v not in ("argon2", "bcrypt"):
+            raise ValueError("PASSWORD_HASH_SCHEME must be 'argon2' or 'bcrypt'")
+        return v
+    
+    @validator("count_strategy")
+    def validate_count_strategy(cls, v):
+        if v not in ("exact", "estimate", "cached"):
+            raise ValueError("COUNT_STRATEGY must be 'exact', 'estimate' or 'cached'")
+        return v
+    
+    @validator("cache_type")
+    def validate_cache_type(cls, v):
+        if v not in ("redis", "simple", "null"):
+            raise ValueError("CACHE_TYPE must be 'redis', 'simple' or 'null'")
+        return v
+    
     @validator("cors_origins", pre=True)
     def parse_cors_origins(cls, v):
         if isinstance(v, str):
             return [origin.strip() for origin in v.split(",")]
         return v
     
+    @validator("database_replica_urls", pre=True)
+    def parse_database_replica_urls(cls, v):
+        if isinstance(v, str):
+            return [url.strip() for url in v.split(",") if url.strip()]
+        return v
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -123,6 +197,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "app.ratelimit.RateLimitHeadersMiddleware",
+    "app.querystats.QueryStatsMiddleware",
     "django_prometheus.middleware.PrometheusAfterMiddleware",
 ]
 
@@ -201,8 +277,30 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "app.ratelimit.RateLimitThrottle",
+    ],
 }
 
+# Rate limiting
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMITS = {
+    "ip": os.getenv("RATE_LIMIT_IP", "1000/minute"),
+    "user": os.getenv("RATE_LIMIT_USER", "600/minute"),
+}
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+# Proxies in front of the app that append to X-Forwarded-For; 0 ignores the header
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+# Per-request SQL statistics; N+1 checks run when DEBUG or N_PLUS_ONE_RAISE
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+N_PLUS_ONE_RAISE = os.getenv("N_PLUS_ONE_RAISE", "False").lower() in ("true", "1", "yes")
+
+# Slow-query log; 0 turns it off
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() in ("true", "1", "yes")
+
 # JWT configuration
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -256,6 +354,23 @@ class Config:
     CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/2")
     CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/3")
     
+    # Rate limiting settings
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "yes")
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "1000/minute")
+    RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "600/minute")
+    RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+    
+    # Per-request SQL statistics; N+1 checks run in debug or with N_PLUS_ONE_RAISE
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+    N_PLUS_ONE_RAISE = os.getenv("N_PLUS_ONE_RAISE", "False").lower() in ("true", "1", "yes")
+    
+    # Slow-query log; 0 turns it off
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+    SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() in ("true", "1", "yes")
+    
     # CORS settings
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
     
@@ -281,6 +396,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    RATE_LIMIT_ENABLED = False
 
 
 # Configuration mapping
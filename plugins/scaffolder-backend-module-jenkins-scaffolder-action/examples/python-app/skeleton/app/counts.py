@@ -0,0 +1,102 @@
+{% if values.framework == "fastapi" -%}
+"""
+Row count strategies for paginated responses.
+
+``exact`` counts in the page query with a window function, ``estimate``
+reads the planner's row estimate from ``pg_class`` and ``cached`` serves
+a count refreshed in the background once it is older than the TTL.
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+from .config import settings
+
+COUNT_STRATEGIES = ("exact", "estimate", "cached")
+
+# Dialects with a planner estimate to read
+ESTIMATE_DIALECTS = ("postgresql",)
+
+
+def resolve_count_strategy(strategy: Optional[str], dialect: str) -> str:
+    """Pick the strategy to run, falling back to ``exact`` where one is unsupported."""
+    strategy = strategy or settings.count_strategy
+    if strategy not in COUNT_STRATEGIES:
+        raise ValueError(f"Unknown count strategy: {strategy}")
+    if strategy == "estimate" and dialect not in ESTIMATE_DIALECTS:
+        return "exact"
+    return strategy
+
+
+def estimate_statement(table_name: str) -> TextClause:
+    """Planner row estimate for a table; negative until it is first analyzed."""
+    return text(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table_name AS regclass)"
+    ).bindparams(table_name=table_name)
+
+
+class CountCache:
+    """Table counts kept for ``ttl`` seconds, refreshed at most once at a time."""
+    
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+    
+    def get(self, name: str) -> Optional[Tuple[int, bool]]:
+        """Return ``(total, stale)`` or None if ``name`` was never counted."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        total, fetched_at = entry
+        return total, time.monotonic() - fetched_at >= self.ttl
+    
+    def set(self, name: str, total: int) -> None:
+        self._entries[name] = (total, time.monotonic())
+    
+    def _claim(self, name: str) -> bool:
+        """Mark ``name`` as refreshing; False if a refresh is already running."""
+        with self._lock:
+            if name in self._refreshing:
+                return False
+            self._refreshing.add(name)
+            return True
+    
+    def refresh_in_background(self, name: str, count: Callable[[], Awaitable[int]]) -> None:
+        """Schedule ``count`` to replace the entry unless a refresh is running."""
+        if not self._claim(name):
+            return
+        
+        async def refresh():
+            try:
+                self.set(name, await count())
+            finally:
+                self._refreshing.discard(name)
+        
+        # Keep a reference so the task is not collected mid-flight
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def refresh_in_thread(self, name: str, count: Callable[[], int]) -> None:
+        """Like :meth:`refresh_in_background`, for callers without an event loop."""
+        if not self._claim(name):
+            return
+        
+        def refresh():
+            try:
+                self.set(name, count())
+            finally:
+                self._refreshing.discard(name)
+        
+        threading.Thread(target=refresh, name=f"count-refresh-{name}", daemon=True).start()
+
+
+count_cache = CountCache(ttl=settings.count_cache_ttl)
+{%- endif %}
@@ -1,36 +1,293 @@
 {% if values.framework == "fastapi" -%}
 """
 CRUD operations for database models.
+
+The sync and async CRUD classes build the same statements; only the
+session they execute on differs.
 """
-from typing import Any, Dict, Optional, Union, List, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import uuid
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Union, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import and_, delete, func, insert, inspect, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import Insert, Select
+
+from .cache import TwoTierCache
+from .config import settings
+from .counts import count_cache, estimate_statement, resolve_count_strategy
+from .database import AsyncSessionLocal, SessionLocal
+from .loading import profile_options
+from .models import User, Role, Permission, user_roles
+from .pagination import decode_cursor, encode_cursor
+from .search import search_clauses
+from .singleflight import Lease, SingleFlightCache
+from .schemas import (
+    UserCreate, UserUpdate, RoleCreate, RoleUpdate, PermissionCreate, BatchUserUpdateItem
+)
+from .auth import (
+    get_password_hash, get_password_hash_async, get_password_hashes_async,
+    identity_cache, permission_index
+)
+from .versions import pending_tables, table_versions, table_versions_async
+
+
+class Page(NamedTuple):
+    """A page of rows with the total and the strategy that produced it."""
+    items: List[Any]
+    total: int
+    total_strategy: str
+
+
+class BatchResult(NamedTuple):
+    """Outcome for one item of a batch request."""
+    index: int
+    status: str
+    id: Any = None
+    detail: Optional[str] = None
 
-from .models import User, Role, Permission
-from .schemas import UserCreate, UserUpdate, RoleCreate, RoleUpdate, PermissionCreate
-from .auth import get_password_hash
+
+# Reads of rarely written tables, for CRUD classes that set ``cache_tables``
+read_cache = TwoTierCache(
+    "crud",
+    maxsize=settings.cache_local_size if settings.cache_type != "null" else 0,
+    ttl=settings.cache_default_timeout,
+    redis_url=settings.cache_redis_url if settings.cache_type == "redis" else None,
+)
+read_loader = SingleFlightCache(
+    read_cache,
+    fresh=settings.cache_default_timeout,
+    stale=settings.cache_stale_ttl,
+    beta=settings.cache_early_beta,
+    lease=Lease(
+        settings.cache_redis_url if settings.cache_type == "redis" else None, ttl=settings.cache_lease_ttl
+    ),
+)
+
+
+def _snapshot(obj: Any, relationships: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Column values of ``obj`` and of the rows in its ``relationships``."""
+    snapshot = {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+    for name in relationships:
+        snapshot[name] = [_snapshot(related) for related in getattr(obj, name)]
+    return snapshot
+
+
+def _restore(model: Any, snapshot: Dict[str, Any], relationships: Tuple[str, ...] = ()) -> Any:
+    """A detached ``model`` row rebuilt from a JSON-decoded snapshot."""
+    values = {}
+    for column in model.__table__.columns:
+        value = snapshot.get(column.key)
+        if value is not None and column.type.python_type is uuid.UUID:
+            value = uuid.UUID(value)
+        elif value is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        values[column.key] = value
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    for name in relationships:
+        related_model = getattr(model, name).property.mapper.class_
+        set_committed_value(obj, name, [_restore(related_model, related) for related in snapshot[name]])
+    return obj
 
 
 class BaseCRUD:
     """Base CRUD class."""
     
+    # Relationships loaded when no loading profile is active
+    load_options: Tuple[Any, ...] = ()
+    # Tables a cached read depends on; reads are only cached when set
+    cache_tables: Tuple[str, ...] = ()
+    # Relationships stored along with cached rows
+    cache_relationships: Tuple[str, ...] = ()
+    
     def __init__(self, model):
         self.model = model
     
+    def loader_options(self) -> Tuple[Any, ...]:
+        """Options from the endpoint's loading profile, else ``load_options``."""
+        return profile_options(self.model, self.load_options)
+    
+    def get_statement(self, id: Any) -> Select:
+        return select(self.model).options(*self.loader_options()).where(self.model.id == id)
+    
+    def get_multi_statement(self, *, skip: int = 0, limit: int = 100) -> Select:
+        return (
+            select(self.model)
+            .options(*self.loader_options())
+            .order_by(self.model.created_at, self.model.id)
+            .offset(skip)
+            .limit(limit)
+        )
+    
+    def count_statement(self) -> Select:
+        return select(func.count()).select_from(self.model)
+    
+    def get_multi_counted_statement(self, *, skip: int = 0, limit: int = 100) -> Select:
+        """The page query with the full row count alongside each row."""
+        return self.get_multi_statement(skip=skip, limit=limit).add_columns(
+            func.count().over().label("total")
+        )
+    
+    def get_page_statement(self, *, cursor: Optional[str] = None, limit: int = 100) -> Select:
+        """Rows after ``cursor`` in ``(created_at, id)`` order, as an index seek."""
+        statement = (
+            select(self.model)
+            .options(*self.loader_options())
+            .order_by(self.model.created_at, self.model.id)
+            .limit(limit + 1)
+        )
+        if cursor:
+            statement = statement.where(
+                tuple_(self.model.created_at, self.model.id) > tuple_(*decode_cursor(cursor))
+            )
+        return statement
+    
+    @staticmethod
+    def _page(items: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+        # One extra row was fetched to learn whether another page exists
+        if len(items) <= limit:
+            return list(items), None
+        items = items[:limit]
+        return items, encode_cursor(items[-1].created_at, items[-1].id)
+    
+    def cache_key(self, session: Session, *parts: Any) -> Optional[str]:
+        """Key for a cached read, or None when the read must go to the database.
+        
+        Keys carry the current versions of ``cache_tables``, so a committed
+        write to any of them, from any session, leaves older entries
+        unreachable. A session with unflushed or uncommitted writes to
+        those tables reads its own writes instead.
+        """
+        if not self._reads_cached(session):
+            return None
+        return self._stamped_key(table_versions(self.cache_tables), parts)
+    
+    async def cache_key_async(self, session: Session, *parts: Any) -> Optional[str]:
+        """Like :meth:`cache_key`, reading the table versions off the event loop."""
+        if not self._reads_cached(session):
+            return None
+        return self._stamped_key(await table_versions_async(self.cache_tables), parts)
+    
+    def _reads_cached(self, session: Session) -> bool:
+        if not self.cache_tables or not read_cache.enabled:
+            return False
+        return not (session.new or session.dirty or session.deleted or pending_tables(session) & set(self.cache_tables))
+    
+    def _stamped_key(self, stamp: Tuple[int, ...], parts: Tuple[Any, ...]) -> str:
+        versions = ".".join(str(version) for version in stamp)
+        return ":".join(str(part) for part in (self.model.__tablename__, versions, *parts))
+    
+    def _cacheable(self, obj: Any) -> bool:
+        # Taking a snapshot must never lazy-load
+        return not set(self.cache_relationships) & inspect(obj).unloaded
+    
+    def _row_snapshot(self, obj: Optional[Any]) -> Optional[Dict[str, Any]]:
+        """A cacheable copy of one row, or None when it cannot be cached."""
+        if obj is not None and not self._cacheable(obj):
+            return None
+        # Misses are cached too; the key changes once the table is written
+        return {"row": _snapshot(obj, self.cache_relationships) if obj is not None else None}
+    
+    def _restore_row(self, snapshot: Dict[str, Any]) -> Optional[Any]:
+        if snapshot["row"] is None:
+            return None
+        return _restore(self.model, snapshot["row"], self.cache_relationships)
+    
+    def _page_snapshot(self, page: Page) -> Optional[Dict[str, Any]]:
+        """A cacheable copy of a page, or None when it cannot be cached."""
+        if not all(self._cacheable(item) for item in page.items):
+            return None
+        return {
+            "items": [_snapshot(item, self.cache_relationships) for item in page.items],
+            "total": page.total,
+            "total_strategy": page.total_strategy,
+        }
+    
+    def _restore_page(self, snapshot: Dict[str, Any]) -> Page:
+        items = [_restore(self.model, item, self.cache_relationships) for item in snapshot["items"]]
+        return Page(items, snapshot["total"], snapshot["total_strategy"])
+    
+    def _cached_row_by(self, db: Session, statement: Select, *key_parts: Any) -> Optional[Any]:
+        """The row ``statement`` selects, through the read cache."""
+        def execute() -> Optional[Any]:
+            return db.execute(statement).unique().scalar_one_or_none()
+        
+        key = self.cache_key(db, *key_parts)
+        snapshot = read_loader.get_sync(key, lambda: self._row_snapshot(execute())) if key else None
+        if snapshot is None:
+            return execute()
+        row = self._restore_row(snapshot)
+        return db.merge(row, load=False) if row is not None else None
+    
+    def _prepare_create(self, obj_in: Any) -> Any:
+        obj_data = obj_in.dict() if hasattr(obj_in, 'dict') else obj_in
+        return self.model(**obj_data)
+    
+    def _apply_update(self, db_obj: Any, obj_in: Union[Any, Dict[str, Any]]) -> None:
+        obj_data = obj_in.dict(exclude_unset=True) if hasattr(obj_in, 'dict') else obj_in
+        for field in obj_data:
+            if hasattr(db_obj, field):
+                setattr(db_obj, field, obj_data[field])
+    
     def get(self, db: Session, id: Any) -> Optional[Any]:
-        return db.query(self.model).filter(self.model.id == id).first()
+        return db.execute(self.get_statement(id)).unique().scalar_one_or_none()
     
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
-    ) -> Tuple[List[Any], int]:
-        query = db.query(self.model)
-        total = query.count()
-        items = query.offset(skip).limit(limit).all()
-        return items, total
+        self, db: Session, *, skip: int = 0, limit: int = 100, count_strategy: Optional[str] = None
+    ) -> Page:
+        strategy = resolve_count_strategy(count_strategy, db.get_bind().dialect.name)
+        key = self.cache_key(db, "list", skip, limit, strategy)
+        snapshot = None
+        if key is not None:
+            snapshot = read_loader.get_sync(
+                key, lambda: self._page_snapshot(self._get_multi(db, skip=skip, limit=limit, strategy=strategy))
+            )
+        if snapshot is None:
+            return self._get_multi(db, skip=skip, limit=limit, strategy=strategy)
+        page = self._restore_page(snapshot)
+        return page._replace(items=[db.merge(item, load=False) for item in page.items])
+    
+    def _get_multi(self, db: Session, *, skip: int, limit: int, strategy: str) -> Page:
+        if strategy == "exact":
+            rows = db.execute(self.get_multi_counted_statement(skip=skip, limit=limit)).unique().all()
+            # A page past the end has no rows to carry the count
+            total = rows[0].total if rows else db.execute(self.count_statement()).scalar_one()
+            return Page([row[0] for row in rows], total, strategy)
+        
+        items = db.execute(self.get_multi_statement(skip=skip, limit=limit)).unique().scalars().all()
+        if strategy == "estimate":
+            total = db.execute(estimate_statement(self.model.__tablename__)).scalar()
+            if total is None or total < 0:
+                return Page(items, db.execute(self.count_statement()).scalar_one(), "exact")
+            return Page(items, total, strategy)
+        
+        # Serve the last count and refresh it off the request path when stale
+        cached = count_cache.get(self.model.__tablename__)
+        if cached is None:
+            total = db.execute(self.count_statement()).scalar_one()
+            count_cache.set(self.model.__tablename__, total)
+            return Page(items, total, strategy)
+        total, stale = cached
+        if stale:
+            count_cache.refresh_in_thread(self.model.__tablename__, self._count)
+        return Page(items, total, strategy)
+    
+    def _count(self) -> int:
+        with SessionLocal() as db:
+            return db.execute(self.count_statement()).scalar_one()
+    
+    def get_page(
+        self, db: Session, *, cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Return a page of rows and the cursor for the next one."""
+        items = db.execute(self.get_page_statement(cursor=cursor, limit=limit)).unique().scalars().all()
+        return self._page(items, limit)
     
     def create(self, db: Session, *, obj_in: Any) -> Any:
-        obj_data = obj_in.dict() if hasattr(obj_in, 'dict') else obj_in
-        db_obj = self.model(**obj_data)
+        db_obj = self._prepare_create(obj_in)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
@@ -43,39 +300,106 @@ class BaseCRUD:
         db_obj: Any,
         obj_in: Union[Any, Dict[str, Any]]
     ) -> Any:
-        obj_data = obj_in.dict(exclude_unset=True) if hasattr(obj_in, 'dict') else obj_in
-        for field in obj_data:
-            if hasattr(db_obj, field):
-                setattr(db_obj, field, obj_data[field])
+        self._apply_update(db_obj, obj_in)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
         return db_obj
     
     def remove(self, db: Session, *, id: Any) -> Any:
-        obj = db.query(self.model).get(id)
+        obj = db.get(self.model, id)
         db.delete(obj)
         db.commit()
         return obj
 
 
-class UserCRUD(BaseCRUD):
+class UserQueries:
+    """Statements and helpers shared by the user CRUD classes."""
+    
+    load_options = (selectinload(User.roles).selectinload(Role.permissions),)
+    
+    def get_by_email_statement(self, email: str) -> Select:
+        return select(User).where(User.email == email)
+    
+    def get_by_username_statement(self, username: str) -> Select:
+        return select(User).where(User.username == username)
+    
+    def taken_statement(self, emails: List[str], usernames: List[str]) -> Select:
+        """Users already holding any of ``emails`` or ``usernames``."""
+        return select(User.id, User.email, User.username).where(
+            or_(User.email.in_(emails), User.username.in_(usernames))
+        )
+    
+    def search_statement(self, query: str, dialect: str, *, limit: int = 20) -> Select:
+        """Users matching ``query``, best matches first."""
+        where, rank = search_clauses(query, dialect)
+        return (
+            select(User)
+            .options(*self.loader_options())
+            .where(where)
+            .order_by(rank.desc(), User.created_at, User.id)
+            .limit(limit)
+        )
+    
+    def inactive_statement(self, cutoff: datetime) -> Select:
+        """Deactivated users not seen since ``cutoff``; users never seen count from sign-up."""
+        return select(User).where(
+            User.is_active.is_(False),
+            or_(User.last_login < cutoff, and_(User.last_login.is_(None), User.created_at < cutoff)),
+        )
+    
+    def export_statement(self) -> Select:
+        """Exported user columns in keyset order, without building ORM objects."""
+        return select(
+            User.id, User.email, User.username, User.first_name, User.last_name,
+            User.is_active, User.is_verified, User.is_superuser,
+            User.created_at, User.updated_at, User.last_login
+        ).order_by(User.created_at, User.id)
+    
+    @staticmethod
+    def insert_ignoring_conflicts_statement(dialect: str) -> Insert:
+        """INSERT that skips rows violating a unique constraint, where the dialect can."""
+        if dialect == "postgresql":
+            return postgresql.insert(User).on_conflict_do_nothing()
+        if dialect == "sqlite":
+            return sqlite.insert(User).on_conflict_do_nothing()
+        return insert(User)
+    
+    @staticmethod
+    def _hash_update(update_data: Dict[str, Any], hashed_password: str) -> None:
+        del update_data["password"]
+        update_data["hashed_password"] = hashed_password
+    
+    @staticmethod
+    def _update_data(obj_in: Union[UserUpdate, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return obj_in.dict(exclude_unset=True)
+
+
+class UserCRUD(UserQueries, BaseCRUD):
     """User CRUD operations."""
     
     def __init__(self):
         super().__init__(User)
     
     def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
-        return db.query(User).filter(User.email == email).first()
+        return db.execute(self.get_by_email_statement(email)).scalar_one_or_none()
     
     def get_by_username(self, db: Session, *, username: str) -> Optional[User]:
-        return db.query(User).filter(User.username == username).first()
+        return db.execute(self.get_by_username_statement(username)).scalar_one_or_none()
+    
+    def search(self, db: Session, *, query: str, limit: int = 20) -> List[User]:
+        statement = self.search_statement(query, db.get_bind().dialect.name, limit=limit)
+        return db.execute(statement).unique().scalars().all()
     
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
+    def create(
+        self, db: Session, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
         obj_data = obj_in.dict()
         password = obj_data.pop("password")
         db_obj = User(**obj_data)
-        db_obj.hashed_password = get_password_hash(password)
+        db_obj.hashed_password = hashed_password or get_password_hash(password)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
@@ -84,25 +408,43 @@ class UserCRUD(BaseCRUD):
     def update(
         self, db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
     ) -> User:
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        
+        update_data = self._update_data(obj_in)
         if "password" in update_data:
-            hashed_password = get_password_hash(update_data["password"])
-            del update_data["password"]
-            update_data["hashed_password"] = hashed_password
+            self._hash_update(update_data, get_password_hash(update_data["password"]))
         
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        email = db_obj.email
+        user = super().update(db, db_obj=db_obj, obj_in=update_data)
+        identity_cache.invalidate(email)
+        identity_cache.invalidate(user.email)
+        return user
     
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
-        from .auth import verify_password
-        user = self.get_by_email(db, email=email)
-        if not user:
-            return None
-        if not verify_password(password, user.hashed_password):
-            return None
+        from .auth import authenticate_user
+        return authenticate_user(db, email, password)
+    
+    def remove(self, db: Session, *, id: Any) -> User:
+        user = db.get(User, id)
+        email = user.email if user else None
+        obj = super().remove(db, id=id)
+        if email:
+            identity_cache.invalidate(email)
+        permission_index.invalidate_user(id)
+        return obj
+    
+    def add_role(self, db: Session, *, user: User, role: Role) -> User:
+        user.roles.append(role)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        permission_index.invalidate_all()
+        return user
+    
+    def remove_role(self, db: Session, *, user: User, role: Role) -> User:
+        user.roles.remove(role)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        permission_index.invalidate_all()
         return user
     
     def is_active(self, user: User) -> bool:
@@ -112,20 +454,37 @@ class UserCRUD(BaseCRUD):
         return user.is_superuser
 
 
-class RoleCRUD(BaseCRUD):
+class RoleQueries:
+    """Statements shared by the role CRUD classes."""
+    
+    load_options = (selectinload(Role.permissions),)
+    cache_tables = ("roles", "role_permissions", "permissions")
+    cache_relationships = ("permissions",)
+    
+    def get_by_name_statement(self, name: str) -> Select:
+        return select(Role).options(*self.loader_options()).where(Role.name == name)
+
+
+class RoleCRUD(RoleQueries, BaseCRUD):
     """Role CRUD operations."""
     
     def __init__(self):
         super().__init__(Role)
     
     def get_by_name(self, db: Session, *, name: str) -> Optional[Role]:
-        return db.query(Role).filter(Role.name == name).first()
+        return self._cached_row_by(db, self.get_by_name_statement(name), "name", name)
+    
+    def remove(self, db: Session, *, id: Any) -> Role:
+        obj = super().remove(db, id=id)
+        permission_index.invalidate_all()
+        return obj
     
     def add_permission(self, db: Session, *, role: Role, permission: Permission) -> Role:
         role.permissions.append(permission)
         db.add(role)
         db.commit()
         db.refresh(role)
+        permission_index.invalidate_all()
         return role
     
     def remove_permission(self, db: Session, *, role: Role, permission: Permission) -> Role:
@@ -133,25 +492,419 @@ class RoleCRUD(BaseCRUD):
         db.add(role)
         db.commit()
         db.refresh(role)
+        permission_index.invalidate_all()
         return role
 
 
-class PermissionCRUD(BaseCRUD):
+class PermissionQueries:
+    """Statements shared by the permission CRUD classes."""
+    
+    cache_tables = ("permissions",)
+    
+    def get_by_name_statement(self, name: str) -> Select:
+        return select(Permission).where(Permission.name == name)
+    
+    def get_by_resource_action_statement(self, resource: str, action: str) -> Select:
+        return select(Permission).where(
+            Permission.resource == resource,
+            Permission.action == action
+        )
+
+
+class PermissionCRUD(PermissionQueries, BaseCRUD):
     """Permission CRUD operations."""
     
     def __init__(self):
         super().__init__(Permission)
     
     def get_by_name(self, db: Session, *, name: str) -> Optional[Permission]:
-        return db.query(Permission).filter(Permission.name == name).first()
+        return self._cached_row_by(db, self.get_by_name_statement(name), "name", name)
     
     def get_by_resource_action(
         self, db: Session, *, resource: str, action: str
     ) -> Optional[Permission]:
-        return db.query(Permission).filter(
-            Permission.resource == resource,
-            Permission.action == action
-        ).first()
+        return db.execute(self.get_by_resource_action_statement(resource, action)).scalar_one_or_none()
+    
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Permission,
+        obj_in: Union[Any, Dict[str, Any]]
+    ) -> Permission:
+        obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        permission_index.invalidate_all()
+        return obj
+    
+    def remove(self, db: Session, *, id: Any) -> Permission:
+        obj = super().remove(db, id=id)
+        permission_index.invalidate_all()
+        return obj
+
+
+class AsyncBaseCRUD(BaseCRUD):
+    """Base CRUD class for async sessions.
+    
+    Results are returned with ``load_options`` relationships loaded,
+    since nothing can lazy-load once they leave the session.
+    """
+    
+    async def _reload(self, db: AsyncSession, db_obj: Any) -> Any:
+        statement = self.get_statement(db_obj.id).execution_options(populate_existing=True)
+        return (await db.execute(statement)).unique().scalar_one()
+    
+    async def get(self, db: AsyncSession, id: Any) -> Optional[Any]:
+        return (await db.execute(self.get_statement(id))).unique().scalar_one_or_none()
+    
+    async def _cached_row_by(self, db: AsyncSession, statement: Select, *key_parts: Any) -> Optional[Any]:
+        """The row ``statement`` selects, through the read cache.
+        
+        Loads are shared with other callers and may run in the background,
+        so they use their own session on the primary, never the caller's.
+        """
+        key = await self.cache_key_async(db.sync_session, *key_parts)
+        snapshot = None
+        if key is not None:
+            async def load():
+                async with AsyncSessionLocal() as session:
+                    row = (await session.execute(statement)).unique().scalar_one_or_none()
+                    return self._row_snapshot(row)
+            
+            snapshot = await read_loader.get(key, load)
+        if snapshot is None:
+            return (await db.execute(statement)).unique().scalar_one_or_none()
+        row = self._restore_row(snapshot)
+        return await db.merge(row, load=False) if row is not None else None
+    
+    async def _count(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(self.count_statement())).scalar_one()
+    
+    async def get_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100, count_strategy: Optional[str] = None
+    ) -> Page:
+        strategy = resolve_count_strategy(count_strategy, db.get_bind().dialect.name)
+        key = await self.cache_key_async(db.sync_session, "list", skip, limit, strategy)
+        snapshot = None
+        if key is not None:
+            async def load():
+                async with AsyncSessionLocal() as session:
+                    page = await self._get_multi(session, skip=skip, limit=limit, strategy=strategy)
+                    return self._page_snapshot(page)
+            
+            snapshot = await read_loader.get(key, load)
+        if snapshot is None:
+            return await self._get_multi(db, skip=skip, limit=limit, strategy=strategy)
+        page = self._restore_page(snapshot)
+        return page._replace(items=[await db.merge(item, load=False) for item in page.items])
+    
+    async def _get_multi(self, db: AsyncSession, *, skip: int, limit: int, strategy: str) -> Page:
+        if strategy == "exact":
+            statement = self.get_multi_counted_statement(skip=skip, limit=limit)
+            rows = (await db.execute(statement)).unique().all()
+            total = rows[0].total if rows else (await db.execute(self.count_statement())).scalar_one()
+            return Page([row[0] for row in rows], total, strategy)
+        
+        items = (await db.execute(self.get_multi_statement(skip=skip, limit=limit))).unique().scalars().all()
+        if strategy == "estimate":
+            total = (await db.execute(estimate_statement(self.model.__tablename__))).scalar()
+            if total is None or total < 0:
+                return Page(items, (await db.execute(self.count_statement())).scalar_one(), "exact")
+            return Page(items, total, strategy)
+        
+        # Serve the last count and refresh it off the request path when stale
+        cached = count_cache.get(self.model.__tablename__)
+        if cached is None:
+            total = (await db.execute(self.count_statement())).scalar_one()
+            count_cache.set(self.model.__tablename__, total)
+            return Page(items, total, strategy)
+        total, stale = cached
+        if stale:
+            count_cache.refresh_in_background(self.model.__tablename__, self._count)
+        return Page(items, total, strategy)
+    
+    async def get_page(
+        self, db: AsyncSession, *, cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Return a page of rows and the cursor for the next one."""
+        statement = self.get_page_statement(cursor=cursor, limit=limit)
+        items = (await db.execute(statement)).unique().scalars().all()
+        return self._page(items, limit)
+    
+    async def create(self, db: AsyncSession, *, obj_in: Any) -> Any:
+        db_obj = self._prepare_create(obj_in)
+        db.add(db_obj)
+        await db.commit()
+        return await self._reload(db, db_obj)
+    
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: Any,
+        obj_in: Union[Any, Dict[str, Any]]
+    ) -> Any:
+        self._apply_update(db_obj, obj_in)
+        db.add(db_obj)
+        await db.commit()
+        return await self._reload(db, db_obj)
+    
+    async def remove(self, db: AsyncSession, *, id: Any) -> Any:
+        obj = await db.get(self.model, id)
+        await db.delete(obj)
+        await db.commit()
+        return obj
+
+
+class AsyncUserCRUD(UserQueries, AsyncBaseCRUD):
+    """User CRUD operations for async sessions."""
+    
+    def __init__(self):
+        super().__init__(User)
+    
+    async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
+        return (await db.execute(self.get_by_email_statement(email))).scalar_one_or_none()
+    
+    async def get_by_username(self, db: AsyncSession, *, username: str) -> Optional[User]:
+        return (await db.execute(self.get_by_username_statement(username))).scalar_one_or_none()
+    
+    async def search(self, db: AsyncSession, *, query: str, limit: int = 20) -> List[User]:
+        statement = self.search_statement(query, db.get_bind().dialect.name, limit=limit)
+        return (await db.execute(statement)).unique().scalars().all()
+    
+    async def create(
+        self, db: AsyncSession, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        obj_data = obj_in.dict()
+        password = obj_data.pop("password")
+        db_obj = User(**obj_data)
+        db_obj.hashed_password = hashed_password or await get_password_hash_async(password)
+        db.add(db_obj)
+        await db.commit()
+        return await self._reload(db, db_obj)
+    
+    async def update(
+        self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> User:
+        update_data = self._update_data(obj_in)
+        if "password" in update_data:
+            self._hash_update(update_data, await get_password_hash_async(update_data["password"]))
+        
+        email = db_obj.email
+        user = await super().update(db, db_obj=db_obj, obj_in=update_data)
+        await identity_cache.invalidate_async(email)
+        await identity_cache.invalidate_async(user.email)
+        return user
+    
+    async def create_many(self, db: AsyncSession, *, items: List[UserCreate]) -> List[BatchResult]:
+        """Create users with one conflict check and one multi-row INSERT.
+        
+        Conflicts are checked first, so only the rows to be inserted are
+        hashed on the hashing pool, outside any transaction. Items
+        clashing with an existing user, an earlier item or a concurrent
+        insert are reported as conflicts, not errors.
+        """
+        taken = (await db.execute(self.taken_statement(
+            [item.email for item in items], [item.username for item in items]
+        ))).all()
+        # Release the connection while the passwords hash
+        await db.commit()
+        emails = {row.email for row in taken}
+        usernames = {row.username for row in taken}
+        
+        results: Dict[int, BatchResult] = {}
+        accepted = []
+        for index, item in enumerate(items):
+            if item.email in emails:
+                results[index] = BatchResult(index, "conflict", detail="Email already registered")
+            elif item.username in usernames:
+                results[index] = BatchResult(index, "conflict", detail="Username already taken")
+            else:
+                emails.add(item.email)
+                usernames.add(item.username)
+                accepted.append((index, item))
+        
+        hashes = await get_password_hashes_async([item.password for _, item in accepted])
+        rows = [
+            (index, {**item.dict(exclude={"password"}), "hashed_password": hashed_password})
+            for (index, item), hashed_password in zip(accepted, hashes)
+        ]
+        
+        if rows:
+            statement = (
+                self.insert_ignoring_conflicts_statement(db.get_bind().dialect.name)
+                .values([row for _, row in rows])
+                .returning(User.id, User.email)
+            )
+            created = {row.email: row.id for row in await db.execute(statement)}
+            for index, row in rows:
+                if row["email"] in created:
+                    results[index] = BatchResult(index, "created", id=created[row["email"]])
+                else:
+                    results[index] = BatchResult(index, "conflict", detail="Created by a concurrent request")
+        
+        await db.commit()
+        return [results[index] for index in range(len(items))]
+    
+    async def update_many(
+        self, db: AsyncSession, *, items: List[BatchUserUpdateItem]
+    ) -> List[BatchResult]:
+        """Apply user updates with one bulk UPDATE by primary key."""
+        updates = [(item.id, self._update_data(item)) for item in items]
+        for _, update_data in updates:
+            update_data.pop("id", None)
+        
+        current = dict((await db.execute(
+            select(User.id, User.email).where(User.id.in_([user_id for user_id, _ in updates]))
+        )).all())
+        new_emails = [data["email"] for _, data in updates if "email" in data]
+        new_usernames = [data["username"] for _, data in updates if "username" in data]
+        email_owners, username_owners = {}, {}
+        if new_emails or new_usernames:
+            for row in await db.execute(self.taken_statement(new_emails, new_usernames)):
+                email_owners[row.email] = row.id
+                username_owners[row.username] = row.id
+        
+        results: List[BatchResult] = []
+        rows, seen = [], set()
+        for index, (user_id, update_data) in enumerate(updates):
+            email, username = update_data.get("email"), update_data.get("username")
+            if user_id not in current:
+                results.append(BatchResult(index, "not_found", id=user_id, detail="User not found"))
+            elif user_id in seen:
+                results.append(BatchResult(index, "conflict", id=user_id, detail="User updated earlier in this batch"))
+            elif email is not None and email_owners.get(email, user_id) != user_id:
+                results.append(BatchResult(index, "conflict", id=user_id, detail="Email already registered"))
+            elif username is not None and username_owners.get(username, user_id) != user_id:
+                results.append(BatchResult(index, "conflict", id=user_id, detail="Username already taken"))
+            else:
+                # Later items may not take what this one claims
+                if email is not None:
+                    email_owners[email] = user_id
+                if username is not None:
+                    username_owners[username] = user_id
+                seen.add(user_id)
+                rows.append({"id": user_id, **update_data, "updated_at": datetime.utcnow()})
+                results.append(BatchResult(index, "updated", id=user_id))
+        
+        if rows:
+            await db.execute(update(User), rows)
+        await db.commit()
+        for row in rows:
+            await identity_cache.invalidate_async(current[row["id"]])
+            if "email" in row:
+                await identity_cache.invalidate_async(row["email"])
+        return results
+    
+    async def remove_many(self, db: AsyncSession, *, ids: List[Any]) -> List[BatchResult]:
+        """Delete users and their role links with two set-based DELETEs."""
+        unique_ids = list(dict.fromkeys(ids))
+        await db.execute(delete(user_roles).where(user_roles.c.user_id.in_(unique_ids)))
+        deleted = dict((await db.execute(
+            delete(User).where(User.id.in_(unique_ids)).returning(User.id, User.email)
+        )).all())
+        await db.commit()
+        
+        for user_id, email in deleted.items():
+            await identity_cache.invalidate_async(email)
+            permission_index.invalidate_user(user_id)
+        return [
+            BatchResult(index, "deleted", id=user_id) if user_id in deleted
+            else BatchResult(index, "not_found", id=user_id, detail="User not found")
+            for index, user_id in enumerate(ids)
+        ]
+    
+    async def authenticate(self, db: AsyncSession, *, email: str, password: str) -> Optional[User]:
+        from .auth import authenticate_user_async
+        return await authenticate_user_async(db, email, password)
+    
+    async def remove(self, db: AsyncSession, *, id: Any) -> User:
+        obj = await super().remove(db, id=id)
+        if obj is not None:
+            await identity_cache.invalidate_async(obj.email)
+        permission_index.invalidate_user(id)
+        return obj
+    
+    async def add_role(self, db: AsyncSession, *, user: User, role: Role) -> User:
+        user.roles.append(role)
+        db.add(user)
+        await db.commit()
+        await permission_index.invalidate_all_async()
+        return await self._reload(db, user)
+    
+    async def remove_role(self, db: AsyncSession, *, user: User, role: Role) -> User:
+        user.roles.remove(role)
+        db.add(user)
+        await db.commit()
+        await permission_index.invalidate_all_async()
+        return await self._reload(db, user)
+    
+    def is_active(self, user: User) -> bool:
+        return user.is_active
+    
+    def is_superuser(self, user: User) -> bool:
+        return user.is_superuser
+
+
+class AsyncRoleCRUD(RoleQueries, AsyncBaseCRUD):
+    """Role CRUD operations for async sessions."""
+    
+    def __init__(self):
+        super().__init__(Role)
+    
+    async def get_by_name(self, db: AsyncSession, *, name: str) -> Optional[Role]:
+        return await self._cached_row_by(db, self.get_by_name_statement(name), "name", name)
+    
+    async def remove(self, db: AsyncSession, *, id: Any) -> Role:
+        obj = await super().remove(db, id=id)
+        await permission_index.invalidate_all_async()
+        return obj
+    
+    async def add_permission(self, db: AsyncSession, *, role: Role, permission: Permission) -> Role:
+        role.permissions.append(permission)
+        db.add(role)
+        await db.commit()
+        await permission_index.invalidate_all_async()
+        return await self._reload(db, role)
+    
+    async def remove_permission(self, db: AsyncSession, *, role: Role, permission: Permission) -> Role:
+        role.permissions.remove(permission)
+        db.add(role)
+        await db.commit()
+        await permission_index.invalidate_all_async()
+        return await self._reload(db, role)
+
+
+class AsyncPermissionCRUD(PermissionQueries, AsyncBaseCRUD):
+    """Permission CRUD operations for async sessions."""
+    
+    def __init__(self):
+        super().__init__(Permission)
+    
+    async def get_by_name(self, db: AsyncSession, *, name: str) -> Optional[Permission]:
+        return await self._cached_row_by(db, self.get_by_name_statement(name), "name", name)
+    
+    async def get_by_resource_action(
+        self, db: AsyncSession, *, resource: str, action: str
+    ) -> Optional[Permission]:
+        statement = self.get_by_resource_action_statement(resource, action)
+        return (await db.execute(statement)).scalar_one_or_none()
+    
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: Permission,
+        obj_in: Union[Any, Dict[str, Any]]
+    ) -> Permission:
+        obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        await permission_index.invalidate_all_async()
+        return obj
+    
+    async def remove(self, db: AsyncSession, *, id: Any) -> Permission:
+        obj = await super().remove(db, id=id)
+        await permission_index.invalidate_all_async()
+        return obj
 
 {%- elif values.framework == "django" -%}
 """
@@ -160,10 +913,11 @@ Service layer for business logic.
 from typing import Optional, List, Dict, Any
 from django.contrib.auth import authenticate
 from django.core.paginator import Paginator
-from django.db.models import Q, QuerySet
+from django.db.models import QuerySet
 from django.contrib.auth.hashers import make_password
 
 from .models import User, Role, Permission
+from .search import search_users
 
 
 class UserService:
@@ -203,15 +957,10 @@ class UserService:
     @staticmethod
     def get_paginated_users(page: int = 1, per_page: int = 20, search: str = '') -> Dict[str, Any]:
         """Get paginated users."""
-        queryset = User.objects.all()
+        queryset = User.objects.order_by('created_at', 'id')
         
         if search:
-            queryset = queryset.filter(
-                Q(email__icontains=search) |
-                Q(username__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            queryset = search_users(queryset, search)
         
         paginator = Paginator(queryset, per_page)
         page_obj = paginator.get_page(page)
@@ -323,6 +1072,7 @@ from werkzeug.security import generate_password_hash
 
 from .database import db
 from .models import User, Role, Permission
+from .search import search_clauses
 
 
 class UserService:
@@ -373,12 +1123,8 @@ class UserService:
         query = User.query
         
         if search:
-            query = query.filter(
-                (User.email.contains(search)) |
-                (User.username.contains(search)) |
-                (User.first_name.contains(search)) |
-                (User.last_name.contains(search))
-            )
+            where, rank = search_clauses(search, db.engine.dialect.name)
+            query = query.filter(where).order_by(rank.desc(), User.created_at, User.id)
         
         paginated_users = query.paginate(
             page=page, per_page=per_page, error_out=False
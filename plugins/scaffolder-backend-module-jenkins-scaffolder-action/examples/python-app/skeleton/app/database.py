@@ -2,26 +2,390 @@
 Database connection and session management.
 """
 {% if values.framework == "fastapi" -%}
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from prometheus_client import Counter, Gauge, Histogram
+from redis import RedisError
 import asyncio
-from typing import AsyncGenerator
+import hashlib
+import logging
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
+from .cache import LRUCache, async_redis_client
 from .config import settings
+from .versions import record_commit_async
+
+logger = logging.getLogger(__name__)
+
+# Async drivers for each sync dialect
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+# Prometheus metrics, labelled by engine ("sync", "async" or "replica")
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', ['engine'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting for a connection', ['engine']
+)
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections currently checked out', ['engine'])
+DB_POOL_OVERFLOW = Gauge('db_pool_overflow', 'Overflow connections currently open', ['engine'])
+DB_POOL_SATURATION = Gauge(
+    'db_pool_saturation_ratio', 'Checked out connections as a share of the pool limit', ['engine']
+)
+DB_POOL_CAPACITY = Gauge('db_pool_capacity', 'Pool size plus max overflow', ['engine'])
+DB_CONNECTION_AGE = Histogram(
+    'db_connection_age_seconds', 'Age of connections when checked out', ['engine'],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200)
+)
+DB_REPLICA_LAG = Gauge('db_replica_lag_seconds', 'Replication lag at the last check', ['replica'])
+DB_REPLICA_UP = Gauge('db_replica_up', 'Whether the replica answered the last lag check', ['replica'])
+DB_READ_SESSIONS = Counter('db_read_sessions_total', 'Read-only sessions by where they were routed', ['target'])
+
+
+def get_async_database_url(url: str) -> str:
+    """Swap the driver in a database URL for its async counterpart."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver for database backend: {url.get_backend_name()}")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def worker_pool_limits(budget: int, workers: int, reserved: int = 0) -> Tuple[int, int]:
+    """Split a per-pod connection budget into one worker's ``(pool_size, max_overflow)``.
+    
+    Each worker gets an equal share of ``budget`` minus ``reserved``
+    connections kept for its other engines. Two thirds of the share stay
+    open in the pool and the rest is overflow for bursts.
+    """
+    share = max(budget // max(workers, 1) - reserved, 1)
+    pool_size = max(share * 2 // 3, 1)
+    return pool_size, share - pool_size
+
+
+class InstrumentedPoolMixin:
+    """Exports checkout wait, saturation and overflow for a queue pool."""
+    
+    engine_label = "sync"
+    
+    def _record_usage(self) -> None:
+        checked_out = self.checkedout()
+        capacity = self.size() + max(self._max_overflow, 0)
+        DB_POOL_CHECKED_OUT.labels(engine=self.engine_label).set(checked_out)
+        DB_POOL_OVERFLOW.labels(engine=self.engine_label).set(max(self.overflow(), 0))
+        DB_POOL_CAPACITY.labels(engine=self.engine_label).set(capacity)
+        DB_POOL_SATURATION.labels(engine=self.engine_label).set(checked_out / capacity if capacity else 0)
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(engine=self.engine_label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(engine=self.engine_label).observe(time.perf_counter() - start)
+        self._record_usage()
+        return conn
+    
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._record_usage()
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    engine_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+class InstrumentedReplicaQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "replica"
+
+
+def _track_connection_age(engine_label: str, pool: Any) -> None:
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info["connected_at"] = time.monotonic()
+    
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            DB_CONNECTION_AGE.labels(engine=engine_label).observe(time.monotonic() - connected_at)
+
+
+def pool_options(is_async: bool, replica: bool = False) -> Dict[str, Any]:
+    """Engine keyword arguments for the configured pool."""
+    if "sqlite" in settings.database_url:
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    
+    if is_async:
+        # Replicas have their own connection limits and no sync engine
+        pool_size, max_overflow = worker_pool_limits(
+            settings.db_pool_budget, settings.workers, reserved=0 if replica else settings.db_sync_pool_size
+        )
+        pool_size = settings.db_pool_size or pool_size
+        max_overflow = settings.db_max_overflow if settings.db_max_overflow is not None else max_overflow
+    else:
+        # The sync engine only serves background work and scripts
+        pool_size, max_overflow = settings.db_sync_pool_size, 0
+    
+    if replica:
+        poolclass = InstrumentedReplicaQueuePool
+    else:
+        poolclass = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    return {
+        "poolclass": poolclass,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
 
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.database_url,
     echo=settings.db_echo,
-    poolclass=StaticPool if "sqlite" in settings.database_url else None,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
     pool_pre_ping=True,
+    **pool_options(is_async=False),
+)
+_track_connection_age("sync", engine.pool)
+
+# Create async SQLAlchemy engine
+async_engine = create_async_engine(
+    get_async_database_url(settings.database_url),
+    echo=settings.db_echo,
+    pool_pre_ping=True,
+    **pool_options(is_async=True),
+)
+_track_connection_age("async", async_engine.sync_engine.pool)
+
+
+class ReplicaSet:
+    """Read replicas and the replication lag measured for each.
+    
+    Only replicas that answered the last check within ``max_lag``
+    seconds are handed out. Until the first check, or when none
+    qualify, reads stay on the primary.
+    """
+    
+    # Zero when replay has caught up with everything received, so an idle
+    # primary does not read as lag; NULL (not a standby) also counts as zero
+    LAG_QUERY = text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )
+    
+    def __init__(self, engines: List[AsyncEngine], max_lag: float):
+        self.engines = engines
+        self.max_lag = max_lag
+        self._healthy: List[AsyncEngine] = []
+        self._next = 0
+        self._monitor: Optional[asyncio.Task] = None
+    
+    def choose(self) -> Optional[AsyncEngine]:
+        """A replica within the lag limit, round robin, or None for the primary."""
+        healthy = self._healthy
+        if not healthy:
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+    
+    async def _lag(self, engine: AsyncEngine) -> Optional[float]:
+        try:
+            async with engine.connect() as conn:
+                if conn.dialect.name != "postgresql":
+                    return 0.0
+                lag = (await conn.execute(self.LAG_QUERY)).scalar()
+        except Exception as exc:
+            logger.warning(f"Replica {engine.url.host} failed its lag check: {exc}")
+            return None
+        return float(lag or 0)
+    
+    async def check_lag(self) -> None:
+        """Measure every replica and keep those within the lag limit."""
+        healthy = []
+        for index, engine in enumerate(self.engines):
+            lag = await self._lag(engine)
+            DB_REPLICA_UP.labels(replica=str(index)).set(lag is not None)
+            if lag is None:
+                continue
+            DB_REPLICA_LAG.labels(replica=str(index)).set(lag)
+            if lag <= self.max_lag:
+                healthy.append(engine)
+        self._healthy = healthy
+    
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_lag()
+    
+    async def start(self, interval: float) -> None:
+        """Check lag now, then every ``interval`` seconds in the background."""
+        if not self.engines:
+            return
+        await self.check_lag()
+        self._monitor = asyncio.create_task(self._watch(interval))
+    
+    async def close(self) -> None:
+        """Stop checking lag and close replica connections."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for engine in self.engines:
+            await engine.dispose()
+
+
+# Create read replica engines
+replicas = ReplicaSet(
+    [
+        create_async_engine(
+            get_async_database_url(url),
+            echo=settings.db_echo,
+            pool_pre_ping=True,
+            **pool_options(is_async=True, replica=True),
+        )
+        for url in settings.database_replica_urls
+    ],
+    max_lag=settings.db_replica_max_lag,
 )
+for _replica in replicas.engines:
+    _track_connection_age("replica", _replica.sync_engine.pool)
+
+class RecentWriters:
+    """Clients that committed a write within the last ``ttl`` seconds.
+    
+    A client that just wrote reads from the primary until any replica
+    still in rotation is guaranteed to have caught up. Markers are kept
+    in-process and, with ``redis_url``, in Redis, so the guarantee holds
+    whichever worker serves the client's next request.
+    """
+    
+    def __init__(self, redis_url: Optional[str], ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self._local = LRUCache("recent_writers", maxsize=maxsize, ttl=ttl)
+        self._redis = async_redis_client(redis_url)
+    
+    def _key(self, client: str) -> str:
+        return f"recent_writer:{client}"
+    
+    def mark(self, client: str) -> None:
+        """Record a write for this worker."""
+        self._local.set(client, True)
+    
+    async def share(self, client: str) -> None:
+        """Record a write for every worker."""
+        self.mark(client)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(self._key(client), 1, px=int(self.ttl * 1000))
+        except RedisError as e:
+            logger.warning(f"Recent writer marker not shared: {e}")
+    
+    async def wrote_recently(self, client: str) -> bool:
+        if self._local.get(client):
+            return True
+        if self._redis is None:
+            return False
+        try:
+            return bool(await self._redis.exists(self._key(client)))
+        except RedisError as e:
+            logger.warning(f"Recent writer lookup failed: {e}")
+            return False
+
+
+recent_writers = RecentWriters(
+    settings.db_recent_writers_url, ttl=settings.db_replica_max_lag + settings.db_replica_check_interval
+)
+
+
+class RoutingSession(Session):
+    """Session that sends SELECTs to ``info["replica"]`` when one is set.
+    
+    Everything else, and every statement after the session's first
+    write, goes to the primary.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self.info.get("wrote") and getattr(clause, "is_select", False):
+            return replica.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_statement_write(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
 
-# Create session factory
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush_write(session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writer(session) -> None:
+    client = session.info.get("client")
+    # Only replica reads need the marker
+    if client and session.info.get("wrote") and replicas.engines:
+        recent_writers.mark(client)
+        session.info["unshared_writer"] = client
+
+
+class RoutingAsyncSession(AsyncSession):
+    """AsyncSession that finishes post-commit bookkeeping off the event loop.
+    
+    Once a write commits, table versions are bumped and commit hooks run
+    on a worker thread, then every worker is told the client just wrote.
+    """
+    
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.sync_session.info["async_commit"] = True
+    
+    async def commit(self) -> None:
+        await super().commit()
+        await record_commit_async(self.sync_session)
+        client = self.info.pop("unshared_writer", None)
+        if client is not None:
+            await recent_writers.share(client)
+
+
+def client_key(request: Request) -> str:
+    """Identify a client across requests by its credentials, else its address."""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).hexdigest()
+    return request.client.host if request.client else ""
+
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit; lazy loads cannot run on an async session
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=RoutingAsyncSession, sync_session_class=RoutingSession,
+    autoflush=False, expire_on_commit=False
+)
 
 # Create declarative base
 Base = declarative_base()
@@ -36,22 +400,52 @@ def get_db() -> Session:
         db.close()
 
 
-def init_db() -> None:
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Get async database session."""
+    async with AsyncSessionLocal(info={"client": client_key(request)}) as db:
+        yield db
+
+
+async def read_replica(client: str) -> Optional[AsyncEngine]:
+    """Replica to serve ``client``'s reads, or None for the primary.
+    
+    Falls back to the primary when no replica is within the lag limit
+    or the client wrote recently, so clients always see their own writes.
+    """
+    replica = replicas.choose()
+    if replica is not None and await recent_writers.wrote_recently(client):
+        replica = None
+    DB_READ_SESSIONS.labels(target="primary" if replica is None else "replica").inc()
+    return replica
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Get async session whose reads may be served by a replica."""
+    client = client_key(request)
+    async with AsyncSessionLocal(info={"client": client, "replica": await read_replica(client)}) as db:
+        yield db
+
+
+async def init_db() -> None:
     """Initialize database."""
     # Import all models here to ensure they are registered with SQLAlchemy
     from . import models  # noqa
     Base.metadata.create_all(bind=engine)
+    # Request paths use the async engine, which may not share the sync one's database
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 {%- elif values.framework == "django" -%}
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.cache import cache
-import uuid
+
+from .ids import uuid7
 
 # Base model with common fields
 class BaseModel(models.Model):
     """Base model with common fields."""
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -68,9 +462,10 @@ def init_db():
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
 from datetime import datetime
 
+from .ids import uuid7
+
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 migrate = Migrate()
@@ -80,7 +475,7 @@ class BaseModel(db.Model):
     """Base model with common fields."""
     __abstract__ = True
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
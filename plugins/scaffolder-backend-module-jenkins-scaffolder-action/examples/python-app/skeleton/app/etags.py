@@ -0,0 +1,99 @@
+{% if values.framework == "fastapi" -%}
+"""
+ETags and conditional GETs.
+
+Each committed write bumps a version counter per table it touched
+(``app.versions``). A read endpoint's ETag is built from those counters,
+plus, for single rows, a probe of a few of the row's columns, so a client
+sending ``If-None-Match`` gets a ``304`` before anything is loaded or
+serialized.
+
+Counters are read through ``VersionCounter``'s local copy, so a write on
+another worker can take up to ``version_cache_ttl`` seconds to change
+an ETag. That only holds while the counters are shared: without Redis,
+or after a write whose bump has not reached Redis yet, a table's version
+says nothing about other workers' writes, so its endpoints send no ETag
+and always answer in full.
+"""
+import hashlib
+import uuid
+from typing import Any, Set, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .auth import get_current_active_user
+from .database import get_read_db
+from .models import User
+from .versions import table_versions_async, tables_shared
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """A strong ETag over ``parts``."""
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def _if_none_match(request: Request) -> Set[str]:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+def check_not_modified(request: Request, response: Response, etag: str) -> None:
+    """Set ``etag`` on the response, or end the request with 304 if the client has it."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    matches = _if_none_match(request)
+    if etag in matches or "*" in matches:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+def table_etag(*tables: str):
+    """Dependency for lists: the ETag comes from the versions of ``tables``."""
+    async def etag_dependency(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_active_user)
+    ):
+        # Read the versions first: a failed read leaves them unshared
+        stamp = await table_versions_async(tables)
+        if not tables_shared(tables):
+            return
+        etag = make_etag(request.url.path, request.url.query, stamp)
+        check_not_modified(request, response, etag)
+
+    return etag_dependency
+
+
+def row_etag(*columns: Any, tables: Tuple[str, ...] = (), param: str = "id"):
+    """Dependency for one row: probes ``columns`` of the row named by ``param``.
+
+    ``tables`` are the related tables serialized with the row. Unknown
+    rows get no ETag and fall through to the endpoint's 404.
+    """
+    model = columns[0].class_
+
+    async def etag_dependency(
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_read_db),
+        current_user: User = Depends(get_current_active_user)
+    ):
+        stamp = await table_versions_async(tables)
+        if not tables_shared(tables):
+            return
+        try:
+            row_id = uuid.UUID(request.path_params[param])
+        except ValueError:
+            return
+        row = (await db.execute(select(*columns).where(model.id == row_id))).one_or_none()
+        if row is None:
+            return
+        etag = make_etag(request.url.path, request.url.query, tuple(row), stamp)
+        check_not_modified(request, response, etag)
+
+    return etag_dependency
+{%- endif %}
@@ -4,7 +4,7 @@ Django app-specific URLs
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from app.api import UserViewSet, RoleViewSet, AuthViewSet
+from app.api import UserViewSet, RoleViewSet, AuthViewSet, slow_queries_view
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -17,6 +17,7 @@ urlpatterns = [
         path('logout/', AuthViewSet.as_view({'post': 'logout'}), name='auth-logout'),
         path('me/', AuthViewSet.as_view({'get': 'me'}), name='auth-me'),
     ])),
+    path('admin/slow-queries/', slow_queries_view, name='admin-slow-queries'),
 ]
 
 {% elif values.framework == 'flask' -%}
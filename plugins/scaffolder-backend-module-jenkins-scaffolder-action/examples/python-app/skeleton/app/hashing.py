@@ -0,0 +1,234 @@
+{% if values.framework == "fastapi" -%}
+"""
+Password hashing engine and worker pool.
+
+Run ``python -m app.hashing calibrate --target-ms 250`` on the target
+node size to pick the BCRYPT_ROUNDS or ARGON2_* cost settings. Every
+worker must hash with the same configured costs, so they are never
+tuned at startup.
+"""
+import argparse
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+from .config import settings
+
+SUPPORTED_SCHEMES = ("argon2", "bcrypt")
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_MAX_TIME_COST = 10
+
+# Prometheus metrics
+HASH_QUEUE_DEPTH = Gauge('password_hash_queue_depth', 'Password hash jobs waiting for a worker')
+HASH_WAIT_TIME = Histogram('password_hash_wait_seconds', 'Time password hash jobs wait for a worker')
+HASH_DURATION = Histogram('password_hash_duration_seconds', 'Password hash job duration', ['operation'])
+HASH_REJECTED = Counter('password_hash_rejected_total', 'Password hash jobs rejected by a full queue')
+
+
+class PasswordHasher:
+    """Password hashing backed by a passlib CryptContext.
+    
+    ``scheme`` is used for new hashes. Hashes made with the other
+    supported scheme, or with weaker cost parameters, still verify but
+    are reported as needing an update so callers can rehash on login.
+    """
+    
+    def __init__(
+        self,
+        scheme: str = "bcrypt",
+        bcrypt_rounds: int = 12,
+        argon2_time_cost: int = 3,
+        argon2_memory_cost: int = 65536,
+        argon2_parallelism: int = 4,
+    ):
+        if scheme not in SUPPORTED_SCHEMES:
+            raise ValueError(f"Unsupported password hash scheme: {scheme}")
+        
+        self.scheme = scheme
+        self.params = {
+            "bcrypt_rounds": bcrypt_rounds,
+            "argon2_time_cost": argon2_time_cost,
+            "argon2_memory_cost": argon2_memory_cost,
+            "argon2_parallelism": argon2_parallelism,
+        }
+        self.context = CryptContext(
+            schemes=[scheme] + [s for s in SUPPORTED_SCHEMES if s != scheme],
+            default=scheme,
+            deprecated="auto",
+            bcrypt__rounds=bcrypt_rounds,
+            bcrypt__min_rounds=bcrypt_rounds,
+            argon2__type="ID",
+            argon2__rounds=argon2_time_cost,
+            argon2__min_rounds=argon2_time_cost,
+            argon2__memory_cost=argon2_memory_cost,
+            argon2__parallelism=argon2_parallelism,
+        )
+    
+    @classmethod
+    def from_settings(cls) -> "PasswordHasher":
+        return cls(
+            scheme=settings.password_hash_scheme,
+            bcrypt_rounds=settings.bcrypt_rounds,
+            argon2_time_cost=settings.argon2_time_cost,
+            argon2_memory_cost=settings.argon2_memory_cost,
+            argon2_parallelism=settings.argon2_parallelism,
+        )
+    
+    def hash(self, password: str) -> str:
+        return self.context.hash(password)
+    
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self.context.verify(password, hashed_password)
+    
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password and return a replacement hash if it is outdated."""
+        return self.context.verify_and_update(password, hashed_password)
+    
+    def calibrate(self, target_ms: float) -> "PasswordHasher":
+        """Return a hasher whose cost parameters hit ``target_ms`` per hash here."""
+        params = dict(self.params)
+        if self.scheme == "bcrypt":
+            params["bcrypt_rounds"] = calibrate_bcrypt(target_ms)
+        else:
+            params["argon2_time_cost"] = calibrate_argon2(
+                target_ms, params["argon2_memory_cost"], params["argon2_parallelism"]
+            )
+        return PasswordHasher(scheme=self.scheme, **params)
+
+
+def _time_hash(context: CryptContext) -> float:
+    """Milliseconds taken by a single hash."""
+    start = time.perf_counter()
+    context.hash("calibration-password")
+    return (time.perf_counter() - start) * 1000
+
+
+def calibrate_bcrypt(target_ms: float) -> int:
+    """Pick the bcrypt rounds closest to ``target_ms`` without going under the floor."""
+    elapsed = _time_hash(CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_MIN_ROUNDS))
+    # Each extra round doubles the work
+    rounds = BCRYPT_MIN_ROUNDS + round(math.log2(max(target_ms / elapsed, 1)))
+    return min(rounds, BCRYPT_MAX_ROUNDS)
+
+
+def calibrate_argon2(target_ms: float, memory_cost: int, parallelism: int) -> int:
+    """Pick the smallest Argon2id time cost that reaches ``target_ms``."""
+    for time_cost in range(1, ARGON2_MAX_TIME_COST + 1):
+        context = CryptContext(
+            schemes=["argon2"],
+            argon2__type="ID",
+            argon2__rounds=time_cost,
+            argon2__memory_cost=memory_cost,
+            argon2__parallelism=parallelism,
+        )
+        if _time_hash(context) >= target_ms:
+            return time_cost
+    return ARGON2_MAX_TIME_COST
+
+
+password_hasher = PasswordHasher.from_settings()
+
+
+class HashPoolFull(Exception):
+    """Raised when the password hash queue is at capacity."""
+
+
+class PasswordHashPool:
+    """Bounded thread pool for CPU-bound password hashing.
+
+    bcrypt releases the GIL, so hashing on these threads keeps the event
+    loop free. Jobs beyond ``workers + max_queue`` are rejected instead
+    of queueing without limit.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` on the pool and await its result."""
+        if self._pending >= self.max_pending:
+            HASH_REJECTED.inc()
+            raise HashPoolFull(f"{self._pending} password hash jobs pending")
+
+        self._pending += 1
+        HASH_QUEUE_DEPTH.inc()
+        submitted = time.perf_counter()
+        started = []
+
+        def job():
+            started.append(time.perf_counter())
+            HASH_QUEUE_DEPTH.dec()
+            HASH_WAIT_TIME.observe(started[0] - submitted)
+            try:
+                return func(*args)
+            finally:
+                HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started[0])
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._pending -= 1
+            if not started:
+                HASH_QUEUE_DEPTH.dec()
+
+    async def run_many(self, operation: str, func: Callable[..., Any], argsets: List[Tuple[Any, ...]]) -> List[Any]:
+        """Run ``func`` over ``argsets`` in order, at most ``workers`` jobs at a time.
+
+        A whole batch fits through the pool without filling the queue
+        that interactive requests share.
+        """
+        slots = asyncio.Semaphore(self.workers)
+
+        async def bounded(args: Tuple[Any, ...]) -> Any:
+            async with slots:
+                return await self.run(operation, func, *args)
+
+        return await asyncio.gather(*(bounded(args) for args in argsets))
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=False)
+
+
+hash_pool = PasswordHashPool(
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
+
+
+def main(argv=None) -> None:
+    """Print calibrated hash scheme and cost settings for this machine."""
+    parser = argparse.ArgumentParser(prog="python -m app.hashing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = subparsers.add_parser("calibrate", help="Pick cost parameters for a target latency")
+    calibrate_parser.add_argument("--scheme", choices=SUPPORTED_SCHEMES, default=settings.password_hash_scheme)
+    calibrate_parser.add_argument("--target-ms", type=float, default=settings.password_hash_target_ms)
+    args = parser.parse_args(argv)
+    
+    hasher = PasswordHasher(scheme=args.scheme, **password_hasher.params).calibrate(args.target_ms)
+    print(f"PASSWORD_HASH_SCHEME={hasher.scheme}")
+    if hasher.scheme == "bcrypt":
+        print(f"BCRYPT_ROUNDS={hasher.params['bcrypt_rounds']}")
+    else:
+        print(f"ARGON2_TIME_COST={hasher.params['argon2_time_cost']}")
+        print(f"ARGON2_MEMORY_COST={hasher.params['argon2_memory_cost']}")
+        print(f"ARGON2_PARALLELISM={hasher.params['argon2_parallelism']}")
+    print(f"# {_time_hash(hasher.context):.0f} ms per hash on this machine")
+
+
+if __name__ == "__main__":
+    main()
+{%- endif %}
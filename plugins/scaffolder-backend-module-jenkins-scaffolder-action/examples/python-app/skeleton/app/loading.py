@@ -0,0 +1,124 @@
+{% if values.framework == "fastapi" -%}
+"""
+Eager-loading profiles and per-request query budgets.
+
+Endpoints declare a profile with ``Depends(load_profile(...))``; the
+CRUD classes load exactly the relationships it names, so serializing a
+response never falls back to lazy loads.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional, Tuple
+
+from prometheus_client import Counter
+from sqlalchemy.orm import joinedload, selectinload
+
+from .config import settings
+from .models import User, Role, Permission
+from .querystats import RequestQueries, current_queries, track_queries
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+QUERY_BUDGET_EXCEEDED = Counter(
+    'query_budget_exceeded_total', 'Requests that ran more queries than their budget', ['label']
+)
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """Loader options to apply to queries for ``model``."""
+    model: Any
+    options: Tuple[Any, ...] = ()
+
+
+# Single objects join their relationships into one query; lists use one
+# extra SELECT ... IN per relationship rather than multiplying rows.
+LOAD_PROFILES = {
+    "user.detail": LoadProfile(User, (joinedload(User.roles).joinedload(Role.permissions),)),
+    "user.list": LoadProfile(User, (selectinload(User.roles).selectinload(Role.permissions),)),
+    # Deleting needs the association rows, not the permissions behind them
+    "user.delete": LoadProfile(User, (selectinload(User.roles),)),
+    # Batch endpoints write with set-based statements and load no objects
+    "user.batch": LoadProfile(User),
+    "role.detail": LoadProfile(Role, (joinedload(Role.permissions),)),
+    "role.list": LoadProfile(Role, (selectinload(Role.permissions),)),
+    "permission.detail": LoadProfile(Permission),
+    "permission.list": LoadProfile(Permission),
+}
+
+_active_profile: ContextVar[Optional[LoadProfile]] = ContextVar("load_profile", default=None)
+
+
+def profile_options(model: Any, default: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """Loader options from the active profile for ``model``, else ``default``."""
+    profile = _active_profile.get()
+    if profile is not None and profile.model is model:
+        return profile.options
+    return default
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in enforcing mode when a block runs more queries than allowed."""
+
+
+class QueryCounter:
+    """Statements ``queries`` has counted since the budget started."""
+
+    def __init__(self, label: str, budget: int, queries: RequestQueries):
+        self.label = label
+        self.budget = budget
+        self.queries = queries
+        self._start = queries.count
+
+    @property
+    def count(self) -> int:
+        return self.queries.count - self._start
+
+    def check(self) -> None:
+        if self.count <= self.budget:
+            return
+        QUERY_BUDGET_EXCEEDED.labels(label=self.label).inc()
+        message = f"{self.label} ran {self.count} queries, budget is {self.budget}"
+        if settings.query_budget_enforce:
+            shapes = [f"{shape['count']}x {shape['sql']}" for shape in self.queries.repeated(1)]
+            raise QueryBudgetExceeded(message + ":\n" + "\n".join(shapes))
+        logger.warning(message)
+
+
+@contextmanager
+def query_budget(budget: int, label: str = "block") -> Iterator[QueryCounter]:
+    """Count queries run inside the block and check them against ``budget``.
+
+    Inside a tracked request the request's statistics are used; elsewhere
+    the block is tracked on its own.
+    """
+    with ExitStack() as stack:
+        queries = current_queries()
+        if queries is None:
+            queries = stack.enter_context(track_queries(label))
+        counter = QueryCounter(label, budget, queries)
+        yield counter
+    counter.check()
+
+
+def load_profile(name: str, *, query_budget: Optional[int] = None):
+    """Dependency activating a loading profile and optional query budget for an endpoint."""
+    profile = LOAD_PROFILES[name]
+
+    async def profile_dependency():
+        # Each request runs in its own context, so nothing needs resetting
+        _active_profile.set(profile)
+        # Budgets count what app.middleware tracks for the request
+        queries = current_queries()
+        if query_budget is None or queries is None:
+            yield
+            return
+        counter = QueryCounter(name, query_budget, queries)
+        yield
+        counter.check()
+
+    return profile_dependency
+{%- endif %}
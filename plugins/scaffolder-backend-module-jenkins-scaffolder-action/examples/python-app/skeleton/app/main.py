@@ -13,9 +13,12 @@ import logging
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from prometheus_client import start_http_server
 
+from .activity import activity
 from .config import settings
-from .database import init_db
+from .database import async_engine, init_db, replicas
 from .api import router
+from .bus import bus
+from .hashing import hash_pool
 from .middleware import LoggingMiddleware, MetricsMiddleware
 
 # Prometheus metrics
@@ -35,7 +38,10 @@ async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
     logger.info("Starting up {{ values.name }} application...")
-    init_db()
+    await init_db()
+    await replicas.start(settings.db_replica_check_interval)
+    activity.start(settings.activity_flush_interval)
+    bus.start()
     
     # Start Prometheus metrics server
     start_http_server(settings.metrics_port)
@@ -45,6 +51,11 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down {{ values.name }} application...")
+    hash_pool.shutdown()
+    bus.close()
+    await activity.close()
+    await replicas.close()
+    await async_engine.dispose()
 
 
 # Create FastAPI application
@@ -108,14 +119,14 @@ async def general_exception_handler(request: Request, exc: Exception):
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    from .database import engine
+    from .database import async_engine
     from redis import Redis
-    import asyncio
+    from sqlalchemy import text
     
     # Check database
     try:
-        with engine.connect() as conn:
-            conn.execute("SELECT 1")
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         db_status = True
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
@@ -199,6 +210,8 @@ from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_
 from .config import get_config
 from .database import init_db, db
 from .api import api_bp
+from .querystats import init_query_stats
+from .slowqueries import init_slow_query_log
 
 # Prometheus metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
@@ -242,6 +255,10 @@ def create_app(config_name=None):
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api/v1')
     
+    # Per-request SQL statistics and the slow-query log
+    init_query_stats(app)
+    init_slow_query_log(app)
+    
     # Middleware for metrics
     @app.before_request
     def before_request():
@@ -10,6 +10,8 @@ from fastapi.middleware.base import BaseHTTPMiddleware
 from prometheus_client import Counter, Histogram
 import structlog
 
+from .querystats import current_queries, observe, track_queries
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -59,6 +61,9 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         # Calculate duration
         duration = time.time() - start_time
         
+        # Statements so far, collected by MetricsMiddleware
+        queries = current_queries()
+        
         # Log response
         logger.info(
             "request_completed",
@@ -67,6 +72,7 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             status_code=response.status_code,
             duration=duration,
             client_ip=request.client.host if request.client else None,
+            **(queries.log_fields() if queries is not None else {}),
         )
         
         return response
@@ -81,12 +87,15 @@ class MetricsMiddleware(BaseHTTPMiddleware):
         # Get request size
         request_size = int(request.headers.get("content-length", 0))
         
-        # Process request
-        response = await call_next(request)
+        # Process request, collecting the SQL it runs
+        with track_queries(f"{request.method} {request.url.path}") as queries:
+            response = await call_next(request)
         
         # Calculate duration and response size
         duration = time.time() - start_time
         response_size = int(response.headers.get("content-length", 0))
+        route = request.scope.get("route")
+        observe(queries, route.path if route else request.url.path)
         
         # Record metrics
         REQUEST_COUNT.labels(
@@ -172,6 +181,9 @@ class LoggingMiddleware(MiddlewareMixin):
         if hasattr(request, 'start_time'):
             duration = time.time() - request.start_time
             
+            # Collected by app.querystats.QueryStatsMiddleware
+            queries = getattr(request, 'queries', None)
+            
             logger.info(
                 "request_completed",
                 method=request.method,
@@ -179,6 +191,7 @@ class LoggingMiddleware(MiddlewareMixin):
                 status_code=response.status_code,
                 duration=duration,
                 client_ip=self.get_client_ip(request),
+                **(queries.log_fields() if queries is not None else {}),
             )
             
             # Record Prometheus metrics
@@ -225,6 +238,9 @@ from flask import request, g, current_app
 from prometheus_client import Counter, Histogram
 import structlog
 
+from .querystats import current_queries
+from .ratelimit import RateLimitRule, limit
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -270,6 +286,7 @@ def setup_logging_middleware(app):
     def after_request(response):
         if hasattr(g, 'start_time'):
             duration = time.time() - g.start_time
+            queries = current_queries()
             
             logger.info(
                 "request_completed",
@@ -278,6 +295,7 @@ def setup_logging_middleware(app):
                 status_code=response.status_code,
                 duration=duration,
                 client_ip=get_client_ip(),
+                **(queries.log_fields() if queries is not None else {}),
             )
             
             # Record Prometheus metrics
@@ -326,20 +344,11 @@ def log_execution_time(func):
     return wrapper
 
 
-def rate_limit(max_requests=100, window=3600):
-    """Rate limiting decorator."""
-    def decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            # Simple in-memory rate limiting
-            # In production, use Redis or similar
-            client_ip = get_client_ip()
-            key = f"rate_limit:{client_ip}:{f.__name__}"
-            
-            # This is a simplified implementation
-            # In production, implement proper rate limiting with Redis
-            
-            return f(*args, **kwargs)
-        return wrapper
-    return decorator
+def rate_limit(max_requests=100, window=3600, scope="ip"):
+    """Rate limiting decorator.
+    
+    Allows ``max_requests`` per ``window`` seconds for each client IP,
+    user or route depending on ``scope``; see ``app.ratelimit``.
+    """
+    return limit(RateLimitRule(scope=scope, limit=max_requests, window=window))
 {%- endif %}
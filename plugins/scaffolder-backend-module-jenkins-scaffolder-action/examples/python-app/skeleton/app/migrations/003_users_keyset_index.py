@@ -0,0 +1,63 @@
+"""
+Index users by (created_at, id) for keyset pagination
+"""
+{% if values.framework == 'fastapi' -%}
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003_users_keyset_index'
+down_revision = '002_seed_data'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Create keyset index"""
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'])
+
+def downgrade():
+    """Drop keyset index"""
+    op.drop_index('ix_users_created_at_id', table_name='users')
+
+{% elif values.framework == 'django' -%}
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('app', '002_seed_data'),
+    ]
+    
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='ix_users_created_at_id'),
+        ),
+    ]
+
+{% elif values.framework == 'flask' -%}
+# Flask-Migrate schema migration
+
+"""Index users by (created_at, id)
+
+Revision ID: 003_users_keyset_index
+Revises: 002_seed_data
+Create Date: 2024-01-01 02:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003_users_keyset_index'
+down_revision = '002_seed_data'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Create keyset index"""
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'])
+
+def downgrade():
+    """Drop keyset index"""
+    op.drop_index('ix_users_created_at_id', table_name='users')
+
+{% endif %}
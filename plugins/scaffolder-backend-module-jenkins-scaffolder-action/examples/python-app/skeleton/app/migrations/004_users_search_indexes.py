@@ -0,0 +1,154 @@
+"""
+Full-text and trigram indexes for user search
+
+On PostgreSQL the indexes are built CONCURRENTLY, outside a transaction,
+so writes to users are not blocked while they build.
+
+The indexed document needs the first_name and last_name columns of the
+current models. 001 creates full_name instead, so on a users table
+without both columns the indexes are skipped and search scans the table.
+"""
+{% if values.framework == 'fastapi' -%}
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# revision identifiers, used by Alembic.
+revision = '004_users_search_indexes'
+down_revision = '003_users_keyset_index'
+branch_labels = None
+depends_on = None
+
+# Expressions must match app/search.py exactly for the planner to use them
+SEARCH_DOCUMENT = "lower(email || ' ' || username || ' ' || first_name || ' ' || last_name)"
+SEARCH_COLUMNS = {'email', 'username', 'first_name', 'last_name'}
+
+def upgrade():
+    """Create search indexes (PostgreSQL only)"""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('users')}
+    if not SEARCH_COLUMNS <= columns:
+        logger.warning(f"Skipping user search indexes; users has no {', '.join(sorted(SEARCH_COLUMNS - columns))}")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY ix_users_search_tsv ON users USING gin (to_tsvector('simple', {SEARCH_DOCUMENT}))")
+        op.execute(f"CREATE INDEX CONCURRENTLY ix_users_search_trgm ON users USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)")
+
+def downgrade():
+    """Drop search indexes"""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_tsv")
+
+{% elif values.framework == 'django' -%}
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+# Expressions must match app/search.py exactly for the planner to use them
+SEARCH_DOCUMENT = "lower(email || ' ' || username || ' ' || first_name || ' ' || last_name)"
+SEARCH_COLUMNS = {'email', 'username', 'first_name', 'last_name'}
+
+CREATE_SEARCH_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX CONCURRENTLY ix_users_search_tsv ON users USING gin (to_tsvector('simple', {SEARCH_DOCUMENT}))",
+    f"CREATE INDEX CONCURRENTLY ix_users_search_trgm ON users USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)",
+]
+
+DROP_SEARCH_INDEXES = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_tsv",
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            columns = {column.name for column in connection.introspection.get_table_description(cursor, 'users')}
+        if not SEARCH_COLUMNS <= columns:
+            logger.warning(f"Skipping user search indexes; users has no {', '.join(sorted(SEARCH_COLUMNS - columns))}")
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '003_users_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SEARCH_INDEXES),
+            run_on_postgresql(DROP_SEARCH_INDEXES),
+        ),
+    ]
+
+{% elif values.framework == 'flask' -%}
+# Flask-Migrate schema migration
+
+"""Full-text and trigram indexes for user search
+
+Revision ID: 004_users_search_indexes
+Revises: 003_users_keyset_index
+Create Date: 2024-01-01 03:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# revision identifiers, used by Alembic.
+revision = '004_users_search_indexes'
+down_revision = '003_users_keyset_index'
+branch_labels = None
+depends_on = None
+
+# Expressions must match app/search.py exactly for the planner to use them
+SEARCH_DOCUMENT = "lower(email || ' ' || username || ' ' || first_name || ' ' || last_name)"
+SEARCH_COLUMNS = {'email', 'username', 'first_name', 'last_name'}
+
+def upgrade():
+    """Create search indexes (PostgreSQL only)"""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('users')}
+    if not SEARCH_COLUMNS <= columns:
+        logger.warning(f"Skipping user search indexes; users has no {', '.join(sorted(SEARCH_COLUMNS - columns))}")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY ix_users_search_tsv ON users USING gin (to_tsvector('simple', {SEARCH_DOCUMENT}))")
+        op.execute(f"CREATE INDEX CONCURRENTLY ix_users_search_trgm ON users USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)")
+
+def downgrade():
+    """Drop search indexes"""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_tsv")
+
+{% endif %}
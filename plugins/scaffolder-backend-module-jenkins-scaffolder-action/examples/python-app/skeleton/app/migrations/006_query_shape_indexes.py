@@ -0,0 +1,240 @@
+"""
+Indexes for permission lookups, reverse memberships and list order
+
+On PostgreSQL the indexes are built CONCURRENTLY, outside a transaction,
+so writes to these tables are not blocked while they build.
+
+The (resource, action) constraint needs the resource and action columns
+of the current models, which 001 does not create; without them it is
+skipped. Existing duplicates are folded into the oldest permission first.
+"""
+{% if values.framework == 'fastapi' -%}
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# revision identifiers, used by Alembic.
+revision = '006_query_shape_indexes'
+down_revision = '004_users_search_indexes'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns) for each query shape in app/crud.py
+INDEXES = (
+    ('ix_user_roles_role_id', 'user_roles', ['role_id']),
+    ('ix_role_permissions_permission_id', 'role_permissions', ['permission_id']),
+    ('ix_roles_created_at_id', 'roles', ['created_at', 'id']),
+    ('ix_permissions_created_at_id', 'permissions', ['created_at', 'id']),
+)
+
+# Each permission repeating an older one's (resource, action), and the id it repeats
+DUPLICATE_PERMISSIONS = """
+SELECT id, keep_id FROM (
+    SELECT id, first_value(id) OVER (PARTITION BY resource, action ORDER BY created_at, id) AS keep_id
+    FROM permissions
+) ranked WHERE id <> keep_id
+"""
+
+def has_resource_action(bind):
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('permissions')}
+    return {'resource', 'action'} <= columns
+
+def dedupe_permissions():
+    """Move role grants onto the oldest of each duplicate and delete the rest"""
+    op.execute(
+        "INSERT INTO role_permissions (role_id, permission_id)"
+        " SELECT rp.role_id, duplicate.keep_id FROM role_permissions rp"
+        f" JOIN ({DUPLICATE_PERMISSIONS}) duplicate ON rp.permission_id = duplicate.id"
+        " WHERE true ON CONFLICT DO NOTHING"
+    )
+    op.execute(
+        f"DELETE FROM role_permissions WHERE permission_id IN (SELECT id FROM ({DUPLICATE_PERMISSIONS}) duplicate)"
+    )
+    op.execute(f"DELETE FROM permissions WHERE id IN (SELECT id FROM ({DUPLICATE_PERMISSIONS}) duplicate)")
+
+def upgrade():
+    """Create query-shape indexes and the (resource, action) constraint"""
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+    unique = has_resource_action(bind)
+    if unique:
+        # Committed before the index build starts
+        dedupe_permissions()
+    else:
+        logger.warning("Skipping unique_resource_action; permissions has no resource and action columns")
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+        if not unique:
+            return
+        op.create_index(
+            'unique_resource_action', 'permissions', ['resource', 'action'],
+            unique=True, postgresql_concurrently=True
+        )
+        if postgresql:
+            # Promoting the prebuilt index only takes a brief lock
+            op.execute(
+                "ALTER TABLE permissions ADD CONSTRAINT unique_resource_action "
+                "UNIQUE USING INDEX unique_resource_action"
+            )
+
+def downgrade():
+    """Drop query-shape indexes and the (resource, action) constraint"""
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        # Absent when upgrade skipped it
+        if postgresql:
+            op.execute("ALTER TABLE permissions DROP CONSTRAINT IF EXISTS unique_resource_action")
+        else:
+            op.drop_index('unique_resource_action', table_name='permissions', if_exists=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+{% elif values.framework == 'django' -%}
+from django.db import migrations, models
+
+# Many-to-many tables already index both foreign keys, and
+# unique_together covers (resource, action)
+INDEXES = [
+    ('role', models.Index(fields=['created_at', 'id'], name='ix_roles_created_at_id')),
+    ('permission', models.Index(fields=['created_at', 'id'], name='ix_permissions_created_at_id')),
+]
+
+
+def add_indexes(apps, schema_editor):
+    concurrently = schema_editor.connection.vendor == 'postgresql'
+    for model_name, index in INDEXES:
+        model = apps.get_model('app', model_name)
+        if concurrently:
+            schema_editor.add_index(model, index, concurrently=True)
+        else:
+            schema_editor.add_index(model, index)
+
+
+def remove_indexes(apps, schema_editor):
+    concurrently = schema_editor.connection.vendor == 'postgresql'
+    for model_name, index in reversed(INDEXES):
+        model = apps.get_model('app', model_name)
+        if concurrently:
+            schema_editor.remove_index(model, index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '004_users_search_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(add_indexes, remove_indexes)],
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in INDEXES
+            ],
+        ),
+    ]
+
+{% elif values.framework == 'flask' -%}
+# Flask-Migrate schema migration
+
+"""Indexes for permission lookups, reverse memberships and list order
+
+Revision ID: 006_query_shape_indexes
+Revises: 004_users_search_indexes
+Create Date: 2024-01-01 05:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# revision identifiers, used by Alembic.
+revision = '006_query_shape_indexes'
+down_revision = '004_users_search_indexes'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns) for each query shape in app/api.py
+INDEXES = (
+    ('ix_user_roles_role_id', 'user_roles', ['role_id']),
+    ('ix_role_permissions_permission_id', 'role_permissions', ['permission_id']),
+    ('ix_roles_created_at_id', 'roles', ['created_at', 'id']),
+    ('ix_permissions_created_at_id', 'permissions', ['created_at', 'id']),
+)
+
+# Each permission repeating an older one's (resource, action), and the id it repeats
+DUPLICATE_PERMISSIONS = """
+SELECT id, keep_id FROM (
+    SELECT id, first_value(id) OVER (PARTITION BY resource, action ORDER BY created_at, id) AS keep_id
+    FROM permissions
+) ranked WHERE id <> keep_id
+"""
+
+def has_resource_action(bind):
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('permissions')}
+    return {'resource', 'action'} <= columns
+
+def dedupe_permissions():
+    """Move role grants onto the oldest of each duplicate and delete the rest"""
+    op.execute(
+        "INSERT INTO role_permissions (role_id, permission_id)"
+        " SELECT rp.role_id, duplicate.keep_id FROM role_permissions rp"
+        f" JOIN ({DUPLICATE_PERMISSIONS}) duplicate ON rp.permission_id = duplicate.id"
+        " WHERE true ON CONFLICT DO NOTHING"
+    )
+    op.execute(
+        f"DELETE FROM role_permissions WHERE permission_id IN (SELECT id FROM ({DUPLICATE_PERMISSIONS}) duplicate)"
+    )
+    op.execute(f"DELETE FROM permissions WHERE id IN (SELECT id FROM ({DUPLICATE_PERMISSIONS}) duplicate)")
+
+def upgrade():
+    """Create query-shape indexes and the (resource, action) constraint"""
+    bind = op.get_bind()
+    postgresql = bind.dialect.name == 'postgresql'
+    unique = has_resource_action(bind)
+    if unique:
+        # Committed before the index build starts
+        dedupe_permissions()
+    else:
+        logger.warning("Skipping unique_resource_action; permissions has no resource and action columns")
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+        if not unique:
+            return
+        op.create_index(
+            'unique_resource_action', 'permissions', ['resource', 'action'],
+            unique=True, postgresql_concurrently=True
+        )
+        if postgresql:
+            # Promoting the prebuilt index only takes a brief lock
+            op.execute(
+                "ALTER TABLE permissions ADD CONSTRAINT unique_resource_action "
+                "UNIQUE USING INDEX unique_resource_action"
+            )
+
+def downgrade():
+    """Drop query-shape indexes and the (resource, action) constraint"""
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        # Absent when upgrade skipped it
+        if postgresql:
+            op.execute("ALTER TABLE permissions DROP CONSTRAINT IF EXISTS unique_resource_action")
+        else:
+            op.drop_index('unique_resource_action', table_name='permissions', if_exists=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+{% endif %}
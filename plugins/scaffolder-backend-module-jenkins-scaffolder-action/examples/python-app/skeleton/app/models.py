@@ -2,20 +2,22 @@
 Database models.
 """
 {% if values.framework == "fastapi" -%}
-from sqlalchemy import Column, String, Boolean, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, String, Boolean, DateTime, Text, ForeignKey, Table, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
-import uuid
 
 from .database import Base
+from .ids import uuid7
 
 # Association table for many-to-many relationship between User and Role
 user_roles = Table(
     'user_roles',
     Base.metadata,
     Column('user_id', UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True),
-    Column('role_id', UUID(as_uuid=True), ForeignKey('roles.id'), primary_key=True)
+    Column('role_id', UUID(as_uuid=True), ForeignKey('roles.id'), primary_key=True),
+    # The primary key covers lookups by user_id; this covers role_id -> users
+    Index('ix_user_roles_role_id', 'role_id')
 )
 
 # Association table for many-to-many relationship between Role and Permission
@@ -23,7 +25,8 @@ role_permissions = Table(
     'role_permissions',
     Base.metadata,
     Column('role_id', UUID(as_uuid=True), ForeignKey('roles.id'), primary_key=True),
-    Column('permission_id', UUID(as_uuid=True), ForeignKey('permissions.id'), primary_key=True)
+    Column('permission_id', UUID(as_uuid=True), ForeignKey('permissions.id'), primary_key=True),
+    Index('ix_role_permissions_permission_id', 'permission_id')
 )
 
 
@@ -31,7 +34,7 @@ class User(Base):
     """User model."""
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     email = Column(String(255), unique=True, index=True, nullable=False)
     username = Column(String(100), unique=True, index=True, nullable=False)
     first_name = Column(String(100), nullable=False)
@@ -47,6 +50,9 @@ class User(Base):
     # Relationships
     roles = relationship("Role", secondary=user_roles, back_populates="users")
 
+    # Keyset pagination order
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -56,7 +62,7 @@ class Role(Base):
     """Role model for RBAC."""
     __tablename__ = "roles"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = Column(String(100), unique=True, nullable=False)
     description = Column(Text, nullable=True)
     is_active = Column(Boolean, default=True)
@@ -67,12 +73,15 @@ class Role(Base):
     users = relationship("User", secondary=user_roles, back_populates="roles")
     permissions = relationship("Permission", secondary=role_permissions, back_populates="roles")
 
+    # List order
+    __table_args__ = (Index("ix_roles_created_at_id", "created_at", "id"),)
+
 
 class Permission(Base):
     """Permission model for RBAC."""
     __tablename__ = "permissions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = Column(String(100), unique=True, nullable=False)
     description = Column(Text, nullable=True)
     resource = Column(String(100), nullable=False)  # e.g., 'user', 'order', 'product'
@@ -82,6 +91,11 @@ class Permission(Base):
     # Relationships
     roles = relationship("Role", secondary=role_permissions, back_populates="permissions")
 
+    __table_args__ = (
+        UniqueConstraint("resource", "action", name="unique_resource_action"),
+        Index("ix_permissions_created_at_id", "created_at", "id"),
+    )
+
 {%- elif values.framework == "django" -%}
 from django.contrib.auth.models import AbstractUser
 from django.db import models
@@ -103,6 +117,7 @@ class User(AbstractUser, BaseModel):
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [models.Index(fields=['created_at', 'id'], name='ix_users_created_at_id')]
 
     @property
     def full_name(self):
@@ -119,6 +134,7 @@ class Role(BaseModel):
         db_table = 'roles'
         verbose_name = 'Role'
         verbose_name_plural = 'Roles'
+        indexes = [models.Index(fields=['created_at', 'id'], name='ix_roles_created_at_id')]
 
     def __str__(self):
         return self.name
@@ -138,6 +154,7 @@ class Permission(models.Model):
         verbose_name = 'Permission'
         verbose_name_plural = 'Permissions'
         unique_together = ['resource', 'action']
+        indexes = [models.Index(fields=['created_at', 'id'], name='ix_permissions_created_at_id')]
 
     def __str__(self):
         return f"{self.resource}:{self.action}"
@@ -146,20 +163,23 @@ class Permission(models.Model):
 from flask_user import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
 from datetime import datetime
 
 from .database import db, BaseModel
+from .ids import uuid7
 
 # Association tables for many-to-many relationships
 user_roles = db.Table('user_roles',
     db.Column('user_id', UUID(as_uuid=True), db.ForeignKey('users.id'), primary_key=True),
-    db.Column('role_id', UUID(as_uuid=True), db.ForeignKey('roles.id'), primary_key=True)
+    db.Column('role_id', UUID(as_uuid=True), db.ForeignKey('roles.id'), primary_key=True),
+    # The primary key covers lookups by user_id; this covers role_id -> users
+    db.Index('ix_user_roles_role_id', 'role_id')
 )
 
 role_permissions = db.Table('role_permissions',
     db.Column('role_id', UUID(as_uuid=True), db.ForeignKey('roles.id'), primary_key=True),
-    db.Column('permission_id', UUID(as_uuid=True), db.ForeignKey('permissions.id'), primary_key=True)
+    db.Column('permission_id', UUID(as_uuid=True), db.ForeignKey('permissions.id'), primary_key=True),
+    db.Index('ix_role_permissions_permission_id', 'permission_id')
 )
 
 
@@ -179,6 +199,9 @@ class User(BaseModel, UserMixin):
     # Relationships
     roles = db.relationship('Role', secondary=user_roles, back_populates='users')
 
+    # Keyset pagination order
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
+
     def set_password(self, password):
         """Set password hash."""
         self.password_hash = generate_password_hash(password)
@@ -214,6 +237,9 @@ class Role(BaseModel):
     users = db.relationship('User', secondary=user_roles, back_populates='roles')
     permissions = db.relationship('Permission', secondary=role_permissions, back_populates='roles')
 
+    # List order
+    __table_args__ = (db.Index('ix_roles_created_at_id', 'created_at', 'id'),)
+
     def __repr__(self):
         return f'<Role {self.name}>'
 
@@ -222,7 +248,7 @@ class Permission(db.Model):
     """Permission model for RBAC."""
     __tablename__ = 'permissions'
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=True)
     resource = db.Column(db.String(100), nullable=False)  # e.g., 'user', 'order', 'product'
@@ -232,7 +258,10 @@ class Permission(db.Model):
     # Relationships
     roles = db.relationship('Role', secondary=role_permissions, back_populates='permissions')
 
-    __table_args__ = (db.UniqueConstraint('resource', 'action', name='unique_resource_action'),)
+    __table_args__ = (
+        db.UniqueConstraint('resource', 'action', name='unique_resource_action'),
+        db.Index('ix_permissions_created_at_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Permission {self.resource}:{self.action}>'
@@ -0,0 +1,30 @@
+{% if values.framework == "fastapi" -%}
+"""
+Keyset pagination cursors.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Tuple
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime, id: Any) -> str:
+    """Encode the ``(created_at, id)`` position of a row as an opaque token."""
+    raw = json.dumps([created_at.isoformat(), str(id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Decode a token from ``encode_cursor``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+{%- endif %}
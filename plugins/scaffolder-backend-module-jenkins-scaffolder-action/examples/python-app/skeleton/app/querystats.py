@@ -0,0 +1,263 @@
+"""
+Per-request SQL statistics and N+1 detection.
+
+Every statement a request executes is counted, timed and grouped by its
+shape (the SQL with literals, placeholders and IN lists normalized), so
+request logs and metrics show how much database work a request did and
+which statement it repeated.
+
+This module holds the only statement listener. Query budgets read the
+request's counts, and other modules such as the slow-query log register
+an ``on_statement`` hook rather than listening themselves.
+"""
+import collections
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Histogram
+{% if values.framework == "fastapi" -%}
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+
+from .config import settings
+from .database import async_engine, engine, replicas
+{%- elif values.framework == "django" -%}
+from django.conf import settings
+from django.db import connection
+{%- elif values.framework == "flask" -%}
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+{%- endif %}
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements executed per request', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time per request spent executing SQL', ['endpoint']
+)
+N_PLUS_ONE_DETECTED = Counter(
+    'db_n_plus_one_total', 'Requests that repeated one statement shape past the threshold', ['endpoint']
+)
+
+_PLACEHOLDERS = re.compile(r"\$\d+|%\(\w+\)s|%s")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:::\w+)?(?:\s*,\s*\?(?:::\w+)?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """``statement`` with every value replaced by ``?`` and IN lists collapsed."""
+    statement = _PLACEHOLDERS.sub("?", statement)
+    statement = _LITERALS.sub("?", statement)
+    statement = _IN_LISTS.sub("(?...)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def fingerprint(statement: str) -> str:
+    """Short stable identifier for the shape of ``statement``."""
+    return hashlib.sha1(normalize_sql(statement).encode()).hexdigest()[:12]
+
+
+class NPlusOneDetected(AssertionError):
+    """Raised in strict mode when a request repeats one statement too often."""
+
+
+class RequestQueries:
+    """Statements one request executed and the time they took."""
+
+    def __init__(self, endpoint: Optional[str] = None):
+        self.endpoint = endpoint
+        self.count = 0
+        self.seconds = 0.0
+        self._shapes: Dict[str, int] = collections.Counter()
+        self._examples: Dict[str, str] = {}
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        shape = fingerprint(statement)
+        self._shapes[shape] += 1
+        self._examples.setdefault(shape, statement)
+
+    def repeated(self, minimum: int = 2) -> List[Dict[str, Any]]:
+        """Shapes executed at least ``minimum`` times, most repeated first."""
+        return [
+            {"fingerprint": shape, "count": count, "sql": normalize_sql(self._examples[shape])[:200]}
+            for shape, count in self._shapes.most_common()
+            if count >= minimum
+        ]
+
+    def log_fields(self) -> Dict[str, Any]:
+        """Fields for the request log line."""
+        return {
+            "db_queries": self.count,
+            "db_time": round(self.seconds, 6),
+            "db_repeated": self.repeated()[:5],
+        }
+
+    def observe(self, endpoint: str, *, threshold: int, detect: bool, strict: bool) -> None:
+        """Record metrics and, when ``detect`` is on, flag N+1 patterns."""
+        REQUEST_DB_QUERIES.labels(endpoint=endpoint).observe(self.count)
+        REQUEST_DB_SECONDS.labels(endpoint=endpoint).observe(self.seconds)
+        if not detect:
+            return
+        suspects = self.repeated(threshold)
+        if not suspects:
+            return
+        N_PLUS_ONE_DETECTED.labels(endpoint=endpoint).inc()
+        worst = suspects[0]
+        message = f"{endpoint} ran one statement {worst['count']} times (N+1?): {worst['sql']}"
+        if strict:
+            raise NPlusOneDetected(message)
+        logger.warning(message)
+
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+# Called as hook(connection, statement, parameters, many, seconds)
+StatementHook = Callable[[Any, str, Any, bool, float], None]
+_statement_hooks: List[StatementHook] = []
+
+
+def current_queries() -> Optional[RequestQueries]:
+    """Statistics for the request being handled, if any."""
+    return _request_queries.get()
+
+
+def on_statement(hook: StatementHook) -> StatementHook:
+    """Call ``hook`` after every statement, inside a request or not."""
+    _statement_hooks.append(hook)
+    return hook
+
+
+def _finished(connection: Any, statement: str, parameters: Any, many: bool, seconds: float) -> None:
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.add(statement, seconds)
+    for hook in _statement_hooks:
+        hook(connection, statement, parameters, many, seconds)
+
+
+{% if values.framework == "fastapi" or values.framework == "flask" -%}
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        _finished(conn, statement, parameters, executemany, time.perf_counter() - started)
+{%- endif %}
+
+
+{% if values.framework == "fastapi" -%}
+@contextmanager
+def track_queries(endpoint: Optional[str] = None) -> Iterator[RequestQueries]:
+    """Collect statistics for statements run inside the block."""
+    queries = RequestQueries(endpoint)
+    token = _request_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _request_queries.reset(token)
+
+
+def observe(queries: RequestQueries, endpoint: str) -> None:
+    """Record ``queries`` for ``endpoint``; N+1 checks run in debug and tests."""
+    queries.observe(
+        endpoint,
+        threshold=settings.n_plus_one_threshold,
+        detect=settings.debug or settings.n_plus_one_raise,
+        strict=settings.n_plus_one_raise,
+    )
+
+
+for _engine in (engine, async_engine.sync_engine, *(replica.sync_engine for replica in replicas.engines)):
+    event.listen(_engine, "before_cursor_execute", _before_execute)
+    event.listen(_engine, "after_cursor_execute", _after_execute)
+
+{%- elif values.framework == "django" -%}
+class QueryStatsMiddleware:
+    """Collect statement statistics for each request.
+
+    Uses ``connection.execute_wrapper``; N+1 checks run when ``DEBUG``
+    or ``N_PLUS_ONE_RAISE`` is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Registers the slow-query log's hook before the first request
+        from . import slowqueries  # noqa: F401
+
+    def __call__(self, request):
+        queries = RequestQueries(f"{request.method} {request.path}")
+        # Read by LoggingMiddleware on the way out
+        request.queries = queries
+        token = _request_queries.set(queries)
+        try:
+            with connection.execute_wrapper(self._timed):
+                response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+
+        route = request.resolver_match.route if request.resolver_match else request.path
+        strict = getattr(settings, "N_PLUS_ONE_RAISE", False)
+        queries.observe(
+            route,
+            threshold=getattr(settings, "N_PLUS_ONE_THRESHOLD", 5),
+            detect=settings.DEBUG or strict,
+            strict=strict,
+        )
+        return response
+
+    @staticmethod
+    def _timed(execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        _finished(context["connection"], sql, params, many, time.perf_counter() - started)
+        return result
+
+{%- elif values.framework == "flask" -%}
+def init_query_stats(app) -> None:
+    """Collect statement statistics for each request to ``app``.
+
+    N+1 checks run when the app is in debug mode or ``N_PLUS_ONE_RAISE``
+    is set.
+    """
+    @app.before_request
+    def start_query_stats():
+        _request_queries.set(RequestQueries(f"{request.method} {request.path}"))
+
+    @app.after_request
+    def observe_query_stats(response):
+        queries = _request_queries.get()
+        if queries is not None:
+            strict = current_app.config.get("N_PLUS_ONE_RAISE", False)
+            queries.observe(
+                request.url_rule.rule if request.url_rule else request.path,
+                threshold=current_app.config.get("N_PLUS_ONE_THRESHOLD", 5),
+                detect=current_app.debug or strict,
+                strict=strict,
+            )
+        return response
+
+    @app.teardown_request
+    def stop_query_stats(exc):
+        _request_queries.set(None)
+
+
+# Flask-SQLAlchemy creates engines lazily, so listen on all of them
+event.listen(Engine, "before_cursor_execute", _before_execute)
+event.listen(Engine, "after_cursor_execute", _after_execute)
+{%- endif %}
@@ -0,0 +1,390 @@
+"""
+Rate limiting with Redis sliding windows and a local pre-limiter.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter
+from redis import RedisError
+
+from .cache import redis_client
+{% if values.framework == "fastapi" -%}
+from fastapi import HTTPException, Request, Response, status
+
+from .auth import verify_token
+from .config import settings
+{%- elif values.framework == "django" -%}
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.throttling import BaseThrottle
+{%- elif values.framework == "flask" -%}
+from functools import wraps
+from flask import after_this_request, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+{%- endif %}
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+RATE_LIMIT_DECISIONS = Counter(
+    'rate_limit_decisions_total', 'Rate limit decisions', ['scope', 'decision', 'source']
+)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Sliding window counter: the previous window's count is weighted by how
+# much of it still overlaps the trailing window.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local estimated = previous * (window - elapsed) / window + current
+if estimated + 1 > limit then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, current, previous}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """A limit of ``limit`` requests per ``window`` seconds.
+
+    ``scope`` selects the key: ``ip`` per client address, ``user`` per
+    authenticated user (falling back to the address), ``route`` shared
+    by every caller of a route.
+    """
+    scope: str
+    limit: int
+    window: int
+
+    @classmethod
+    def parse(cls, scope: str, rate: str) -> "RateLimitRule":
+        """Build a rule from a rate such as ``100/minute``."""
+        count, period = rate.split("/")
+        return cls(scope=scope, limit=int(count), window=PERIODS[period.strip().rstrip("s")])
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check."""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class LocalPreLimiter:
+    """Per-process token buckets plus remembered Redis denials.
+
+    A bucket holds at most one full window of requests, so it only ever
+    rejects callers the shared limit would reject too. Keys that Redis
+    has denied are blocked locally until their retry time.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._blocked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def blocked_for(self, key: str, now: float) -> float:
+        until = self._blocked.get(key, 0.0)
+        if until <= now:
+            self._blocked.pop(key, None)
+            return 0.0
+        return until - now
+
+    def block(self, key: str, until: float) -> None:
+        with self._lock:
+            if len(self._blocked) >= self.maxsize:
+                self._blocked.clear()
+            self._blocked[key] = until
+
+    def take(self, key: str, rule: RateLimitRule, now: float) -> Tuple[bool, float]:
+        """Take a token; return whether it was available and the tokens left."""
+        rate = rule.limit / rule.window
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(rule.limit), now))
+            tokens = min(float(rule.limit), tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+
+class RateLimiter:
+    """Evaluates rate limit rules against Redis with a local pre-limiter.
+
+    When Redis is not configured or unreachable, the local buckets are
+    the only limit applied. After a Redis error it is not tried again for
+    ``retry_interval`` seconds.
+    """
+
+    def __init__(self, redis_url: Optional[str], local_maxsize: int = 10000, retry_interval: float = 5.0):
+        self._redis = redis_client(redis_url)
+        self._script = self._redis.register_script(SLIDING_WINDOW_SCRIPT) if self._redis else None
+        self._local = LocalPreLimiter(local_maxsize)
+        self.retry_interval = retry_interval
+        self._redis_down_until = 0.0
+
+    @staticmethod
+    def _retry_after(rule: RateLimitRule, elapsed: float, current: int, previous: int) -> float:
+        """Seconds until the sliding estimate leaves room for one more request."""
+        window = rule.window
+        if current < rule.limit and previous:
+            return max((window - elapsed) - (rule.limit - 1 - current) * window / previous, 0.0)
+        return (window - elapsed) + window * max(1 - (rule.limit - 1) / max(current, 1), 0.0)
+
+    def hit(self, key: str, rule: RateLimitRule) -> RateLimitResult:
+        """Count one request against ``key`` under ``rule``."""
+        now = time.time()
+        window_start = int(now // rule.window) * rule.window
+        elapsed = now - window_start
+        reset = math.ceil(rule.window - elapsed)
+
+        blocked = self._local.blocked_for(key, now)
+        if blocked:
+            RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='deny', source='local').inc()
+            return RateLimitResult(False, rule.limit, 0, reset, math.ceil(blocked))
+
+        allowed, tokens = self._local.take(key, rule, now)
+        if not allowed:
+            RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='deny', source='local').inc()
+            retry_after = math.ceil((1 - tokens) * rule.window / rule.limit)
+            return RateLimitResult(False, rule.limit, 0, reset, retry_after)
+
+        if self._script is None or now < self._redis_down_until:
+            RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='allow', source='local').inc()
+            return RateLimitResult(True, rule.limit, int(tokens), reset)
+
+        # Hash tags keep both windows of a key in the same cluster slot
+        tagged = "ratelimit:{" + key + "}"
+        keys = [f"{tagged}:{window_start}", f"{tagged}:{window_start - rule.window}"]
+        try:
+            allowed, current, previous = self._script(
+                keys=keys, args=[rule.limit, rule.window * 1000, int(elapsed * 1000)]
+            )
+        except RedisError as e:
+            self._redis_down_until = now + self.retry_interval
+            logger.warning(f"Rate limits fall back to local buckets for {self.retry_interval}s: {e}")
+            RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='allow', source='local').inc()
+            return RateLimitResult(True, rule.limit, int(tokens), reset)
+
+        estimated = previous * (rule.window - elapsed) / rule.window + current
+        if not allowed:
+            retry_after = self._retry_after(rule, elapsed, current, previous)
+            self._local.block(key, now + retry_after)
+            RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='deny', source='redis').inc()
+            return RateLimitResult(False, rule.limit, 0, reset, max(math.ceil(retry_after), 1))
+
+        RATE_LIMIT_DECISIONS.labels(scope=rule.scope, decision='allow', source='redis').inc()
+        return RateLimitResult(True, rule.limit, max(rule.limit - math.ceil(estimated), 0), reset)
+
+    def check(self, hits: Iterable[Tuple[str, RateLimitRule]]) -> Optional[RateLimitResult]:
+        """Apply several rules; return the first denial or the tightest allowance."""
+        tightest = None
+        for key, rule in hits:
+            result = self.hit(key, rule)
+            if not result.allowed:
+                return result
+            if tightest is None or result.remaining < tightest.remaining:
+                tightest = result
+        return tightest
+
+
+def client_address(remote_addr: Optional[str], forwarded_for: Iterable[str], trusted_proxies: int) -> str:
+    """The address rate limits are keyed on.
+
+    Clients can send any ``X-Forwarded-For`` they like, so it is only
+    read behind ``trusted_proxies`` proxies, each of which appends the
+    address it got the request from. The right-most hop the closest of
+    them did not add is the client.
+    """
+    hops = [hop.strip() for value in forwarded_for for hop in value.split(",") if hop.strip()]
+    if trusted_proxies <= 0 or len(hops) < trusted_proxies:
+        return remote_addr or "unknown"
+    return hops[-trusted_proxies]
+
+
+def rate_limit_keys(
+    rules: Iterable[RateLimitRule], route: str, client_ip: str, user: Optional[str]
+) -> List[Tuple[str, RateLimitRule]]:
+    """Build the Redis key for each rule.
+
+    Only ``route`` rules are counted per route; ``ip`` and ``user`` rules
+    share one budget across every route that applies the same rate.
+    """
+    hits = []
+    for rule in rules:
+        if rule.scope == "route":
+            identity = route
+        elif rule.scope == "user" and user:
+            identity = f"user:{user}"
+        else:
+            identity = f"ip:{client_ip}"
+        hits.append((f"{rule.scope}:{identity}:{rule.limit}/{rule.window}", rule))
+    return hits
+
+{% if values.framework == "fastapi" -%}
+limiter = RateLimiter(settings.rate_limit_redis_url)
+
+
+def default_rules() -> List[RateLimitRule]:
+    """Rules applied to every API route."""
+    return [
+        RateLimitRule.parse("ip", settings.rate_limit_ip),
+        RateLimitRule.parse("user", settings.rate_limit_user),
+    ]
+
+
+def rate_limit(*rules: RateLimitRule):
+    """Dependency that enforces ``rules`` and sets RateLimit-* headers."""
+    def limiter_dependency(request: Request, response: Response):
+        if not settings.rate_limit_enabled:
+            return
+
+        route = request.scope.get("route")
+        user = None
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token_data = verify_token(authorization[7:])
+            user = token_data.email if token_data else None
+
+        hits = rate_limit_keys(
+            rules,
+            route=route.path if route else request.url.path,
+            client_ip=request.client.host if request.client else "unknown",
+            user=user,
+        )
+        result = limiter.check(hits)
+        if result is None:
+            return
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers=result.headers()
+            )
+        response.headers.update(result.headers())
+
+    return limiter_dependency
+
+{%- elif values.framework == "django" -%}
+limiter = RateLimiter(getattr(settings, "RATE_LIMIT_REDIS_URL", None))
+
+
+def _client_ip(request) -> str:
+    return client_address(
+        request.META.get('REMOTE_ADDR'),
+        [request.META.get('HTTP_X_FORWARDED_FOR', '')],
+        getattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 0),
+    )
+
+
+class RateLimitThrottle(BaseThrottle):
+    """DRF throttle applying ``rates``, a mapping of scope to rate.
+
+    Defaults to the ``RATE_LIMITS`` setting, e.g. ``{"ip": "1000/minute"}``.
+    """
+    rates: Optional[Dict[str, str]] = None
+
+    def allow_request(self, request, view):
+        rates = self.rates if self.rates is not None else getattr(settings, "RATE_LIMITS", {})
+        rules = [RateLimitRule.parse(scope, rate) for scope, rate in rates.items()]
+
+        user = request.user.pk if request.user and request.user.is_authenticated else None
+        route = request.resolver_match.route if request.resolver_match else request.path
+        self.result = limiter.check(rate_limit_keys(rules, route, _client_ip(request), user))
+
+        # Read by RateLimitHeadersMiddleware on the way out
+        request._request.rate_limit = self.result
+        return self.result is None or self.result.allowed
+
+    def wait(self):
+        return self.result.retry_after if self.result else None
+
+
+class LoginRateThrottle(RateLimitThrottle):
+    """Stricter per-IP limit for credential endpoints."""
+    rates = {"ip": getattr(settings, "RATE_LIMIT_LOGIN", "10/minute")}
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    """Add RateLimit-* headers recorded by RateLimitThrottle."""
+
+    def process_response(self, request, response):
+        result = getattr(request, "rate_limit", None)
+        if result is not None:
+            for header, value in result.headers().items():
+                response[header] = value
+        return response
+
+{%- elif values.framework == "flask" -%}
+def get_limiter() -> RateLimiter:
+    """Return the app's rate limiter, creating it on first use."""
+    if "rate_limiter" not in current_app.extensions:
+        current_app.extensions["rate_limiter"] = RateLimiter(current_app.config.get("RATE_LIMIT_REDIS_URL"))
+    return current_app.extensions["rate_limiter"]
+
+
+def _current_user() -> Optional[str]:
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def limit(*rules: RateLimitRule):
+    """Decorator enforcing ``rules`` and setting RateLimit-* headers."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get("RATE_LIMIT_ENABLED", True):
+                return f(*args, **kwargs)
+
+            client_ip = client_address(
+                request.remote_addr,
+                request.headers.getlist("X-Forwarded-For"),
+                current_app.config.get("RATE_LIMIT_TRUSTED_PROXIES", 0),
+            )
+            route = request.url_rule.rule if request.url_rule else request.path
+            result = get_limiter().check(rate_limit_keys(rules, route, client_ip, _current_user()))
+            if result is None:
+                return f(*args, **kwargs)
+            if not result.allowed:
+                return jsonify({'message': 'Rate limit exceeded'}), 429, result.headers()
+
+            @after_this_request
+            def add_headers(response):
+                response.headers.update(result.headers())
+                return response
+
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+{%- endif %}
@@ -1,13 +1,15 @@
 """
 Pydantic schemas for request/response validation.
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Generic, TypeVar
 from datetime import datetime
 import uuid
 
 {% if values.framework == "fastapi" -%}
 from pydantic import BaseModel, EmailStr, Field, validator
 
+from .config import settings
+
 # Base schemas
 class BaseSchema(BaseModel):
     """Base schema with common configuration."""
@@ -85,6 +87,7 @@ class TokenData(BaseSchema):
     """Token data schema."""
     email: Optional[str] = None
     scopes: List[str] = []
+    permissions_version: Optional[int] = None
 
 
 # Role schemas
@@ -142,13 +145,93 @@ class PaginationParams(BaseSchema):
     size: int = Field(20, ge=1, le=100)
 
 
-class PaginatedResponse(BaseSchema):
-    """Paginated response schema."""
-    items: List[Any]
+ItemT = TypeVar("ItemT")
+
+
+class PaginatedResponse(BaseSchema, Generic[ItemT]):
+    """Paginated response schema.
+    
+    ``total_strategy`` says how ``total`` was produced: ``exact``,
+    ``estimate`` (planner statistics) or ``cached`` (possibly stale).
+    """
+    items: List[ItemT]
     total: int
     page: int
     size: int
     pages: int
+    total_strategy: str = "exact"
+
+
+class CursorParams(BaseSchema):
+    """Keyset pagination parameters."""
+    cursor: Optional[str] = None
+    size: int = Field(20, ge=1, le=100)
+
+
+class CursorPaginatedResponse(BaseSchema, Generic[ItemT]):
+    """Keyset paginated response schema.
+    
+    ``next_cursor`` is None on the last page.
+    """
+    items: List[ItemT]
+    size: int
+    next_cursor: Optional[str] = None
+
+
+# Batch schemas
+class BatchUserCreate(BaseSchema):
+    """Users to create in one transaction."""
+    items: List[UserCreate] = Field(..., min_length=1, max_length=settings.batch_max_items)
+
+
+class BatchUserUpdateItem(UserUpdate):
+    """A user update addressed by ID."""
+    id: uuid.UUID
+
+
+class BatchUserUpdate(BaseSchema):
+    """User updates to apply in one transaction."""
+    items: List[BatchUserUpdateItem] = Field(..., min_length=1, max_length=settings.batch_max_items)
+
+
+class BatchUserDelete(BaseSchema):
+    """User IDs to delete in one transaction."""
+    ids: List[uuid.UUID] = Field(..., min_length=1, max_length=settings.batch_max_items)
+
+
+class BatchItemResult(BaseSchema):
+    """Outcome for one item of a batch, in request order.
+    
+    ``status`` is ``created``, ``updated`` or ``deleted`` on success,
+    otherwise ``conflict`` or ``not_found`` with a ``detail``.
+    """
+    index: int
+    status: str
+    id: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+
+class BatchResponse(BaseSchema):
+    """Per-item results of a batch request."""
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+class SlowQuery(BaseSchema):
+    """One statement from the slow-query log."""
+    at: datetime
+    duration_ms: float
+    sql: str
+    parameters: Any = None
+    endpoint: Optional[str] = None
+    plan: Any = None
+
+
+class SlowQueryLogResponse(BaseSchema):
+    """Most recent slow statements, newest first."""
+    threshold_ms: float
+    items: List[SlowQuery]
 
 
 class HealthCheck(BaseSchema):
@@ -0,0 +1,67 @@
+"""
+Ranked user search.
+
+On PostgreSQL a search matches one lowercased document built from email,
+username, first and last name through two GIN indexes (migration 004):
+a ``tsvector`` index for whole words and a ``pg_trgm`` index for
+substrings typed so far. Other databases, such as SQLite in local
+development, fall back to an unindexed LIKE over the same document.
+"""
+{% if values.framework == "fastapi" or values.framework == "flask" -%}
+from typing import Any, Tuple
+
+from sqlalchemy import func, literal_column, or_
+{%- elif values.framework == "django" -%}
+from django.db import connection
+from django.db.models import BooleanField, FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+{%- endif %}
+
+# Must match the index expressions in migration 004 exactly
+SEARCH_CONFIG = "simple"
+SEARCH_DOCUMENT = "lower(email || ' ' || username || ' ' || first_name || ' ' || last_name)"
+SEARCH_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', {SEARCH_DOCUMENT})"
+
+
+def like_pattern(query: str) -> str:
+    """A LIKE pattern matching ``query`` anywhere, with its wildcards escaped."""
+    escaped = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "%" + escaped + "%"
+
+
+{% if values.framework == "fastapi" or values.framework == "flask" -%}
+def search_clauses(query: str, dialect: str) -> Tuple[Any, Any]:
+    """``(where, rank)`` clauses for users matching ``query``; higher ranks first."""
+    document = literal_column(SEARCH_DOCUMENT)
+    pattern = like_pattern(query)
+    if dialect != "postgresql":
+        # Earlier matches rank higher
+        return document.like(pattern, escape="\\"), 1.0 / func.instr(document, query.lower())
+
+    vector = literal_column(SEARCH_VECTOR)
+    tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), query)
+    where = or_(vector.op("@@")(tsquery), document.like(pattern, escape="\\"))
+    rank = func.ts_rank_cd(vector, tsquery) + func.similarity(document, query.lower())
+    return where, rank
+{%- elif values.framework == "django" -%}
+def search_users(queryset: QuerySet, query: str) -> QuerySet:
+    """Filter ``queryset`` to users matching ``query``, best matches first."""
+    pattern = like_pattern(query)
+    if connection.vendor == "postgresql":
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        where = RawSQL(
+            f"{SEARCH_VECTOR} @@ {tsquery} OR {SEARCH_DOCUMENT} LIKE %s ESCAPE '\\'",
+            [query, pattern],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"ts_rank_cd({SEARCH_VECTOR}, {tsquery}) + similarity({SEARCH_DOCUMENT}, %s)",
+            [query, query.lower()],
+            output_field=FloatField(),
+        )
+    else:
+        # Earlier matches rank higher
+        where = RawSQL(f"{SEARCH_DOCUMENT} LIKE %s ESCAPE '\\'", [pattern], output_field=BooleanField())
+        rank = RawSQL(f"1.0 / instr({SEARCH_DOCUMENT}, %s)", [query.lower()], output_field=FloatField())
+    return queryset.filter(where).annotate(search_rank=rank).order_by("-search_rank", "created_at", "id")
+{%- endif %}
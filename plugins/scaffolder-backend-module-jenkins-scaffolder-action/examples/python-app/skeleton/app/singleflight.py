@@ -0,0 +1,235 @@
+{% if values.framework == "fastapi" -%}
+"""
+Single-flight loads and cache-stampede protection.
+
+Callers that miss the same key share one load. Within a process they
+await the first caller's load; across workers a short Redis lease lets
+one worker load while the others wait for its result to reach the shared
+cache tier.
+
+Entries are refreshed before they run out, so a hot key never goes cold
+for everyone at once:
+
+- past ``fresh`` seconds an entry is served stale while one caller
+  reloads it in the background;
+- slightly before that, a caller may refresh it early at random, with
+  odds that grow as expiry nears and with how long the load takes
+  (probabilistic early expiration), so refreshes of a hot key spread
+  out rather than landing together.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from prometheus_client import Counter
+from redis import RedisError
+
+from .cache import TwoTierCache, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+SINGLE_FLIGHT_SHARED = Counter(
+    'single_flight_shared_total', "Callers served by another caller's load", ['scope']
+)
+CACHE_REFRESHES = Counter('cache_refreshes_total', 'Cache entries refreshed before expiry', ['reason'])
+
+# How often a worker without the lease looks for the holder's result
+LEASE_POLL_INTERVAL = 0.05
+
+# Delete a lease only while the caller still holds it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+Load = Callable[[], Awaitable[Any]]
+
+
+class SingleFlight:
+    """At most one load per key in flight in this process.
+
+    A caller of :meth:`do` whose key is already loading awaits that load
+    instead of starting another. Loads run in their own task, so one
+    caller being cancelled does not cancel the load for the rest.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    def _running(self, key: str) -> Optional[asyncio.Task]:
+        task = self._flights.get(key)
+        # A task left behind by another event loop cannot be awaited here
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+        return None
+
+    def _start(self, key: str, load: Load) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(load())
+        self._flights[key] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if self._flights.get(key) is done:
+                del self._flights[key]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def do(self, key: str, load: Load) -> Any:
+        """Run ``load``, or wait for the one already running for ``key``."""
+        task = self._running(key)
+        if task is None:
+            task = self._start(key, load)
+        else:
+            SINGLE_FLIGHT_SHARED.labels(scope="local").inc()
+        return await asyncio.shield(task)
+
+    def start(self, key: str, load: Load) -> None:
+        """Run ``load`` in the background unless ``key`` is already loading."""
+        if self._running(key) is None:
+            # An empty context: the load belongs to no request's query budget
+            contextvars.Context().run(self._start, key, load)
+
+
+class Lease:
+    """Short Redis leases, so one worker at a time loads a key.
+
+    Without Redis, or while it is unreachable, every caller gets the
+    lease and only in-process coalescing applies.
+    """
+
+    def __init__(self, redis_url: Optional[str], ttl: float):
+        self.ttl = ttl
+        self._redis = async_redis_client(redis_url)
+        self._release = self._redis.register_script(RELEASE_SCRIPT) if self._redis else None
+
+    def _key(self, key: str) -> str:
+        return f"lease:{key}"
+
+    async def acquire(self, key: str) -> Optional[str]:
+        """A token if the caller now holds the lease on ``key``, else None."""
+        token = uuid.uuid4().hex
+        if self._redis is None:
+            return token
+        try:
+            acquired = await self._redis.set(self._key(key), token, nx=True, px=int(self.ttl * 1000))
+        except RedisError as e:
+            logger.warning(f"Lease for {key} failed open: {e}")
+            return token
+        return token if acquired else None
+
+    async def release(self, key: str, token: str) -> None:
+        """Give up a lease; a lease that already expired is left alone."""
+        if self._release is None:
+            return
+        try:
+            await self._release(keys=[self._key(key)], args=[token])
+        except RedisError as e:
+            logger.warning(f"Lease release for {key} failed: {e}")
+
+
+class SingleFlightCache:
+    """Reads through a ``TwoTierCache``, loading each key once at a time.
+
+    Entries live ``fresh + stale`` seconds. ``beta`` scales how early a
+    fresh entry may be refreshed; zero turns early refreshes off.
+    """
+
+    def __init__(self, cache: TwoTierCache, *, fresh: float, stale: float, beta: float, lease: Lease):
+        self.cache = cache
+        self.fresh = fresh
+        self.stale = stale
+        self.beta = beta
+        self.lease = lease
+        self.flights = SingleFlight()
+
+    def _refresh_reason(self, entry: Dict[str, Any], now: float) -> Optional[str]:
+        """Why ``entry`` should be refreshed now, or None while it is fresh."""
+        if now >= entry["fresh_until"]:
+            return "stale"
+        # -log(U) is exponential: usually a small head start, scaled by the load time
+        head_start = -entry["delta"] * self.beta * math.log(1.0 - random.random())
+        if now + head_start >= entry["fresh_until"]:
+            return "early"
+        return None
+
+    def _entry(self, value: Any, delta: float) -> Dict[str, Any]:
+        return {"value": value, "fresh_until": time.time() + self.fresh, "delta": delta}
+
+    async def _store(self, key: str, load: Load) -> Any:
+        started = time.monotonic()
+        value = await load()
+        if value is None:
+            return None
+        entry = self._entry(value, time.monotonic() - started)
+        return (await self.cache.set_async(key, entry, ttl=self.fresh + self.stale))["value"]
+
+    async def _load(self, key: str, load: Load) -> Any:
+        token = await self.lease.acquire(key)
+        if token is None:
+            # Another worker is loading: wait for its result, then load anyway
+            deadline = time.monotonic() + self.lease.ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LEASE_POLL_INTERVAL)
+                entry = await self.cache.get_async(key)
+                if entry is not None:
+                    SINGLE_FLIGHT_SHARED.labels(scope="remote").inc()
+                    return entry["value"]
+        try:
+            return await self._store(key, load)
+        finally:
+            if token is not None:
+                await self.lease.release(key, token)
+
+    async def _refresh(self, key: str, load: Load, reason: str) -> None:
+        token = await self.lease.acquire(key)
+        if token is None:
+            return
+        try:
+            await self._store(key, load)
+            CACHE_REFRESHES.labels(reason=reason).inc()
+        except Exception as exc:
+            # The entry stays in place for the next caller to retry
+            logger.warning(f"Refreshing {key} failed: {exc}")
+        finally:
+            await self.lease.release(key, token)
+
+    async def get(self, key: str, load: Load) -> Any:
+        """The value for ``key``, from the cache or a load shared with other callers.
+
+        ``load`` returns a JSON-serializable value, or None for nothing to
+        cache. It may run in the background, so it must not use the
+        caller's session.
+        """
+        entry = await self.cache.get_async(key)
+        if entry is None:
+            return await self.flights.do(key, lambda: self._load(key, load))
+
+        reason = self._refresh_reason(entry, time.time())
+        if reason is not None:
+            self.flights.start(key, lambda: self._refresh(key, load, reason))
+        return entry["value"]
+
+    def get_sync(self, key: str, load: Callable[[], Any]) -> Any:
+        """Blocking read-through for sync callers.
+
+        Shares entries with :meth:`get`, but loads in the caller and
+        treats stale entries as misses.
+        """
+        entry = self.cache.get(key)
+        if entry is not None and time.time() < entry["fresh_until"]:
+            return entry["value"]
+        started = time.monotonic()
+        value = load()
+        if value is None:
+            return None
+        entry = self._entry(value, time.monotonic() - started)
+        return self.cache.set(key, entry, ttl=self.fresh + self.stale)["value"]
+{%- endif %}
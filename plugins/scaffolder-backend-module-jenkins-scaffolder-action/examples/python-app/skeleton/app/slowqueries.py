@@ -0,0 +1,192 @@
+"""
+Slow-query log with captured plans.
+
+Statements slower than the slow-query threshold are written to the
+structured log and kept in a bounded ring buffer, readable from the
+admin API. Each record has the normalized SQL, the types of its bound
+parameters, the endpoint that ran it and the planner's estimated plan
+(``EXPLAIN (ANALYZE off, FORMAT JSON)`` on PostgreSQL), so a slow query
+can be diagnosed without reproducing it.
+"""
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+import structlog
+from prometheus_client import Counter
+
+from .querystats import current_queries, normalize_sql, on_statement
+{% if values.framework == "fastapi" -%}
+from .config import settings
+{%- elif values.framework == "django" -%}
+from django.conf import settings
+{%- elif values.framework == "flask" -%}
+from flask import current_app, has_app_context
+{%- endif %}
+
+logger = structlog.get_logger()
+
+# Prometheus metrics
+SLOW_QUERIES = Counter('db_slow_queries_total', 'Statements slower than the slow-query threshold')
+
+# Estimated plans only: the statement is never run a second time
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN (ANALYZE off, FORMAT JSON) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# Dialects where a failed statement aborts the rest of its transaction
+ABORTING_DIALECTS = ("postgresql",)
+
+
+def parameter_shape(parameters: Any, many: bool = False) -> Any:
+    """The types of bound parameters, without their values."""
+    if many:
+        rows = list(parameters)
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def explain(
+    dbapi_connection: Any, dialect: str, statement: str, parameters: Any, in_transaction: bool = True
+) -> Any:
+    """The estimated plan for ``statement``, or None where unsupported.
+
+    Runs on its own DBAPI cursor so the caller's result set is untouched,
+    inside a savepoint where a failure would abort the caller's open
+    transaction. Outside one (``in_transaction`` false, as on an
+    autocommit connection) there is nothing to abort, and a savepoint
+    would fail.
+    """
+    prefix = EXPLAIN_PREFIXES.get(dialect)
+    if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    savepoint = in_transaction and dialect in ABORTING_DIALECTS
+    cursor = dbapi_connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        finally:
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    except Exception as exc:
+        logger.warning("slow_query_explain_failed", error=str(exc))
+        return None
+    finally:
+        cursor.close()
+    if dialect == "postgresql":
+        plan = rows[0][0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    return [row[-1] for row in rows]
+
+
+class SlowQueryLog:
+    """The most recent statements slower than ``threshold_ms``.
+
+    A threshold of zero turns the log off.
+    """
+
+    def __init__(self, threshold_ms: float, size: int, explain: bool = True):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def is_slow(self, seconds: float) -> bool:
+        return 0 < self.threshold <= seconds
+
+    def record(
+        self, statement: str, parameters: Any, seconds: float, *, many: bool = False, plan: Any = None
+    ) -> Dict[str, Any]:
+        """Keep and log one slow statement."""
+        queries = current_queries()
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(seconds * 1000, 3),
+            "sql": normalize_sql(statement),
+            "parameters": parameter_shape(parameters, many),
+            "endpoint": queries.endpoint if queries is not None else None,
+            "plan": plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        SLOW_QUERIES.inc()
+        logger.warning("slow_query", **entry)
+        return entry
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recorded statements, newest first."""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit is not None else entries
+
+
+{% if values.framework == "fastapi" or values.framework == "flask" -%}
+@on_statement
+def _record_if_slow(conn, statement, parameters, many, seconds):
+    log = _log()
+    if log is None or not log.is_slow(seconds):
+        return
+    plan = None
+    if log.explain and not many:
+        plan = explain(conn.connection, conn.dialect.name, statement, parameters)
+    log.record(statement, parameters, seconds, many=many, plan=plan)
+{%- endif %}
+
+
+{% if values.framework == "fastapi" -%}
+slow_queries = SlowQueryLog(
+    settings.slow_query_ms, settings.slow_query_log_size, explain=settings.slow_query_explain
+)
+
+
+def _log() -> Optional[SlowQueryLog]:
+    return slow_queries
+
+{%- elif values.framework == "django" -%}
+slow_queries = SlowQueryLog(
+    getattr(settings, "SLOW_QUERY_MS", 200),
+    getattr(settings, "SLOW_QUERY_LOG_SIZE", 100),
+    explain=getattr(settings, "SLOW_QUERY_EXPLAIN", True),
+)
+
+
+# Statements are timed by app.querystats.QueryStatsMiddleware
+@on_statement
+def _record_if_slow(db, sql, params, many, seconds):
+    if not slow_queries.is_slow(seconds):
+        return
+    plan = None
+    if slow_queries.explain and not many:
+        # Without ATOMIC_REQUESTS, statements run in autocommit
+        plan = explain(db.connection, db.vendor, sql, params, in_transaction=not db.get_autocommit())
+    slow_queries.record(sql, params, seconds, many=many, plan=plan)
+
+{%- elif values.framework == "flask" -%}
+def init_slow_query_log(app) -> None:
+    """Keep a slow-query log for ``app`` from its ``SLOW_QUERY_*`` settings."""
+    app.extensions["slow_queries"] = SlowQueryLog(
+        app.config.get("SLOW_QUERY_MS", 200),
+        app.config.get("SLOW_QUERY_LOG_SIZE", 100),
+        explain=app.config.get("SLOW_QUERY_EXPLAIN", True),
+    )
+
+
+def _log() -> Optional[SlowQueryLog]:
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("slow_queries")
+{%- endif %}
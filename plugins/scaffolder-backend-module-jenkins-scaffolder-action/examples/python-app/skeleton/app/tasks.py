@@ -6,10 +6,11 @@ import time
 from typing import Dict, Any, List
 from celery import shared_task
 {% if values.framework == 'fastapi' -%}
+from datetime import datetime, timedelta
 from app.celery_app import celery_app
 from app.database import SessionLocal
+from app.crud import UserCRUD
 from app.models import User
-from app.crud import UserService
 {% elif values.framework == 'django' -%}
 from app.celery_app import celery_app
 from django.contrib.auth import get_user_model
@@ -17,6 +18,8 @@ from django.core.mail import send_mail
 from django.conf import settings
 User = get_user_model()
 {% elif values.framework == 'flask' -%}
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
 from app.celery_app import celery_app
 from app.models import User, db
 from app.crud import UserService
@@ -26,12 +29,11 @@ logger = logging.getLogger(__name__)
 
 {% if values.framework == 'fastapi' -%}
 @celery_app.task(bind=True)
-def send_welcome_email(self, user_id: int):
+def send_welcome_email(self, user_id: str):
     """Send welcome email to new user"""
     try:
         db = SessionLocal()
-        user_service = UserService(db)
-        user = user_service.get_user(user_id)
+        user = UserCRUD().get(db, id=user_id)
         
         if not user:
             logger.error(f"User with ID {user_id} not found")
@@ -59,12 +61,12 @@ def generate_user_report():
     """Generate user statistics report"""
     try:
         db = SessionLocal()
-        user_service = UserService(db)
+        user_crud = UserCRUD()
         
-        users = user_service.get_users()
-        total_users = len(users)
-        active_users = len([u for u in users if u.is_active])
-        admin_users = len([u for u in users if u.is_admin])
+        count = user_crud.count_statement()
+        total_users = db.scalar(count)
+        active_users = db.scalar(count.where(User.is_active.is_(True)))
+        admin_users = db.scalar(count.where(User.is_superuser.is_(True)))
         
         report = {
             "total_users": total_users,
@@ -88,10 +90,10 @@ def cleanup_inactive_users(self, days_inactive: int = 30):
     """Cleanup users inactive for specified days"""
     try:
         db = SessionLocal()
-        user_service = UserService(db)
         
-        # This is a simulation - in real app, you'd check last_login dates
-        inactive_users = [u for u in user_service.get_users() if not u.is_active]
+        # last_login is written behind by app.activity, at most one flush interval late
+        cutoff_date = datetime.utcnow() - timedelta(days=days_inactive)
+        inactive_users = db.execute(UserCRUD().inactive_statement(cutoff_date)).scalars().all()
         
         cleanup_count = 0
         for user in inactive_users:
@@ -248,7 +250,15 @@ def generate_user_report():
 def cleanup_inactive_users(self, days_inactive: int = 30):
     """Cleanup users inactive for specified days"""
     try:
-        inactive_users = User.query.filter_by(is_active=False).all()
+        cutoff_date = datetime.utcnow() - timedelta(days=days_inactive)
+        # Users who never logged in count as inactive from when they signed up
+        inactive_users = User.query.filter(
+            User.is_active.is_(False),
+            or_(
+                User.last_login < cutoff_date,
+                and_(User.last_login.is_(None), User.created_at < cutoff_date),
+            ),
+        ).all()
         
         cleanup_count = 0
         for user in inactive_users:
@@ -0,0 +1,278 @@
+{% if values.framework == "fastapi" -%}
+"""
+Version counters shared across workers.
+
+Besides named counters, every table has one (``table:<name>``) that is
+bumped whenever a session commits a write to it.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from redis import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .cache import redis_client
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VersionCounter:
+    """Monotonic counters, one per name, stored in Redis.
+
+    Reads are served from a local copy for ``ttl`` seconds, so a version
+    check costs a Redis round trip at most once per name per interval.
+    A counter never goes backwards in this process. Without Redis, or
+    while it is unreachable, bumps only reach this process; such a name
+    is not :meth:`shared` until :meth:`replay` moves the shared counter
+    on for the bumps it missed, which the next read that reaches Redis
+    does. A name whose last read failed is not :meth:`synced`, and so not
+    shared either, until a read gets through again.
+
+    Counters start from the current time in microseconds rather than
+    from 0. That is the epoch of the Redis that holds them: after a flush
+    or a restart that loses them, they start again above every version
+    handed out before, unless those saw more than a million bumps a
+    second, so no old version becomes current again.
+    """
+
+    def __init__(self, redis_url: Optional[str], ttl: float = 1.0):
+        self.ttl = ttl
+        self._redis = redis_client(redis_url)
+        self._local: Dict[str, Tuple[int, float]] = {}
+        # Names bumped while Redis was unreachable
+        self._unshared: Set[str] = set()
+        # Names whose last read from Redis failed
+        self._unsynced: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _key(self, name: str) -> str:
+        return f"version:{name}"
+
+    @staticmethod
+    def _epoch() -> int:
+        return time.time_ns() // 1000
+
+    def _keep(self, name: str, value: int) -> int:
+        """Store ``value`` unless the local copy is newer; return the one kept."""
+        value = max(value, self._local.get(name, (0, 0.0))[0])
+        self._local[name] = (value, time.monotonic())
+        return value
+
+    def _read(self, name: str) -> int:
+        """Read ``name`` from Redis, starting it at the epoch if Redis lost it."""
+        key = self._key(name)
+        raw = self._redis.get(key)
+        if raw is None:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.set(key, self._epoch(), nx=True)
+            pipe.get(key)
+            raw = pipe.execute()[1]
+        return int(raw)
+
+    def _incr(self, name: str) -> int:
+        """Increment ``name`` in Redis, starting it at the epoch if Redis lost it."""
+        key = self._key(name)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.set(key, self._epoch(), nx=True)
+        pipe.incr(key)
+        return int(pipe.execute()[1])
+
+    def _read_failed(self, name: str, error: RedisError) -> None:
+        logger.warning(f"Version read failed for {name}: {error}")
+        self._unsynced.add(name)
+
+    def synced(self, name: str) -> bool:
+        """Whether the local copy of ``name`` is as new as Redis was at the last read.
+
+        Without Redis there is no other copy to fall behind, so it always is.
+        """
+        return name not in self._unsynced
+
+    def shared(self, name: str) -> bool:
+        """Whether every worker has seen each bump of ``name`` made here, and this one theirs."""
+        return self._redis is not None and name not in self._unshared and self.synced(name)
+
+    def get(self, name: str) -> int:
+        """Return the current version of ``name``."""
+        value, fetched_at = self._local.get(name, (0, 0.0))
+        if self._redis is None or time.monotonic() - fetched_at < self.ttl:
+            return value
+
+        if self._unshared:
+            self.replay()
+        try:
+            value = self._read(name)
+            self._unsynced.discard(name)
+        except RedisError as e:
+            # Retried after ``ttl`` like any read; not synced until then
+            self._read_failed(name, e)
+        with self._lock:
+            return self._keep(name, value)
+
+    async def get_async(self, name: str) -> int:
+        """Like :meth:`get`, with any Redis round trip off the event loop."""
+        value, fetched_at = self._local.get(name, (0, 0.0))
+        if self._redis is None or time.monotonic() - fetched_at < self.ttl:
+            return value
+        return await asyncio.to_thread(self.get, name)
+
+    def replay(self) -> None:
+        """Bump in Redis every name whose bumps it missed, so other workers move on too."""
+        if self._redis is None:
+            return
+        with self._lock:
+            for name in list(self._unshared):
+                try:
+                    value = self._incr(name)
+                except RedisError as e:
+                    logger.warning(f"Version bump replay failed for {name}: {e}")
+                    return
+                self._unshared.discard(name)
+                self._keep(name, value)
+
+    def bump(self, name: str) -> int:
+        """Increment ``name`` and return the new version."""
+        with self._lock:
+            value = self._local.get(name, (0, 0.0))[0] + 1
+            if self._redis is not None:
+                try:
+                    value = self._incr(name)
+                    self._unshared.discard(name)
+                except RedisError as e:
+                    logger.warning(f"Version bump failed for {name}: {e}")
+                    self._unshared.add(name)
+            return self._keep(name, value)
+
+    async def bump_async(self, name: str) -> int:
+        """Like :meth:`bump`, with the Redis round trip off the event loop."""
+        return await asyncio.to_thread(self.bump, name)
+
+    def fetch(self, name: str) -> Optional[int]:
+        """Read ``name`` from Redis now; None without Redis or when it fails."""
+        if self._redis is None:
+            return None
+        try:
+            value = self._read(name)
+        except RedisError as e:
+            self._read_failed(name, e)
+            return None
+        self._unsynced.discard(name)
+        self.observe(name, value)
+        return value
+
+    def observe(self, name: str, value: int) -> None:
+        """Take a version learned elsewhere if it is newer than the local copy."""
+        with self._lock:
+            if value > self._local.get(name, (0, 0.0))[0]:
+                self._local[name] = (value, time.monotonic())
+
+
+versions = VersionCounter(settings.redis_url, ttl=settings.version_cache_ttl)
+
+
+def table_version_name(table: str) -> str:
+    return f"table:{table}"
+
+
+def table_versions(tables: Iterable[str]) -> Tuple[int, ...]:
+    """Current version of each table, without a database query."""
+    return tuple(versions.get(table_version_name(table)) for table in tables)
+
+
+async def table_versions_async(tables: Iterable[str]) -> Tuple[int, ...]:
+    """Like :func:`table_versions`, for callers on the event loop."""
+    return tuple([await versions.get_async(table_version_name(table)) for table in tables])
+
+
+def tables_shared(tables: Iterable[str]) -> bool:
+    """Whether every worker has seen this worker's writes to ``tables``."""
+    return all(versions.shared(table_version_name(table)) for table in tables)
+
+
+# Every committed session bumps the tables it wrote to
+def _add_changed_row(session: Session, table: str, row_id: Any) -> None:
+    # Primary keys per table; None stands for rows that are not known
+    session.info.setdefault("changed_rows", {}).setdefault(table, set()).add(row_id)
+
+
+def pending_tables(session: Session) -> Set[str]:
+    """Tables ``session`` has flushed writes to in its open transaction."""
+    return set(session.info.get("changed_rows", ()))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_rows(session, flush_context) -> None:
+    deleted = set(session.deleted)
+    for obj in (*session.new, *session.dirty, *deleted):
+        state = inspect(obj)
+        primary_key = state.mapper.primary_key_from_instance(obj)
+        row_id = primary_key[0] if len(primary_key) == 1 else None
+        _add_changed_row(session, state.mapper.local_table.name, row_id)
+        for relationship in state.mapper.relationships:
+            if relationship.secondary is None:
+                continue
+            # Deleting a row also deletes its association rows
+            if obj in deleted or state.attrs[relationship.key].history.has_changes():
+                _add_changed_row(session, relationship.secondary.name, None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_table(orm_execute_state) -> None:
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is None:
+        return
+    # Bookkeeping writes, such as last-seen times, invalidate nothing
+    if not orm_execute_state.execution_options.get("bump_versions", True):
+        return
+    # Bulk statements may name the rows they write; otherwise any row may have changed
+    for row_id in orm_execute_state.execution_options.get("changed_ids", (None,)):
+        _add_changed_row(orm_execute_state.session, table.name, row_id)
+
+
+# Called after each commit with the rows it wrote and the new table versions
+commit_hooks: List[Callable[[Dict[str, Set[Any]], Dict[str, int]], None]] = []
+
+
+def _record_commit(rows: Dict[str, Set[Any]]) -> None:
+    bumped = {table: versions.bump(table_version_name(table)) for table in rows}
+    for hook in commit_hooks:
+        hook(rows, bumped)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_table_versions(session) -> None:
+    rows = session.info.pop("changed_rows", None)
+    if not rows:
+        return
+    if not session.info.get("async_commit"):
+        _record_commit(rows)
+        return
+    # The event loop is running this commit; record_commit_async takes it from here
+    committed = session.info.setdefault("committed_rows", {})
+    for table, ids in rows.items():
+        committed.setdefault(table, set()).update(ids)
+
+
+async def record_commit_async(session: Session) -> None:
+    """Bump versions and run commit hooks for an async session's commits.
+
+    Sessions flagged with ``info["async_commit"]`` leave this to their
+    AsyncSession, so the Redis round trips run on a worker thread
+    instead of blocking the event loop.
+    """
+    rows = session.info.pop("committed_rows", None)
+    if rows:
+        await asyncio.to_thread(_record_commit, rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_table_changes(session) -> None:
+    session.info.pop("changed_rows", None)
+{%- endif %}
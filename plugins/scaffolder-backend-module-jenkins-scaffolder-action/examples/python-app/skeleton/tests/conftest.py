@@ -5,10 +5,17 @@ import os
 import pytest
 from typing import AsyncGenerator, Generator
 {% if values.framework == 'fastapi' -%}
+# Fail any request that runs more queries than its endpoint declares
+os.environ.setdefault("QUERY_BUDGET_ENFORCE", "true")
+# and any request that repeats one statement like an N+1 loop
+os.environ.setdefault("N_PLUS_ONE_RAISE", "true")
+# Keep cached reads in-process so tests never share them through Redis
+os.environ.setdefault("CACHE_TYPE", "simple")
+# Every TestClient request shares one client IP; only TestRateLimit turns limits on
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from app.main import app
-from app.database import get_database
 {% elif values.framework == 'django' -%}
 import django
 from django.test import TestCase, Client
@@ -39,10 +46,19 @@ async def async_client() -> AsyncGenerator[AsyncClient, None]:
 async def test_db():
     """Test database fixture"""
     # Use in-memory SQLite for tests
-    from app.database import engine, Base
-    Base.metadata.create_all(bind=engine)
+    from app.crud import read_cache
+    from app.database import engine, async_engine, Base, init_db
+    # Cached reads must not outlive the database they came from
+    read_cache.clear()
+    # An in-memory database is private to each engine; init_db creates both
+    await init_db()
     yield
     Base.metadata.drop_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    # aiosqlite's worker thread is not a daemon and keeps pytest from exiting
+    await async_engine.dispose()
+    engine.dispose()
 
 {% elif values.framework == 'django' -%}
 # Django test configuration
@@ -0,0 +1,59 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for write-behind user activity
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.activity import ActivityRecorder
+from app.database import AsyncSessionLocal
+from app.models import User
+from app.versions import table_versions
+
+
+class TestActivity:
+    """Test write-behind last_login"""
+    
+    @pytest.mark.asyncio
+    async def test_flush_keeps_latest_time(self, test_db):
+        """Test a flush writes each user's newest time and never moves it back"""
+        # Flushes write through the async engine, so the user must live there too
+        async with AsyncSessionLocal() as db:
+            user = User(
+                username="active", email="active@example.com", hashed_password="x",
+                first_name="Test", last_name="User"
+            )
+            db.add(user)
+            await db.commit()
+        
+        recorder = ActivityRecorder(batch_size=10)
+        seen = datetime(2024, 1, 2)
+        recorder.record(user.id, seen)
+        recorder.record(user.id, seen - timedelta(hours=1))
+        assert await recorder.flush() == 1
+        assert await recorder.flush() == 0
+        
+        recorder.record(user.id, seen - timedelta(days=1))
+        await recorder.flush()
+        async with AsyncSessionLocal() as db:
+            assert (await db.get(User, user.id)).last_login == seen
+    
+    @pytest.mark.asyncio
+    async def test_flush_invalidates_nothing(self, test_db, monkeypatch):
+        """Test last-seen writes leave table versions and invalidation events alone"""
+        async with AsyncSessionLocal() as db:
+            user = User(
+                username="idle", email="idle@example.com", hashed_password="x",
+                first_name="Test", last_name="User"
+            )
+            db.add(user)
+            await db.commit()
+        
+        committed = []
+        monkeypatch.setattr("app.versions.commit_hooks", [lambda rows, bumped: committed.append(rows)])
+        before = table_versions(("users",))
+        recorder = ActivityRecorder(batch_size=10)
+        recorder.record(user.id)
+        assert await recorder.flush() == 1
+        assert table_versions(("users",)) == before
+        assert committed == []
+{%- endif %}
@@ -4,10 +4,15 @@ API integration tests
 import pytest
 import json
 {% if values.framework == 'fastapi' -%}
+from fastapi import HTTPException, Request, Response
 from fastapi.testclient import TestClient
 from app.models import User
-from app.database import SessionLocal
+from app.database import AsyncSessionLocal, SessionLocal
 from app.auth import get_password_hash
+from app import api, ratelimit
+from app.config import settings
+from app.ratelimit import RateLimiter, RateLimitRule, client_address, rate_limit, rate_limit_keys
+from redis import RedisError
 {% elif values.framework == 'django' -%}
 from django.test import TestCase
 from django.urls import reverse
@@ -125,6 +130,109 @@ class TestAuthAPI:
         response = client.post("/api/v1/auth/login", data=login_data)
         assert response.status_code == 401
 
+
+class TestRateLimit:
+    """Test rate limiting"""
+    
+    def test_limit_enforced_without_redis(self):
+        """Test the local pre-limiter denies once the window is spent"""
+        limiter = RateLimiter(None)
+        rule = RateLimitRule.parse("ip", "3/minute")
+        
+        results = [limiter.hit("ip:/login:ip:1.2.3.4", rule) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[2].headers()["RateLimit-Remaining"] == "0"
+        assert int(results[3].headers()["Retry-After"]) > 0
+    
+    def test_keys_are_isolated(self):
+        """Test separate clients have separate budgets"""
+        limiter = RateLimiter(None)
+        rule = RateLimitRule.parse("ip", "1/minute")
+        
+        assert limiter.hit("ip:/login:ip:1.1.1.1", rule).allowed
+        assert limiter.hit("ip:/login:ip:2.2.2.2", rule).allowed
+        assert not limiter.hit("ip:/login:ip:1.1.1.1", rule).allowed
+    
+    def test_only_route_rules_are_keyed_by_route(self):
+        """Test ip and user budgets are shared across routes"""
+        ip, user, route = (RateLimitRule.parse(scope, "5/minute") for scope in ("ip", "user", "route"))
+        
+        def keys(path):
+            return [key for key, _ in rate_limit_keys([ip, user, route], path, "1.2.3.4", "a@example.com")]
+        
+        assert keys("/users")[:2] == keys("/roles")[:2]
+        assert keys("/users")[2] != keys("/roles")[2]
+    
+    def test_redis_failure_backs_off(self):
+        """Test a Redis error skips Redis for the retry interval"""
+        limiter = RateLimiter(None, retry_interval=60)
+        calls = []
+        
+        def failing_script(**kwargs):
+            calls.append(1)
+            raise RedisError("down")
+        
+        limiter._script = failing_script
+        rule = RateLimitRule.parse("ip", "100/minute")
+        
+        assert all(limiter.hit("ip:ip:1.2.3.4:100/60", rule).allowed for _ in range(3))
+        assert len(calls) == 1
+    
+    def test_forwarded_for_only_read_behind_trusted_proxies(self):
+        """Test clients cannot pick their own rate limit key with X-Forwarded-For"""
+        forwarded = ["6.6.6.6, 1.2.3.4", "10.0.0.1"]
+        
+        assert client_address("10.0.0.2", forwarded, 0) == "10.0.0.2"
+        assert client_address("10.0.0.2", forwarded, 2) == "1.2.3.4"
+        assert client_address("10.0.0.2", forwarded, 4) == "10.0.0.2"
+    
+    def test_dependency_enforces_when_enabled(self, monkeypatch):
+        """Test the route dependency answers 429 once the budget is spent"""
+        monkeypatch.setattr(settings, "rate_limit_enabled", True)
+        monkeypatch.setattr(ratelimit, "limiter", RateLimiter(None))
+        dependency = rate_limit(RateLimitRule.parse("ip", "2/minute"))
+        request = Request({"type": "http", "method": "POST", "path": "/login", "headers": [], "client": ("1.2.3.4", 1)})
+        
+        dependency(request, Response())
+        dependency(request, Response())
+        with pytest.raises(HTTPException) as exc_info:
+            dependency(request, Response())
+        assert exc_info.value.status_code == 429
+        assert "Retry-After" in exc_info.value.headers
+    
+    def test_dependency_disabled(self, monkeypatch):
+        """Test nothing is counted while rate limiting is off"""
+        monkeypatch.setattr(settings, "rate_limit_enabled", False)
+        monkeypatch.setattr(ratelimit, "limiter", RateLimiter(None))
+        dependency = rate_limit(RateLimitRule.parse("ip", "1/minute"))
+        request = Request({"type": "http", "method": "POST", "path": "/login", "headers": [], "client": ("1.2.3.4", 1)})
+        
+        for _ in range(3):
+            dependency(request, Response())
+
+
+class TestUserFlights:
+    """Test shared user detail loads"""
+    
+    @pytest.mark.asyncio
+    async def test_load_uses_own_session(self, test_db, monkeypatch):
+        """Test the shared load never runs on the first caller's session"""
+        async with AsyncSessionLocal() as db:
+            user = User(
+                username="flight", email="flight@example.com", hashed_password="x",
+                first_name="Test", last_name="User"
+            )
+            db.add(user)
+            await db.commit()
+        
+        async def closed(*args, **kwargs):
+            raise AssertionError("the caller's session was used")
+        
+        async with AsyncSessionLocal() as db:
+            monkeypatch.setattr(db, "execute", closed)
+            loaded = await api.get_user(user.id, db=db, current_user=None)
+        assert loaded.username == "flight"
+
 {% elif values.framework == 'django' -%}
 class TestUserAPI(TestCase):
     """Test User API endpoints"""
@@ -5,20 +5,25 @@ import pytest
 {% if values.framework == 'fastapi' -%}
 from app.auth import (
     verify_password, get_password_hash, create_access_token,
-    decode_access_token, authenticate_user
+    authenticate_user, check_permission, permission_index,
+    verify_token, token_cache, identity_cache, check_token_permission, IdentityCache
 )
-from app.models import User
-from app.database import SessionLocal
+from app.models import User, Role, Permission
+from app.database import AsyncSessionLocal, SessionLocal, engine
+from sqlalchemy import event
+from app.crud import UserCRUD, RoleCRUD
+from app.versions import versions
 {% elif values.framework == 'django' -%}
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from app.auth import create_access_token, decode_access_token, authenticate_user
+from rest_framework_simplejwt.tokens import AccessToken
+from app.auth import create_tokens_for_user, EmailBackend
 User = get_user_model()
 {% elif values.framework == 'flask' -%}
-from app.auth import (
-    verify_password, get_password_hash, create_access_token,
-    decode_access_token, authenticate_user
-)
+from flask_jwt_extended import decode_token
+from app.auth import hash_password, verify_password, create_tokens
+from app.crud import UserService
+from app.ids import uuid7
 from app.models import User, db
 {% endif %}
 from datetime import datetime, timedelta
@@ -35,6 +40,30 @@ class TestPasswordHashing:
         assert hashed != password
         assert verify_password(password, hashed)
         assert not verify_password("wrongpassword", hashed)
+    
+    def test_outdated_hash_is_upgraded(self):
+        """Test hashes from an old scheme or cost are replaced on verify"""
+        from app.hashing import PasswordHasher
+        
+        old_hash = PasswordHasher(scheme="bcrypt", bcrypt_rounds=10).hash("testpassword123")
+        hasher = PasswordHasher(scheme="argon2", bcrypt_rounds=12, argon2_time_cost=2)
+        
+        valid, new_hash = hasher.verify_and_update("testpassword123", old_hash)
+        assert valid
+        assert new_hash.startswith("$argon2id$")
+        assert hasher.verify_and_update("testpassword123", new_hash) == (True, None)
+        assert hasher.verify_and_update("wrongpassword", old_hash) == (False, None)
+    
+    def test_weaker_cost_is_upgraded(self):
+        """Test hashes below the configured rounds need an update"""
+        from app.hashing import PasswordHasher
+        
+        old_hash = PasswordHasher(scheme="bcrypt", bcrypt_rounds=10).hash("testpassword123")
+        valid, new_hash = PasswordHasher(scheme="bcrypt", bcrypt_rounds=11).verify_and_update(
+            "testpassword123", old_hash
+        )
+        assert valid
+        assert new_hash.startswith("$2b$11$")
 
 class TestTokens:
     """Test JWT token functions"""
@@ -48,21 +77,45 @@ class TestTokens:
         assert isinstance(token, str)
         assert len(token) > 0
     
-    def test_decode_access_token(self):
-        """Test access token decoding"""
+    def test_verify_access_token(self):
+        """Test access token verification"""
         data = {"sub": "testuser"}
         token = create_access_token(data)
         
-        decoded = decode_access_token(token)
-        assert decoded["sub"] == "testuser"
+        token_data = verify_token(token)
+        assert token_data.email == "testuser"
     
     def test_expired_token(self):
         """Test expired token handling"""
         data = {"sub": "testuser"}
         token = create_access_token(data, expires_delta=timedelta(seconds=-1))
         
-        decoded = decode_access_token(token)
-        assert decoded is None
+        assert verify_token(token) is None
+    
+    def test_verify_token_is_cached(self, monkeypatch):
+        """Test repeated verification skips jwt.decode"""
+        from app import auth
+        
+        token = create_access_token({"sub": "cached@example.com"})
+        calls = []
+        original_decode = auth.jwt.decode
+        monkeypatch.setattr(
+            auth.jwt, "decode",
+            lambda *args, **kwargs: calls.append(1) or original_decode(*args, **kwargs)
+        )
+        
+        assert verify_token(token).email == "cached@example.com"
+        assert verify_token(token).email == "cached@example.com"
+        assert verify_token(token, verify_refresh=True) is None
+        assert len(calls) == 1
+    
+    def test_expired_token_not_cached(self):
+        """Test expired tokens are never stored"""
+        token_cache.clear()
+        token = create_access_token({"sub": "testuser"}, expires_delta=timedelta(seconds=-1))
+        
+        assert verify_token(token) is None
+        assert len(token_cache) == 0
 
 class TestAuthentication:
     """Test authentication functions"""
@@ -112,6 +165,206 @@ class TestAuthentication:
         
         db.close()
 
+class TestIdentityCache:
+    """Test the identity cache in front of get_current_user"""
+    
+    def test_cached_identity_skips_database(self, test_db):
+        """Test a cached subject is rebuilt without a query"""
+        db = SessionLocal()
+        user = User(
+            username="cacheduser",
+            email="cached@example.com",
+            first_name="Cached",
+            last_name="User",
+            hashed_password="hashedpassword"
+        )
+        db.add(user)
+        db.commit()
+        identity_cache.invalidate(user.email)
+        assert identity_cache.get(db, "cached@example.com").id == user.id
+        
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            other_db = SessionLocal()
+            cached_user = identity_cache.get(other_db, "cached@example.com")
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        
+        assert cached_user.id == user.id
+        assert cached_user.is_active is True
+        assert statements == []
+        
+        other_db.close()
+        db.close()
+    
+    def test_update_invalidates_identity(self, test_db):
+        """Test UserCRUD.update evicts the cached snapshot"""
+        db = SessionLocal()
+        user = User(
+            username="staleuser",
+            email="stale@example.com",
+            first_name="Stale",
+            last_name="User",
+            hashed_password="hashedpassword"
+        )
+        db.add(user)
+        db.commit()
+        identity_cache.get(db, "stale@example.com")
+        
+        UserCRUD().update(db, db_obj=user, obj_in={"first_name": "Fresh"})
+        
+        fresh_db = SessionLocal()
+        assert identity_cache.get(fresh_db, "stale@example.com").first_name == "Fresh"
+        
+        fresh_db.close()
+        db.close()
+    
+    @pytest.mark.asyncio
+    async def test_async_lookup_survives_redis_outage(self, test_db):
+        """Test an unreachable Redis tier falls back to the database"""
+        cache = IdentityCache(maxsize=10, ttl=60, redis_url="redis://localhost:1/0")
+        async with AsyncSessionLocal() as db:
+            db.add(User(
+                username="outage",
+                email="outage@example.com",
+                first_name="Out",
+                last_name="Age",
+                hashed_password="hashedpassword"
+            ))
+            await db.commit()
+            
+            assert (await cache.get_async(db, "outage@example.com")).username == "outage"
+            assert (await cache.get_async(db, "outage@example.com")).username == "outage"
+            await cache.invalidate_async("outage@example.com")
+    
+    def test_any_commit_evicts_identity(self, test_db):
+        """Test a write outside UserCRUD evicts the snapshot through the invalidation bus"""
+        db = SessionLocal()
+        user = User(
+            username="buswriter",
+            email="bus@example.com",
+            first_name="Old",
+            last_name="User",
+            hashed_password="hashedpassword"
+        )
+        db.add(user)
+        db.commit()
+        identity_cache.get(db, "bus@example.com")
+        
+        user.first_name = "New"
+        db.commit()
+        
+        fresh_db = SessionLocal()
+        assert identity_cache.get(fresh_db, "bus@example.com").first_name == "New"
+        
+        fresh_db.close()
+        db.close()
+
+class TestPermissionIndex:
+    """Test the compiled permission index"""
+    
+    def _setup(self, db):
+        user = User(
+            username="rbacuser",
+            email="rbac@example.com",
+            first_name="Rbac",
+            last_name="User",
+            hashed_password="hashedpassword"
+        )
+        role = Role(name="editor")
+        permission = Permission(name="read_users", resource="user", action="read")
+        db.add_all([user, role, permission])
+        db.commit()
+        return user, role, permission
+    
+    def test_check_permission_uses_index(self, test_db, monkeypatch):
+        """Test permission sets are compiled once and reused"""
+        db = SessionLocal()
+        user, role, permission = self._setup(db)
+        RoleCRUD().add_permission(db, role=role, permission=permission)
+        UserCRUD().add_role(db, user=user, role=role)
+        
+        loads = []
+        original_remember = permission_index._remember
+        monkeypatch.setattr(
+            permission_index, "_remember",
+            lambda user_id, stamp, rows: loads.append(user_id) or original_remember(user_id, stamp, rows)
+        )
+        
+        assert check_permission(user, "user", "read", db)
+        assert not check_permission(user, "user", "delete", db)
+        assert len(loads) == 1
+        
+        db.close()
+    
+    def test_unsynced_version_bypasses_index(self, test_db, monkeypatch):
+        """Test permission sets are reloaded while the RBAC version cannot be read"""
+        db = SessionLocal()
+        user, role, permission = self._setup(db)
+        RoleCRUD().add_permission(db, role=role, permission=permission)
+        UserCRUD().add_role(db, user=user, role=role)
+        assert check_permission(user, "user", "read", db)
+        
+        loads = []
+        original_remember = permission_index._remember
+        monkeypatch.setattr(
+            permission_index, "_remember",
+            lambda user_id, stamp, rows: loads.append(user_id) or original_remember(user_id, stamp, rows)
+        )
+        monkeypatch.setattr(versions, "synced", lambda name: False)
+        assert check_permission(user, "user", "read", db)
+        assert check_permission(user, "user", "read", db)
+        assert len(loads) == 2
+        
+        db.close()
+    
+    def test_index_invalidated_on_rbac_changes(self, test_db):
+        """Test role and permission changes rebuild the index"""
+        db = SessionLocal()
+        user, role, permission = self._setup(db)
+        UserCRUD().add_role(db, user=user, role=role)
+        assert not check_permission(user, "user", "read", db)
+        
+        RoleCRUD().add_permission(db, role=role, permission=permission)
+        assert check_permission(user, "user", "read", db)
+        
+        UserCRUD().remove_role(db, user=user, role=role)
+        assert not check_permission(user, "user", "read", db)
+        
+        db.close()
+    
+    def test_token_permission_claims(self, monkeypatch):
+        """Test embedded claims authorize until the RBAC version moves"""
+        monkeypatch.setattr(versions, "shared", lambda name: True)
+        token = create_access_token({
+            "sub": "claims@example.com",
+            "perms": ["user:read"],
+            "pv": permission_index.version,
+        })
+        token_data = verify_token(token)
+        
+        assert check_token_permission(token_data, "user", "read") is True
+        assert check_token_permission(token_data, "user", "delete") is False
+        
+        permission_index.invalidate_all()
+        assert check_token_permission(token_data, "user", "read") is None
+        
+        legacy = verify_token(create_access_token({"sub": "claims@example.com"}))
+        assert check_token_permission(legacy, "user", "read") is None
+        assert check_token_permission(None, "user", "read") is None
+    
+    def test_unshared_version_ignores_claims(self, monkeypatch):
+        """Test claims are not trusted while other workers may have missed an RBAC change"""
+        token_data = verify_token(create_access_token({
+            "sub": "claims@example.com",
+            "perms": ["user:read"],
+            "pv": permission_index.version,
+        }))
+        monkeypatch.setattr(versions, "shared", lambda name: False)
+        assert check_token_permission(token_data, "user", "read") is None
+
 {% elif values.framework == 'django' -%}
 class TestAuthentication(TestCase):
     """Test authentication functions"""
@@ -124,7 +377,7 @@ class TestAuthentication(TestCase):
             password="testpassword123"
         )
         
-        token = create_access_token(user)
+        token = create_tokens_for_user(user)["access_token"]
         assert token is not None
         assert isinstance(token, str)
         assert len(token) > 0
@@ -137,11 +390,10 @@ class TestAuthentication(TestCase):
             password="testpassword123"
         )
         
-        token = create_access_token(user)
-        decoded_user = decode_access_token(token)
+        token = create_tokens_for_user(user)["access_token"]
+        decoded = AccessToken(token)
         
-        assert decoded_user is not None
-        assert decoded_user.username == "testuser"
+        assert str(decoded["user_id"]) == str(user.pk)
     
     def test_authenticate_user_success(self):
         """Test successful user authentication"""
@@ -151,7 +403,9 @@ class TestAuthentication(TestCase):
             password="testpassword123"
         )
         
-        authenticated_user = authenticate_user("testuser", "testpassword123")
+        authenticated_user = EmailBackend().authenticate(
+            None, username="test@example.com", password="testpassword123"
+        )
         assert authenticated_user is not None
         assert authenticated_user.username == "testuser"
     
@@ -164,11 +418,15 @@ class TestAuthentication(TestCase):
         )
         
         # Test with wrong password
-        authenticated_user = authenticate_user("testuser", "wrongpassword")
+        authenticated_user = EmailBackend().authenticate(
+            None, username="test@example.com", password="wrongpassword"
+        )
         assert authenticated_user is None
         
         # Test with non-existent user
-        authenticated_user = authenticate_user("nonexistent", "password")
+        authenticated_user = EmailBackend().authenticate(
+            None, username="nonexistent@example.com", password="password"
+        )
         assert authenticated_user is None
 
 {% elif values.framework == 'flask' -%}
@@ -178,7 +436,7 @@ class TestPasswordHashing:
     def test_password_hashing(self):
         """Test password hashing and verification"""
         password = "testpassword123"
-        hashed = get_password_hash(password)
+        hashed = hash_password(password)
         
         assert hashed != password
         assert verify_password(password, hashed)
@@ -190,8 +448,8 @@ class TestTokens:
     def test_create_access_token(self, app):
         """Test access token creation"""
         with app.app_context():
-            data = {"sub": "testuser"}
-            token = create_access_token(data)
+            user = User(id=uuid7(), username="testuser", email="test@example.com")
+            token = create_tokens(user)["access_token"]
             
             assert token is not None
             assert isinstance(token, str)
@@ -200,11 +458,11 @@ class TestTokens:
     def test_decode_access_token(self, app):
         """Test access token decoding"""
         with app.app_context():
-            data = {"sub": "testuser"}
-            token = create_access_token(data)
+            user = User(id=uuid7(), username="testuser", email="test@example.com")
+            token = create_tokens(user)["access_token"]
             
-            decoded = decode_access_token(token)
-            assert decoded["sub"] == "testuser"
+            decoded = decode_token(token)
+            assert decoded["sub"] == str(user.id)
 
 class TestAuthentication:
     """Test authentication functions"""
@@ -223,7 +481,7 @@ class TestAuthentication:
             db.session.commit()
             
             # Test authentication
-            authenticated_user = authenticate_user("testuser", "testpassword123")
+            authenticated_user = UserService.authenticate_user("test@example.com", "testpassword123")
             assert authenticated_user is not None
             assert authenticated_user.username == "testuser"
     
@@ -231,7 +489,7 @@ class TestAuthentication:
         """Test failed user authentication"""
         with app.app_context():
             # Test with non-existent user
-            authenticated_user = authenticate_user("nonexistent", "password")
+            authenticated_user = UserService.authenticate_user("nonexistent@example.com", "password")
             assert authenticated_user is None
             
             # Create test user
@@ -245,7 +503,7 @@ class TestAuthentication:
             db.session.commit()
             
             # Test with wrong password
-            authenticated_user = authenticate_user("testuser", "wrongpassword")
+            authenticated_user = UserService.authenticate_user("test@example.com", "wrongpassword")
             assert authenticated_user is None
 
 {% endif %}
@@ -0,0 +1,37 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for the cache invalidation bus
+"""
+from app.bus import InvalidationBus
+from app.versions import table_version_name, versions
+
+
+class TestInvalidationBus:
+    """Test cross-worker cache invalidation events"""
+    
+    def test_large_commit_sends_one_event(self):
+        """Test a table with too many written rows is evicted as a whole"""
+        events = InvalidationBus.events({"users": set(range(101)), "roles": {7}}, {"users": 4, "roles": 2})
+        assert events == [("users", None, 4), ("roles", "7", 2)]
+    
+    def test_received_event_evicts_and_advances_version(self):
+        """Test a message runs the entity's handlers and moves its version forward"""
+        bus, evicted = InvalidationBus(None, "test"), []
+        bus.on("widgets")(evicted.append)
+        
+        bus.receive('[["widgets","7",41],["gadgets",null,3]]')
+        assert evicted == ["7"]
+        assert versions.get(table_version_name("widgets")) >= 41
+    
+    def test_reconnect_evicts_moved_tables(self, monkeypatch):
+        """Test missed events are made up for by comparing table versions"""
+        bus, evicted = InvalidationBus(None, "test"), []
+        bus.on("widgets")(evicted.append)
+        bus.receive('[["widgets","7",5]]')
+        
+        monkeypatch.setattr(versions, "fetch", lambda name: 5)
+        bus.reconcile()
+        monkeypatch.setattr(versions, "fetch", lambda name: 6)
+        bus.reconcile()
+        assert evicted == ["7", None]
+{%- endif %}
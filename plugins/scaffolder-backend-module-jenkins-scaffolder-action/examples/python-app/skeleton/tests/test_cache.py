@@ -0,0 +1,59 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for cached reads
+"""
+import pytest
+from app.cache import TwoTierCache
+from app.crud import PermissionCRUD, RoleCRUD
+from app.database import SessionLocal
+from app.loading import query_budget
+from app.schemas import PermissionCreate, RoleCreate, RoleResponse
+
+
+class TestReadCache:
+    """Test cached role and permission reads"""
+    
+    def test_role_list_served_from_cache(self, test_db):
+        """Test a repeated list runs no queries and keeps its permissions loaded"""
+        db = SessionLocal()
+        role_crud = RoleCRUD()
+        role = role_crud.create(db, obj_in=RoleCreate(name="editor"))
+        permission = PermissionCRUD().create(
+            db, obj_in=PermissionCreate(name="user_read", resource="user", action="read")
+        )
+        role_crud.add_permission(db, role=role, permission=permission)
+        db.close()
+        
+        db = SessionLocal()
+        role_crud.get_multi(db, count_strategy="exact")
+        db.close()
+        
+        db = SessionLocal()
+        with query_budget(0) as counter:
+            page = role_crud.get_multi(db, count_strategy="exact")
+            response = RoleResponse.model_validate(page.items[0])
+        assert counter.count == 0
+        assert (page.total, [p.name for p in response.permissions]) == (1, ["user_read"])
+        db.close()
+    
+    def test_commit_invalidates_cached_reads(self, test_db):
+        """Test a committed write is never answered from an older entry"""
+        db = SessionLocal()
+        permission_crud = PermissionCRUD()
+        permission_crud.create(
+            db, obj_in=PermissionCreate(name="user_read", resource="user", action="read")
+        )
+        permission = permission_crud.get_by_name(db, name="user_read")
+        permission_crud.update(db, db_obj=permission, obj_in={"action": "list"})
+        
+        assert permission_crud.get_by_name(db, name="user_read").action == "list"
+        db.close()
+    
+    @pytest.mark.asyncio
+    async def test_async_tiers_survive_redis_outage(self):
+        """Test the async methods fall back to the local tier while Redis is unreachable"""
+        cache = TwoTierCache("outage", maxsize=10, ttl=60, redis_url="redis://localhost:1/0")
+        assert await cache.set_async("key", {"id": 1}) == {"id": 1}
+        assert await cache.get_async("key") == {"id": 1}
+        assert await cache.get_async("missing", "default") == "default"
+{%- endif %}
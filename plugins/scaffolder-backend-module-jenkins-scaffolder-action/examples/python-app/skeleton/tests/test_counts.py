@@ -0,0 +1,51 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for paginated count strategies
+"""
+import time
+
+from app.counts import count_cache
+from app.crud import RoleCRUD
+from app.database import SessionLocal
+from app.schemas import RoleCreate
+
+
+class TestCountStrategies:
+    """Test paginated totals"""
+    
+    def test_exact_count_in_page_query(self, test_db):
+        """Test the window count matches the table and past-the-end pages still count"""
+        db = SessionLocal()
+        role_crud = RoleCRUD()
+        for i in range(3):
+            role_crud.create(db, obj_in=RoleCreate(name=f"role{i}"))
+        
+        page = role_crud.get_multi(db, limit=2, count_strategy="exact")
+        assert (len(page.items), page.total, page.total_strategy) == (2, 3, "exact")
+        assert role_crud.get_multi(db, skip=10, count_strategy="exact").total == 3
+        db.close()
+    
+    def test_estimate_falls_back_without_postgres(self, test_db):
+        """Test the estimate strategy reports an exact count on SQLite"""
+        db = SessionLocal()
+        page = RoleCRUD().get_multi(db, count_strategy="estimate")
+        assert page.total_strategy == "exact"
+        db.close()
+    
+    def test_cached_count_refreshes_off_request(self, test_db, monkeypatch):
+        """Test a stale cached count is served while a refresh runs in the background"""
+        monkeypatch.setattr(count_cache, "_entries", {})
+        monkeypatch.setattr(count_cache, "ttl", 0)
+        db = SessionLocal()
+        role_crud = RoleCRUD()
+        role_crud.create(db, obj_in=RoleCreate(name="first"))
+        assert role_crud.get_multi(db, count_strategy="cached").total == 1
+        
+        role_crud.create(db, obj_in=RoleCreate(name="second"))
+        assert role_crud.get_multi(db, count_strategy="cached").total == 1
+        deadline = time.monotonic() + 2
+        while count_cache.get("roles")[0] != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert count_cache.get("roles")[0] == 2
+        db.close()
+{%- endif %}
@@ -0,0 +1,99 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for CRUD operations
+"""
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app import crud
+from app.crud import AsyncUserCRUD, UserCRUD
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import User
+from app.schemas import BatchUserUpdateItem, UserCreate
+
+
+class TestBatchUsers:
+    """Test set-based batch user operations"""
+    
+    @staticmethod
+    def _user(name):
+        return UserCreate(
+            username=name, email=f"{name}@example.com", password="Password123",
+            first_name="Test", last_name="User"
+        )
+    
+    @pytest.mark.asyncio
+    async def test_results_per_item(self, test_db):
+        """Test conflicts are reported per item without failing the batch"""
+        user_crud = AsyncUserCRUD()
+        async with AsyncSessionLocal() as db:
+            await user_crud.create(db, obj_in=self._user("existing"))
+        
+        async with AsyncSessionLocal() as db:
+            created = await user_crud.create_many(
+                db, items=[self._user("alice"), self._user("existing"), self._user("alice"), self._user("bob")]
+            )
+        assert [r.status for r in created] == ["created", "conflict", "conflict", "created"]
+        
+        alice, bob = created[0].id, created[3].id
+        async with AsyncSessionLocal() as db:
+            updated = await user_crud.update_many(db, items=[
+                BatchUserUpdateItem(id=alice, first_name="Alice"),
+                BatchUserUpdateItem(id=bob, email="alice@example.com"),
+            ])
+        assert [r.status for r in updated] == ["updated", "conflict"]
+        
+        async with AsyncSessionLocal() as db:
+            deleted = await user_crud.remove_many(db, ids=[alice, bob, uuid.UUID(int=0)])
+            assert (await user_crud.get_by_username(db, username="existing")) is not None
+        assert [r.status for r in deleted] == ["deleted", "deleted", "not_found"]
+    
+    @pytest.mark.asyncio
+    async def test_conflicts_are_not_hashed(self, test_db, monkeypatch):
+        """Test only the rows that will be inserted pay for a password hash"""
+        user_crud = AsyncUserCRUD()
+        async with AsyncSessionLocal() as db:
+            await user_crud.create(db, obj_in=self._user("existing"))
+        
+        hashed = []
+        original = crud.get_password_hashes_async
+        
+        async def counting(passwords):
+            hashed.extend(passwords)
+            return await original(passwords)
+        
+        monkeypatch.setattr(crud, "get_password_hashes_async", counting)
+        async with AsyncSessionLocal() as db:
+            created = await user_crud.create_many(
+                db, items=[self._user("existing"), self._user("carol"), self._user("carol")]
+            )
+        assert [r.status for r in created] == ["conflict", "created", "conflict"]
+        assert len(hashed) == 1
+
+
+class TestInactiveUsers:
+    """Test the inactive user cleanup query"""
+    
+    def test_never_seen_users_count_from_sign_up(self, test_db):
+        """Test users who never logged in are inactive once they signed up before the cutoff"""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=30)
+        db = SessionLocal()
+        for name, created_at, last_login, is_active in [
+            ("old_never_seen", now - timedelta(days=90), None, False),
+            ("new_never_seen", now - timedelta(days=1), None, False),
+            ("long_gone", now - timedelta(days=90), now - timedelta(days=60), False),
+            ("recently_seen", now - timedelta(days=90), now - timedelta(days=1), False),
+            ("still_active", now - timedelta(days=90), None, True),
+        ]:
+            db.add(User(
+                username=name, email=f"{name}@example.com", hashed_password="x",
+                first_name="Test", last_name="User",
+                created_at=created_at, last_login=last_login, is_active=is_active
+            ))
+        db.commit()
+        
+        inactive = db.execute(UserCRUD().inactive_statement(cutoff)).scalars().all()
+        assert sorted(user.username for user in inactive) == ["long_gone", "old_never_seen"]
+        db.close()
+{%- endif %}
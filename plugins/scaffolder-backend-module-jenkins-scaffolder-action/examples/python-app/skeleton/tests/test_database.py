@@ -0,0 +1,61 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for database routing
+"""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import database
+from app.database import AsyncSessionLocal, RecentWriters, ReplicaSet, RoutingSession, engine
+from app.models import Role
+
+
+class TestReplicaRouting:
+    """Test read replica routing"""
+    
+    def test_reads_leave_replica_after_write(self, test_db):
+        """Test SELECTs use the replica until the session writes"""
+        replica = create_async_engine("sqlite+aiosqlite://")
+        db = RoutingSession(bind=engine, info={"replica": replica})
+        assert db.get_bind(clause=select(Role)) is replica.sync_engine
+        
+        db.add(Role(name="writer"))
+        db.flush()
+        assert db.get_bind(clause=select(Role)) is engine
+        db.close()
+    
+    @pytest.mark.asyncio
+    async def test_replica_used_once_checked(self):
+        """Test replicas are only handed out after passing a lag check"""
+        replica = create_async_engine("sqlite+aiosqlite://")
+        replica_set = ReplicaSet([replica], max_lag=5)
+        assert replica_set.choose() is None
+        
+        await replica_set.check_lag()
+        assert replica_set.choose() is replica
+        await replica_set.close()
+    
+    @pytest.mark.asyncio
+    async def test_recent_writers_survive_redis_outage(self):
+        """Test markers still apply locally while Redis is unreachable"""
+        writers = RecentWriters("redis://localhost:1/0", ttl=5)
+        await writers.share("client")
+        assert await writers.wrote_recently("client")
+        assert not await RecentWriters("redis://localhost:1/0", ttl=5).wrote_recently("client")
+    
+    @pytest.mark.asyncio
+    async def test_commit_marks_writer(self, test_db, monkeypatch):
+        """Test a committed write sends the client's next reads to the primary"""
+        replica = create_async_engine("sqlite+aiosqlite://")
+        monkeypatch.setattr(database.replicas, "engines", [replica])
+        monkeypatch.setattr(database.replicas, "_healthy", [replica])
+        monkeypatch.setattr(database, "recent_writers", RecentWriters(None, ttl=5))
+        assert await database.read_replica("writer") is replica
+        
+        async with AsyncSessionLocal(info={"client": "writer"}) as db:
+            db.add(Role(name="writer"))
+            await db.commit()
+        assert await database.read_replica("writer") is None
+        assert await database.read_replica("reader") is replica
+        await replica.dispose()
+{%- endif %}
@@ -0,0 +1,183 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for ETags and table versions
+"""
+import threading
+import pytest
+from fastapi import HTTPException, Request, Response
+from app.database import AsyncSessionLocal, SessionLocal
+from app.etags import check_not_modified, table_etag
+from app.models import Permission, Role
+from app.versions import VersionCounter, table_versions
+from redis import RedisError
+
+
+class FlakyRedis:
+    """Just enough of a Redis client to take it down and bring it back."""
+    
+    def __init__(self):
+        self.values, self.down = {}, False
+    
+    def _check(self):
+        if self.down:
+            raise RedisError("unreachable")
+    
+    def get(self, key):
+        self._check()
+        return self.values.get(key)
+    
+    def set(self, key, value, nx=False):
+        self._check()
+        if not (nx and key in self.values):
+            self.values[key] = int(value)
+        return True
+    
+    def incr(self, key):
+        self._check()
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+    
+    def pipeline(self, transaction=True):
+        return FlakyPipeline(self)
+
+
+class FlakyPipeline:
+    """Queues calls and runs them against a FlakyRedis on execute."""
+    
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+    
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class TestETags:
+    """Test conditional GET support"""
+    
+    def test_commit_bumps_table_versions(self, test_db):
+        """Test a commit bumps every table it wrote, including association tables"""
+        tables = ("roles", "role_permissions", "permissions")
+        before = table_versions(tables)
+        db = SessionLocal()
+        role = Role(name="editor")
+        role.permissions.append(Permission(name="user_read", resource="user", action="read"))
+        db.add(role)
+        db.commit()
+        db.close()
+        
+        assert all(new > old for new, old in zip(table_versions(tables), before))
+    
+    @pytest.mark.asyncio
+    async def test_async_commit_bumps_off_the_loop(self, test_db, monkeypatch):
+        """Test async commits bump versions and run hooks on a worker thread before returning"""
+        threads = []
+        monkeypatch.setattr("app.versions.commit_hooks", [lambda rows, bumped: threads.append(threading.get_ident())])
+        before = table_versions(("roles",))
+        async with AsyncSessionLocal() as db:
+            db.add(Role(name="async_editor"))
+            await db.commit()
+        
+        assert table_versions(("roles",)) > before
+        assert threads and threads[0] != threading.get_ident()
+    
+    def test_version_survives_redis_outage(self, monkeypatch):
+        """Test a bump made while Redis is down never goes backwards and reaches other workers"""
+        redis = FlakyRedis()
+        worker, other = VersionCounter(None, ttl=0), VersionCounter(None, ttl=0)
+        monkeypatch.setattr(worker, "_redis", redis)
+        monkeypatch.setattr(other, "_redis", redis)
+        first = worker.bump("rbac")
+        assert other.get("rbac") == first
+        
+        redis.down = True
+        assert worker.bump("rbac") == first + 1
+        assert worker.get("rbac") == first + 1 and not worker.shared("rbac")
+        
+        redis.down = False
+        assert worker.get("rbac") == first + 1 and worker.shared("rbac")
+        assert other.get("rbac") == first + 1
+    
+    def test_missed_bump_replayed_by_any_read(self, monkeypatch):
+        """Test the first read after an outage publishes every bump Redis missed"""
+        redis = FlakyRedis()
+        worker, other = VersionCounter(None, ttl=0), VersionCounter(None, ttl=0)
+        monkeypatch.setattr(worker, "_redis", redis)
+        monkeypatch.setattr(other, "_redis", redis)
+        before = other.get("table:roles")
+        redis.down = True
+        worker.bump("table:roles")
+        
+        redis.down = False
+        worker.get("table:permissions")
+        assert worker.shared("table:roles") and other.get("table:roles") == before + 1
+    
+    def test_failed_read_not_shared(self, monkeypatch):
+        """Test a worker that cannot read a version stops trusting its local copy until it can"""
+        redis = FlakyRedis()
+        worker = VersionCounter(None, ttl=0)
+        monkeypatch.setattr(worker, "_redis", redis)
+        version = worker.get("rbac")
+        assert worker.shared("rbac")
+        
+        redis.down = True
+        assert worker.get("rbac") == version
+        assert not worker.synced("rbac") and not worker.shared("rbac")
+        
+        redis.down = False
+        worker.get("rbac")
+        assert worker.synced("rbac") and worker.shared("rbac")
+    
+    def test_lost_counter_restarts_above_old_versions(self, monkeypatch):
+        """Test a flushed Redis cannot make versions handed out before it current again"""
+        redis = FlakyRedis()
+        worker, other = VersionCounter(None, ttl=0), VersionCounter(None, ttl=0)
+        monkeypatch.setattr(worker, "_redis", redis)
+        monkeypatch.setattr(other, "_redis", redis)
+        old = worker.bump("rbac")
+        
+        redis.values.clear()
+        assert other.get("rbac") > old
+        assert worker.bump("rbac") > old + 1
+    
+    @pytest.mark.asyncio
+    async def test_async_read_off_the_loop(self, monkeypatch):
+        """Test async version reads reach Redis from a worker thread, then use the local copy"""
+        redis, threads = FlakyRedis(), []
+        redis.values["version:rbac"] = 5
+        original_get = redis.get
+        monkeypatch.setattr(redis, "get", lambda key: threads.append(threading.get_ident()) or original_get(key))
+        worker = VersionCounter(None, ttl=60)
+        monkeypatch.setattr(worker, "_redis", redis)
+        
+        assert await worker.get_async("rbac") == 5
+        assert await worker.get_async("rbac") == 5
+        assert len(threads) == 1 and threads[0] != threading.get_ident()
+    
+    @pytest.mark.asyncio
+    async def test_no_etag_while_versions_unshared(self, monkeypatch):
+        """Test lists answer in full while their table versions may miss other workers' writes"""
+        request = Request({"type": "http", "path": "/roles", "query_string": b"", "headers": [(b"if-none-match", b"*")]})
+        monkeypatch.setattr("app.etags.tables_shared", lambda tables: False)
+        response = Response()
+        await table_etag("roles")(request, response, current_user=None)
+        assert "etag" not in response.headers
+        
+        monkeypatch.setattr("app.etags.tables_shared", lambda tables: True)
+        with pytest.raises(HTTPException) as exc_info:
+            await table_etag("roles")(request, Response(), current_user=None)
+        assert exc_info.value.status_code == 304
+    
+    def test_matching_etag_not_modified(self):
+        """Test If-None-Match short-circuits with 304 and misses set the ETag"""
+        request = Request({"type": "http", "headers": [(b"if-none-match", b'W/"abc", "def"')]})
+        with pytest.raises(HTTPException) as exc_info:
+            check_not_modified(request, Response(), '"abc"')
+        assert exc_info.value.status_code == 304
+        
+        response = Response()
+        check_not_modified(request, response, '"xyz"')
+        assert response.headers["etag"] == '"xyz"'
+{%- endif %}
@@ -0,0 +1,72 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for streaming exports
+"""
+import pytest
+from fastapi.testclient import TestClient
+from app import api, ratelimit
+from app.auth import get_current_active_user
+from app.config import settings
+from app.crud import AsyncUserCRUD
+from app.database import AsyncSessionLocal
+from app.export import stream_export
+from app.main import app
+from app.models import User
+from app.ratelimit import RateLimiter
+
+
+class TestExport:
+    """Test streaming exports"""
+    
+    @pytest.mark.asyncio
+    async def test_csv_streams_in_chunks(self, test_db):
+        """Test each fetched batch is sent as its own chunk, after the header"""
+        async with AsyncSessionLocal() as db:
+            for i in range(5):
+                db.add(User(
+                    username=f"user{i}", email=f"user{i}@example.com", hashed_password="x",
+                    first_name="Test", last_name=f"User{i}"
+                ))
+            await db.commit()
+        
+        statement = AsyncUserCRUD().export_statement()
+        chunks = [chunk.decode() async for chunk in stream_export(statement, "csv", chunk_size=2)]
+        
+        assert chunks[0].startswith("id,email,username,")
+        assert [chunk.count("\n") for chunk in chunks[1:]] == [2, 2, 1]
+        assert "hashed_password" not in chunks[0] and "user4@example.com" in chunks[-1]
+
+
+class TestExportEndpoint:
+    """Test the export route"""
+    
+    @pytest.fixture
+    def as_user(self):
+        def login(is_superuser):
+            user = User(email="export@example.com", username="export", is_active=True, is_superuser=is_superuser)
+            app.dependency_overrides[get_current_active_user] = lambda: user
+        yield login
+        app.dependency_overrides.pop(get_current_active_user, None)
+    
+    def test_requires_superuser(self, client: TestClient, as_user):
+        """Test regular users cannot dump the user table"""
+        as_user(False)
+        
+        response = client.get("/api/v1/users/export")
+        assert response.status_code == 403
+    
+    def test_keeps_rate_limit_headers(self, client: TestClient, as_user, monkeypatch):
+        """Test RateLimit-* headers set by the router dependency reach the stream"""
+        async def empty_export(*args, **kwargs):
+            yield b""
+        
+        monkeypatch.setattr(settings, "rate_limit_enabled", True)
+        monkeypatch.setattr(ratelimit, "limiter", RateLimiter(None))
+        monkeypatch.setattr(api, "stream_export", empty_export)
+        as_user(True)
+        
+        response = client.get("/api/v1/users/export")
+        assert response.status_code == 200
+        assert "RateLimit-Remaining" in response.headers
+        assert response.headers["Content-Disposition"] == 'attachment; filename="users.ndjson"'
+{%- endif %}
@@ -0,0 +1,43 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for eager-loading profiles and query budgets
+"""
+import pytest
+from app.crud import RoleCRUD, UserCRUD
+from app.database import SessionLocal
+from app.loading import QueryBudgetExceeded, query_budget
+from app.models import Permission, Role, User
+
+
+class TestLoadingProfiles:
+    """Test eager loading and query budgets"""
+    
+    def test_user_list_query_count_is_constant(self, test_db):
+        """Test a page of users with roles and permissions loads in a fixed number of queries"""
+        db = SessionLocal()
+        permission = Permission(name="user_read", resource="user", action="read")
+        for i in range(10):
+            role = Role(name=f"role{i}", permissions=[permission])
+            db.add(User(
+                username=f"user{i}", email=f"user{i}@example.com", hashed_password="x",
+                first_name="Test", last_name=f"User{i}", roles=[role]
+            ))
+        db.commit()
+        db.expunge_all()
+        
+        # Page with count, roles, permissions
+        with query_budget(3) as counter:
+            page = UserCRUD().get_multi(db, count_strategy="exact")
+            names = {p.name for user in page.items for role in user.roles for p in role.permissions}
+        assert names == {"user_read"}
+        assert counter.count == 3
+        db.close()
+    
+    def test_budget_exceeded(self, test_db):
+        """Test exceeding a budget fails in enforcing mode"""
+        db = SessionLocal()
+        with pytest.raises(QueryBudgetExceeded):
+            with query_budget(1, label="two queries"):
+                RoleCRUD().get_multi(db, count_strategy="exact", skip=10)
+        db.close()
+{%- endif %}
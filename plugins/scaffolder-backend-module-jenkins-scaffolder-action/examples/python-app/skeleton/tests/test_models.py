@@ -1,10 +1,18 @@
 """
 Unit tests for models
 """
+import os
+import uuid
+from datetime import datetime, timezone
 import pytest
 {% if values.framework == 'fastapi' -%}
-from app.models import User, Role, Permission
-from app.database import SessionLocal
+from app.models import User, Role, Permission, user_roles, role_permissions
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from app.database import Base, SessionLocal, AsyncSessionLocal
+from app.ids import uuid7, uuid7_time
+from app.crud import AsyncRoleCRUD, AsyncPermissionCRUD, PermissionCRUD, RoleCRUD
+from app.schemas import RoleCreate, PermissionCreate, RoleResponse
 {% elif values.framework == 'django' -%}
 from django.test import TestCase
 from django.contrib.auth import get_user_model
@@ -91,6 +99,128 @@ class TestPermissionModel:
         
         db.close()
 
+
+class TestPrimaryKeys:
+    """Test time-ordered primary keys"""
+    
+    def test_new_rows_get_increasing_uuid7_keys(self, test_db):
+        """Test keys are UUIDv7 and sort in creation order"""
+        db = SessionLocal()
+        roles = [Role(name=f"role{i}") for i in range(3)]
+        for role in roles:
+            db.add(role)
+            db.flush()
+        
+        ids = [role.id for role in roles]
+        assert all(id.version == 7 for id in ids)
+        assert ids == sorted(ids)
+        db.close()
+    
+    def test_timestamp_round_trip(self):
+        """Test the embedded time is when the key was made"""
+        assert abs((uuid7_time(uuid7()) - datetime.now(timezone.utc)).total_seconds()) < 1
+
+
+class TestAsyncCRUD:
+    """Test async CRUD operations"""
+    
+    @pytest.mark.asyncio
+    async def test_role_loaded_for_response(self, test_db):
+        """Test async results carry the relationships their schema serializes"""
+        role_crud, permission_crud = AsyncRoleCRUD(), AsyncPermissionCRUD()
+        async with AsyncSessionLocal() as db:
+            role = await role_crud.create(db, obj_in=RoleCreate(name="editor"))
+            permission = await permission_crud.create(
+                db, obj_in=PermissionCreate(name="user_read", resource="user", action="read")
+            )
+            await role_crud.add_permission(db, role=role, permission=permission)
+        
+        async with AsyncSessionLocal() as db:
+            role = await role_crud.get_by_name(db, name="editor")
+        
+        # Serializing outside the session would fail on any lazy load
+        response = RoleResponse.model_validate(role)
+        assert [p.name for p in response.permissions] == ["user_read"]
+
+
+# (statement, SQLite index, PostgreSQL index) for each query shape in app/crud.py
+INDEXED_QUERIES = [
+    (
+        PermissionCRUD().get_by_resource_action_statement("user", "read"),
+        "sqlite_autoindex_permissions", "unique_resource_action",
+    ),
+    (
+        select(user_roles.c.user_id).where(user_roles.c.role_id == uuid.uuid4()),
+        "ix_user_roles_role_id", "ix_user_roles_role_id",
+    ),
+    (
+        select(role_permissions.c.role_id).where(role_permissions.c.permission_id == uuid.uuid4()),
+        "ix_role_permissions_permission_id", "ix_role_permissions_permission_id",
+    ),
+    (RoleCRUD().get_multi_statement(limit=10), "ix_roles_created_at_id", "ix_roles_created_at_id"),
+    (PermissionCRUD().get_multi_statement(limit=10), "ix_permissions_created_at_id", "ix_permissions_created_at_id"),
+]
+
+
+class TestQueryPlans:
+    """Test CRUD queries are answered from an index"""
+    
+    @staticmethod
+    def explain(db, statement) -> str:
+        compiled = statement.compile(dialect=db.get_bind().dialect)
+        # Plans do not depend on parameter values
+        params = tuple(None for _ in compiled.positiontup)
+        rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return " | ".join(row[-1] for row in rows)
+    
+    @pytest.mark.parametrize("statement, index, _", INDEXED_QUERIES)
+    def test_query_uses_index(self, test_db, statement, index, _):
+        """Test the plan reads through the index and needs no separate sort"""
+        db = SessionLocal()
+        plan = self.explain(db, statement)
+        assert f"INDEX {index}" in plan
+        assert "TEMP B-TREE" not in plan
+        db.close()
+
+
+class TestPostgresQueryPlans:
+    """Test CRUD queries are answered from an index on PostgreSQL
+    
+    Runs against the empty database at ``TEST_POSTGRES_URL``.
+    """
+    
+    @pytest.fixture(scope="class")
+    def postgres(self):
+        url = os.environ.get("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+        engine = create_engine(url)
+        try:
+            Base.metadata.create_all(bind=engine)
+        except OperationalError as e:
+            engine.dispose()
+            pytest.skip(f"PostgreSQL is not reachable: {e}")
+        yield engine
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+    
+    @staticmethod
+    def explain(connection, statement) -> str:
+        compiled = statement.compile(dialect=connection.dialect)
+        params = {name: str(value) if isinstance(value, uuid.UUID) else value for name, value in compiled.params.items()}
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", params)
+        return " | ".join(row[0] for row in rows)
+    
+    @pytest.mark.parametrize("statement, _, index", INDEXED_QUERIES)
+    def test_query_uses_index(self, postgres, statement, _, index):
+        """Test the plan reads through the index and needs no separate sort"""
+        with postgres.connect() as connection:
+            # Empty tables are cheapest to scan; ask whether an index could serve the query
+            connection.exec_driver_sql("SET enable_seqscan = off")
+            plan = self.explain(connection, statement)
+        assert f" {index}" in plan
+        assert "Sort" not in plan
+
 {% elif values.framework == 'django' -%}
 class TestUserModel(TestCase):
     """Test User model"""
@@ -0,0 +1,38 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for keyset pagination
+"""
+import pytest
+from app.crud import RoleCRUD
+from app.database import SessionLocal
+from app.pagination import InvalidCursor
+from app.schemas import RoleCreate
+
+
+class TestKeysetPagination:
+    """Test cursor pagination"""
+    
+    def test_pages_cover_all_rows_once(self, test_db):
+        """Test following cursors visits each row exactly once, in order"""
+        db = SessionLocal()
+        role_crud = RoleCRUD()
+        for i in range(5):
+            role_crud.create(db, obj_in=RoleCreate(name=f"role{i}"))
+        
+        seen, cursor = [], None
+        while True:
+            items, cursor = role_crud.get_page(db, cursor=cursor, limit=2)
+            seen.extend(role.name for role in items)
+            if cursor is None:
+                break
+        
+        assert seen == [f"role{i}" for i in range(5)]
+        db.close()
+    
+    def test_invalid_cursor(self, test_db):
+        """Test a malformed cursor is rejected"""
+        db = SessionLocal()
+        with pytest.raises(InvalidCursor):
+            RoleCRUD().get_page(db, cursor="not-a-cursor")
+        db.close()
+{%- endif %}
@@ -0,0 +1,97 @@
+"""
+Unit tests for per-request SQL statistics
+"""
+{% if values.framework == 'fastapi' -%}
+import pytest
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.models import Role
+from app.querystats import NPlusOneDetected, normalize_sql, track_queries
+
+
+class TestQueryStats:
+    """Test per-request SQL statistics"""
+    
+    def test_normalized_shapes(self):
+        """Test values and IN lists do not change a statement's shape"""
+        assert normalize_sql("SELECT * FROM roles WHERE id IN (?, ?, ?) AND name = 'x'") == \
+            normalize_sql("SELECT *  FROM roles\nWHERE id IN (?, ?) AND name = 'y'")
+    
+    def test_repeated_statement_flagged(self, test_db):
+        """Test a loop of identical lookups is counted and raised as N+1"""
+        db = SessionLocal()
+        with track_queries() as queries:
+            for i in range(5):
+                db.execute(select(Role).where(Role.name == f"role{i}")).all()
+        db.close()
+        
+        assert queries.count == 5 and queries.seconds > 0
+        assert queries.repeated()[0]["count"] == 5
+        with pytest.raises(NPlusOneDetected):
+            queries.observe("/roles", threshold=5, detect=True, strict=True)
+
+{%- elif values.framework == 'django' %}
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from app.models import Role
+from app.querystats import NPlusOneDetected, QueryStatsMiddleware, current_queries
+
+
+def list_roles(request):
+    for i in range(3):
+        list(Role.objects.filter(name=f"role{i}"))
+    return HttpResponse()
+
+
+class TestQueryStats(TestCase):
+    """Test per-request SQL statistics"""
+    
+    def test_request_statements_counted(self):
+        """Test the middleware counts a request's statements by shape"""
+        request = RequestFactory().get("/roles/")
+        QueryStatsMiddleware(list_roles)(request)
+        
+        self.assertEqual(request.queries.count, 3)
+        self.assertEqual(request.queries.repeated()[0]["count"], 3)
+        self.assertIsNone(current_queries())
+    
+    @override_settings(N_PLUS_ONE_RAISE=True, N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_statement_raised_when_strict(self):
+        """Test a loop of identical lookups fails the request with N_PLUS_ONE_RAISE"""
+        with self.assertRaises(NPlusOneDetected):
+            QueryStatsMiddleware(list_roles)(RequestFactory().get("/roles/"))
+
+{%- elif values.framework == 'flask' %}
+import pytest
+from app.models import Role
+from app.querystats import NPlusOneDetected, current_queries
+
+
+def add_roles_route(app, seen):
+    @app.route("/test/roles")
+    def list_roles():
+        for i in range(3):
+            Role.query.filter_by(name=f"role{i}").all()
+        seen.append(current_queries())
+        return "ok"
+
+
+class TestQueryStats:
+    """Test per-request SQL statistics"""
+    
+    def test_request_statements_counted(self, app, client):
+        """Test each request's statements are counted by shape"""
+        seen = []
+        add_roles_route(app, seen)
+        client.get("/test/roles")
+        
+        assert seen[0].count == 3 and seen[0].repeated()[0]["count"] == 3
+        assert current_queries() is None
+    
+    def test_repeated_statement_raised_when_strict(self, app, client):
+        """Test a loop of identical lookups fails the request with N_PLUS_ONE_RAISE"""
+        app.config.update(N_PLUS_ONE_RAISE=True, N_PLUS_ONE_THRESHOLD=3)
+        add_roles_route(app, [])
+        with pytest.raises(NPlusOneDetected):
+            client.get("/test/roles")
+{%- endif %}
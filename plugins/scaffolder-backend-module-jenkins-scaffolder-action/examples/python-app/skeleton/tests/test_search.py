@@ -0,0 +1,103 @@
+"""
+Unit tests for user search
+"""
+{% if values.framework == 'fastapi' -%}
+from app.crud import UserCRUD
+from app.database import SessionLocal
+from app.models import User
+
+
+class TestUserSearch:
+    """Test user search"""
+    
+    def test_ranked_substring_search(self, test_db):
+        """Test the SQLite fallback matches substrings and ranks earlier matches first"""
+        db = SessionLocal()
+        for username, last_name in [("zed", "Smithers"), ("smith", "Jones"), ("bob", "Brown")]:
+            db.add(User(
+                username=username, email=f"{username}@example.com", hashed_password="x",
+                first_name="Test", last_name=last_name
+            ))
+        db.commit()
+        
+        results = UserCRUD().search(db, query="SMITH")
+        assert [user.username for user in results] == ["smith", "zed"]
+        assert UserCRUD().search(db, query="100%") == []
+        db.close()
+
+{%- elif values.framework == 'django' %}
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from app.search import search_users
+User = get_user_model()
+
+
+class TestUserSearch(TestCase):
+    """Test user search"""
+    
+    def setUp(self):
+        """Setup test data"""
+        for username, last_name in [("zed", "Smithers"), ("smith", "Jones"), ("bob", "Brown")]:
+            User.objects.create_user(
+                username=username, email=f"{username}@example.com", password="testpassword123",
+                first_name="Test", last_name=last_name
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username="bob"))
+    
+    def test_ranked_substring_search(self):
+        """Test the SQLite fallback matches substrings and ranks earlier matches first"""
+        results = search_users(User.objects.all(), "SMITH")
+        self.assertEqual([user.username for user in results], ["smith", "zed"])
+        self.assertFalse(search_users(User.objects.all(), "100%").exists())
+    
+    def test_limit_validated(self):
+        """Test the endpoint answers 400 unless limit is from 1 to 100"""
+        url = reverse('user-search')
+        for limit in ("abc", "0", "-1", "101"):
+            response = self.client.get(url, {"q": "smith", "limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.get(url, {"q": "smith", "limit": "1"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user["username"] for user in response.json()], ["smith"])
+
+{%- elif values.framework == 'flask' %}
+from flask_jwt_extended import create_access_token
+from app.models import User, db
+
+
+class TestUserSearch:
+    """Test user search"""
+    
+    def _setup(self):
+        for username, last_name in [("zed", "Smithers"), ("smith", "Jones"), ("bob", "Brown")]:
+            user = User(
+                username=username, email=f"{username}@example.com",
+                first_name="Test", last_name=last_name
+            )
+            user.set_password("testpassword123")
+            db.session.add(user)
+        db.session.commit()
+        bob = User.query.filter_by(username="bob").one()
+        return {"Authorization": f"Bearer {create_access_token(identity=str(bob.id))}"}
+    
+    def test_ranked_substring_search(self, app, client):
+        """Test the SQLite fallback matches substrings and ranks earlier matches first"""
+        headers = self._setup()
+        response = client.get("/api/v1/users/search?q=SMITH", headers=headers)
+        assert [user["username"] for user in response.get_json()["items"]] == ["smith", "zed"]
+        assert client.get("/api/v1/users/search?q=100%25", headers=headers).get_json()["items"] == []
+    
+    def test_limit_validated(self, app, client):
+        """Test the endpoint answers 400 unless limit is from 1 to 100"""
+        headers = self._setup()
+        for limit in ("abc", "0", "-1", "101"):
+            response = client.get(f"/api/v1/users/search?q=smith&limit={limit}", headers=headers)
+            assert response.status_code == 400
+        response = client.get("/api/v1/users/search?q=smith&limit=1", headers=headers)
+        assert [user["username"] for user in response.get_json()["items"]] == ["smith"]
+{%- endif %}
@@ -0,0 +1,51 @@
+{% if values.framework == 'fastapi' -%}
+"""
+Unit tests for single-flight loads
+"""
+import asyncio
+import itertools
+import pytest
+from app.cache import TwoTierCache
+from app.singleflight import Lease, SingleFlight, SingleFlightCache
+
+
+class TestSingleFlight:
+    """Test coalesced loads and refreshes ahead of expiry"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_load(self):
+        """Test callers of one key wait for a single load"""
+        flights, calls = SingleFlight(), []
+        
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+        
+        results = await asyncio.gather(*(flights.do("key", load) for _ in range(10)))
+        assert (results, len(calls)) == (["value"] * 10, 1)
+    
+    @pytest.mark.asyncio
+    async def test_stale_entry_served_while_refreshing(self):
+        """Test an expired entry is returned at once and replaced in the background"""
+        cache = SingleFlightCache(
+            TwoTierCache("test", maxsize=10, ttl=60), fresh=0, stale=60, beta=0, lease=Lease(None, ttl=1)
+        )
+        counter = itertools.count(1)
+        
+        async def load():
+            return next(counter)
+        
+        assert await cache.get("key", load) == 1
+        assert await cache.get("key", load) == 1
+        await asyncio.sleep(0.01)
+        assert await cache.get("key", load) == 2
+    
+    @pytest.mark.asyncio
+    async def test_lease_fails_open_without_redis(self):
+        """Test every caller gets the lease while Redis is unreachable"""
+        lease = Lease("redis://localhost:1/0", ttl=1)
+        first, second = await lease.acquire("key"), await lease.acquire("key")
+        assert first and second and first != second
+        await lease.release("key", first)
+{%- endif %}
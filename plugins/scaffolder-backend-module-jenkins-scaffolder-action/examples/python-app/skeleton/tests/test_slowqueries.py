@@ -0,0 +1,140 @@
+"""
+Unit tests for the slow-query log
+"""
+{% if values.framework == 'fastapi' -%}
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.models import Permission, Role, User
+from app.querystats import track_queries
+from app.slowqueries import SlowQueryLog, explain
+
+
+class TestSlowQueries:
+    """Test the slow-query log"""
+    
+    def test_slow_statement_recorded_with_plan(self, test_db, monkeypatch):
+        """Test a statement over the threshold is kept with its shape, endpoint and plan"""
+        log = SlowQueryLog(threshold_ms=1e-6, size=2)
+        monkeypatch.setattr("app.slowqueries.slow_queries", log)
+        db = SessionLocal()
+        with track_queries("GET /roles"):
+            db.execute(select(Role).where(Role.name == "admin")).all()
+            db.execute(select(Permission).where(Permission.resource == "user")).all()
+            db.execute(select(User).where(User.email == "a@example.com")).all()
+        db.close()
+        
+        newest, older = log.entries()
+        assert "FROM users" in newest["sql"] and "a@example.com" not in newest["sql"]
+        assert newest["parameters"] == ["str"] and newest["endpoint"] == "GET /roles"
+        assert any("users" in step for step in newest["plan"])
+        assert "FROM permissions" in older["sql"]
+    
+    def test_failed_explain_rolls_back_to_savepoint(self):
+        """Test a failed EXPLAIN on PostgreSQL leaves the caller's transaction usable"""
+        executed = []
+        
+        class Cursor:
+            def execute(self, sql, parameters=None):
+                executed.append(sql.split(" (")[0])
+                if sql.startswith("EXPLAIN"):
+                    raise RuntimeError("cannot explain")
+            
+            def close(self):
+                pass
+        
+        class Connection:
+            def cursor(self):
+                return Cursor()
+        
+        assert explain(Connection(), "postgresql", "SELECT 1", ()) is None
+        assert executed == [
+            "SAVEPOINT slow_query_explain", "EXPLAIN",
+            "ROLLBACK TO SAVEPOINT slow_query_explain", "RELEASE SAVEPOINT slow_query_explain",
+        ]
+        
+        executed.clear()
+        assert explain(Connection(), "postgresql", "SELECT 1", (), in_transaction=False) is None
+        assert executed == ["EXPLAIN"]
+
+{%- elif values.framework == 'django' %}
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from app.models import Role
+from app.querystats import QueryStatsMiddleware
+from app.slowqueries import SlowQueryLog
+User = get_user_model()
+
+
+class TestSlowQueries(TestCase):
+    """Test the slow-query log"""
+    
+    def test_slow_statement_recorded_with_plan(self):
+        """Test a statement over the threshold is kept with its shape and plan"""
+        def view(request):
+            list(Role.objects.filter(name="admin"))
+            return HttpResponse()
+        
+        log = SlowQueryLog(threshold_ms=1e-6, size=2)
+        with mock.patch("app.slowqueries.slow_queries", log):
+            QueryStatsMiddleware(view)(RequestFactory().get("/roles/"))
+        
+        entry = log.entries()[0]
+        self.assertIn('FROM "roles"', entry["sql"])
+        self.assertNotIn("admin", entry["sql"])
+        self.assertEqual(entry["parameters"], ["str"])
+        self.assertTrue(any("roles" in step for step in entry["plan"]))
+    
+    def test_limit_validated(self):
+        """Test the endpoint answers 400 unless limit is from 1 to 1000"""
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="adminpassword123",
+            first_name="Admin", last_name="User"
+        ))
+        url = reverse('admin-slow-queries')
+        
+        for limit in ("abc", "0", "-5", "1001"):
+            response = client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(url, {"limit": "5"}).status_code, status.HTTP_200_OK)
+
+{%- elif values.framework == 'flask' %}
+from flask_jwt_extended import create_access_token
+from app.models import Role, User, db
+from app.slowqueries import SlowQueryLog
+
+
+class TestSlowQueries:
+    """Test the slow-query log"""
+    
+    def test_slow_statement_recorded_with_plan(self, app):
+        """Test a statement over the threshold is kept with its shape and plan"""
+        app.extensions["slow_queries"] = log = SlowQueryLog(threshold_ms=1e-6, size=2)
+        Role.query.filter_by(name="admin").all()
+        
+        entry = log.entries()[0]
+        assert "FROM roles" in entry["sql"] and "admin" not in entry["sql"]
+        assert entry["parameters"] == ["str"]
+        assert any("roles" in step for step in entry["plan"])
+    
+    def test_limit_validated(self, app, client):
+        """Test the endpoint answers 400 unless limit is from 1 to 1000"""
+        admin = User(
+            username="admin", email="admin@example.com",
+            first_name="Admin", last_name="User", is_superuser=True
+        )
+        admin.set_password("adminpassword123")
+        db.session.add(admin)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+        
+        for limit in ("abc", "0", "-5", "1001"):
+            response = client.get(f"/api/v1/admin/slow-queries?limit={limit}", headers=headers)
+            assert response.status_code == 400
+        assert client.get("/api/v1/admin/slow-queries?limit=5", headers=headers).status_code == 200
+{%- endif %}